@@ -0,0 +1,5 @@
+"""
+Group Audit Tool (Jirani) package. main.py is the Streamlit entry point; it imports `state`
+and then only the view module for the page being shown, so FPDF, the admin panel and other
+heavy parts load on first use.
+"""
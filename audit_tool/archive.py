@@ -0,0 +1,142 @@
+"""
+Archive tier: finalized sessions older than the horizon live in per-year SQLite files,
+read back through temporary history views.
+"""
+import pandas as pd
+import sqlite3
+import os
+from datetime import datetime
+
+from .config import ARCHIVE_ATTACH_LIMIT, ARCHIVE_DIR, ARCHIVE_HORIZON_MONTHS, DB_FILE, MONTHS
+from .engine import get_period
+
+# --- Archive Tier (per-year files, ATTACHed on demand) ---
+# History views -> the live table they span
+HISTORY_VIEWS = {'history_sessions': 'audit_sessions', 'history_transactions': 'transactions'}
+
+def archive_path(year):
+    return os.path.join(ARCHIVE_DIR, f"audit_{int(year)}.db")
+
+def get_archive_years():
+    """Years that have an archive file, oldest first."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT year, path FROM archive_files ORDER BY year")
+    rows = c.fetchall()
+    conn.close()
+    return [year for year, path in rows if os.path.exists(path)]
+
+def get_archive_cutoff():
+    """Months before this period live in the archive and are closed for editing (None if nothing is archived)."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT MAX(cutoff_period) FROM archive_files")
+    cutoff = c.fetchone()[0]
+    conn.close()
+    return cutoff
+
+def open_history(years=(), include_hot=True):
+    """
+    Connection to the live database with the given archive years ATTACHed read-only.
+    Temp views history_sessions / history_transactions span the live tables and every attached year,
+    so history queries read the same whichever tier a session is in.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    sources = ['main'] if include_hot else []
+    for year in years:
+        c.execute(f"ATTACH DATABASE ? AS arc_{int(year)}", (f"file:{os.path.abspath(archive_path(year))}?mode=ro",))
+        sources.append(f"arc_{int(year)}")
+    
+    for view, table in HISTORY_VIEWS.items():
+        cols = [r[1] for r in c.execute(f"PRAGMA main.table_info({table})")]
+        selects = []
+        for src in sources:
+            # Archive files written before a later migration lack the newer columns
+            have = {r[1] for r in c.execute(f"PRAGMA {src}.table_info({table})")}
+            selects.append("SELECT " + ", ".join(col if col in have else f"NULL AS {col}" for col in cols) + f" FROM {src}.{table}")
+        c.execute(f"CREATE TEMP VIEW {view} AS " + " UNION ALL ".join(selects))
+    return conn
+
+def history_batches(years=None):
+    """
+    Yields history connections covering the archive years (default: all) plus the live database,
+    oldest first, attaching at most ARCHIVE_ATTACH_LIMIT files each. The caller closes each connection.
+    """
+    years = get_archive_years() if years is None else sorted(years)
+    chunks = [years[i:i + ARCHIVE_ATTACH_LIMIT] for i in range(0, len(years), ARCHIVE_ATTACH_LIMIT)] or [[]]
+    for n, chunk in enumerate(chunks):
+        yield open_history(chunk, include_hot=(n == len(chunks) - 1))
+
+def read_history(query, params=(), years=None):
+    """Runs a query written against the history views over every batch. Returns: DataFrame of all rows."""
+    frames = []
+    for conn in history_batches(years):
+        frames.append(pd.read_sql_query(query, conn, params=params))
+        conn.close()
+    # Skip empty batches so they don't turn every column into object dtype
+    frames = [f for f in frames if not f.empty] or frames[:1]
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+def archive_sessions(horizon_months=ARCHIVE_HORIZON_MONTHS, progress=None):
+    """
+    Moves finalized sessions (and their transactions) more than `horizon_months` old into
+    archive/audit_<year>.db, one transaction per year, then VACUUMs the live database.
+    Session and transaction ids are kept, so history views and the loans ledger still line up.
+    progress: optional callback(fraction, message), called once per year (see JobExecutor).
+    Returns: {year: sessions moved}.
+    """
+    now = datetime.now()
+    cutoff = get_period(MONTHS[now.month - 1], now.year) - int(horizon_months)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT DISTINCT year FROM audit_sessions WHERE is_finalized = 1 AND period < ? ORDER BY year", (cutoff,))
+    years = [r[0] for r in c.fetchall()]
+    
+    moved = {}
+    for i, year in enumerate(years):
+        if progress:
+            progress(i / (len(years) + 1), f"Archiving {year}")
+        path = archive_path(year)
+        c.execute("ATTACH DATABASE ? AS arc", (path,))
+        for table in HISTORY_VIEWS.values():
+            cols = [r[1] for r in c.execute(f"PRAGMA main.table_info({table})")]
+            c.execute(f"CREATE TABLE IF NOT EXISTS arc.{table} AS SELECT * FROM main.{table} WHERE 0")
+            have = {r[1] for r in c.execute(f"PRAGMA arc.table_info({table})")}
+            for col in cols:
+                if col not in have:
+                    c.execute(f"ALTER TABLE arc.{table} ADD COLUMN {col}")
+            c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS arc.idx_{table}_id ON {table}(id)")
+        c.execute("CREATE INDEX IF NOT EXISTS arc.idx_transactions_member ON transactions(member_id, session_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS arc.idx_transactions_session ON transactions(session_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS arc.idx_sessions_group_period ON audit_sessions(group_id, is_finalized, period, id)")
+        
+        # Copy, then delete, inside one transaction spanning both files
+        picked = "SELECT id FROM main.audit_sessions WHERE is_finalized = 1 AND period < ? AND year = ?"
+        for table, key in (('transactions', 'session_id'), ('audit_sessions', 'id')):
+            cols = ", ".join(r[1] for r in c.execute(f"PRAGMA main.table_info({table})"))
+            c.execute(f"INSERT OR REPLACE INTO arc.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {key} IN ({picked})",
+                      (cutoff, year))
+        log_seq = c.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        c.execute(f"DELETE FROM main.transactions WHERE session_id IN ({picked})", (cutoff, year))
+        c.execute("DELETE FROM main.audit_sessions WHERE is_finalized = 1 AND period < ? AND year = ?", (cutoff, year))
+        moved[year] = c.rowcount
+        # Archived rows aren't deleted as far as other devices are concerned
+        c.execute("DELETE FROM change_log WHERE seq > ? AND op = 'D'", (log_seq,))
+        
+        c.execute('''INSERT INTO archive_files (year, path, sessions, cutoff_period) VALUES (?, ?, ?, ?)
+                     ON CONFLICT(year) DO UPDATE SET sessions = sessions + excluded.sessions, path = excluded.path,
+                         cutoff_period = MAX(cutoff_period, excluded.cutoff_period), archived_at = CURRENT_TIMESTAMP''',
+                  (year, path, moved[year], cutoff))
+        conn.commit()
+        c.execute("DETACH DATABASE arc")
+    
+    # Give the freed pages back to the filesystem
+    if moved:
+        if progress:
+            progress(len(years) / (len(years) + 1), "Compacting the live database")
+        conn.execute("VACUUM")
+    conn.close()
+    return moved
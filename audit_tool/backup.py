@@ -0,0 +1,154 @@
+"""Online backups of the live database (SQLite backup API) on a background thread."""
+import sqlite3
+import threading
+import os
+from datetime import datetime
+
+from .config import (
+    BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, DB_FILE,
+)
+
+# --- Online Backups (SQLite backup API, background thread) ---
+def backup_database(dest_dir=BACKUP_DIR, label="auto"):
+    """
+    Copies the live database with Connection.backup in BACKUP_PAGES_PER_STEP-page steps. The source lock
+    is released between steps, so saves carry on (and are picked up) while the copy runs.
+    The copy is integrity-checked before it's renamed into place, then old snapshots are rotated out.
+    Returns: path of the verified snapshot. Raises sqlite3.DatabaseError if the check fails.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    path = os.path.join(dest_dir, f"audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{label}.db")
+    tmp = path + ".part"
+    
+    src = sqlite3.connect(DB_FILE)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+        result = dst.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    
+    if result != "ok":
+        os.remove(tmp)
+        raise sqlite3.DatabaseError(f"Backup failed integrity check: {result}")
+    os.replace(tmp, path)
+    rotate_backups(dest_dir)
+    return path
+
+def rotate_backups(dest_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    """Deletes all but the newest `keep` scheduled snapshots (manual and pre-restore copies are kept)."""
+    auto = [b for b in list_backups(dest_dir) if b.endswith("_auto.db")]
+    for name in auto[keep:]:
+        os.remove(os.path.join(dest_dir, name))
+
+def list_backups(dest_dir=BACKUP_DIR):
+    """Snapshot file names, newest first."""
+    if not os.path.isdir(dest_dir):
+        return []
+    return sorted((f for f in os.listdir(dest_dir) if f.startswith("audit_") and f.endswith(".db")), reverse=True)
+
+# This device's sync identity and history (see sync.py): kept as they are across a restore
+SYNC_LOCAL_TABLES = ['sync_state', 'sync_peers', 'change_log']
+
+def restore_backup(name, dest_dir=BACKUP_DIR):
+    """
+    Restores a snapshot into the live database in place, through the backup API: other sessions keep
+    their connections and simply see the restored data on their next query. The current state is
+    saved first as a '_pre-restore' snapshot.
+    The data comes from the snapshot, but SYNC_LOCAL_TABLES stay as they are now. The device id, export
+    watermark and change log don't rewind, so bundles that other devices already imported aren't sent
+    again or reported as gaps. The restore itself isn't logged as a change: other devices keep their
+    copies of the rows it reverted until those rows are edited again.
+    """
+    path = os.path.join(dest_dir, name)
+    work = path + ".restore"
+    src = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        result = src.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Snapshot failed integrity check: {result}")
+        backup_database(dest_dir, label="pre-restore")
+        
+        # Build the restored database beside the snapshot, then switch the live file over to it
+        tmp = sqlite3.connect(work)
+        try:
+            src.backup(tmp)
+            keep_sync_tables(tmp, DB_FILE)
+            dst = sqlite3.connect(DB_FILE, timeout=30)
+            try:
+                # One step: the live file switches over in a single write transaction
+                tmp.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            tmp.close()
+            os.remove(work)
+    finally:
+        src.close()
+
+def keep_sync_tables(conn, live_path):
+    """Replaces SYNC_LOCAL_TABLES in `conn` with the live database's copies (schema, rows and change_log's seq counter)."""
+    conn.execute("ATTACH DATABASE ? AS live", (live_path,))
+    kept = []
+    try:
+        for table in SYNC_LOCAL_TABLES:
+            schema = conn.execute("SELECT sql FROM live.sqlite_master WHERE tbl_name = ? AND type IN ('table', 'index') "
+                                  "AND sql IS NOT NULL ORDER BY type = 'index'", (table,)).fetchall()
+            if not schema:
+                continue
+            conn.execute(f"DROP TABLE IF EXISTS main.{table}")
+            for (sql,) in schema:
+                conn.execute(sql)
+            conn.execute(f"INSERT INTO main.{table} SELECT * FROM live.{table}")
+            kept.append(table)
+        if 'change_log' in kept:
+            conn.execute("DELETE FROM main.sqlite_sequence WHERE name = 'change_log'")
+            conn.execute("INSERT INTO main.sqlite_sequence (name, seq) "
+                         "SELECT name, seq FROM live.sqlite_sequence WHERE name = 'change_log'")
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE live")
+
+class BackupScheduler(threading.Thread):
+    """
+    Daemon thread taking a snapshot every BACKUP_INTERVAL_HOURS (and on request from the Admin Panel).
+    One per server process, via get_backup_scheduler().
+    """
+    def __init__(self, interval_hours=BACKUP_INTERVAL_HOURS):
+        super().__init__(daemon=True, name="audit-backup")
+        self.interval = interval_hours * 3600
+        self.wake = threading.Event()
+        self.manual = False
+        self.running = False
+        self.last_path = None
+        self.last_error = None
+        self.last_run = None
+        # Resume the schedule from the newest snapshot on disk
+        existing = [b for b in list_backups() if b.endswith("_auto.db")]
+        self.next_run = datetime.now().timestamp()
+        if existing:
+            self.next_run = os.path.getmtime(os.path.join(BACKUP_DIR, existing[0])) + self.interval
+    
+    def request(self):
+        """Queues an immediate backup without waiting for it."""
+        self.manual = True
+        self.wake.set()
+    
+    def run(self):
+        while True:
+            self.wake.wait(max(0, self.next_run - datetime.now().timestamp()))
+            self.wake.clear()
+            label = "manual" if self.manual else "auto"
+            self.manual = False
+            self.running = True
+            try:
+                self.last_path = backup_database(label=label)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self.running = False
+                self.last_run = datetime.now()
+            if label == "auto":
+                self.next_run = datetime.now().timestamp() + self.interval
@@ -0,0 +1,55 @@
+"""Settings shared across the app: database location, default by-laws, paging, meeting schedules, archive/backup/job tuning."""
+
+# --- 1. Database Setup & Helpers ---
+
+DB_FILE = "audit_data.db"
+
+# --- Constants ---
+FINE_LATE = 50
+FINE_ABSENT = 100
+FINE_APOLOGY = 20
+
+# Rules used when a group has no by-laws of its own (see group_rules)
+DEFAULT_RULES = {
+    'loan_rate': 0.015,
+    'advance_rate': 0.10,
+    'fine_late': FINE_LATE,
+    'fine_absent': FINE_ABSENT,
+    'fine_apology': FINE_APOLOGY,
+}
+RULE_COLS = list(DEFAULT_RULES.keys())
+
+# Page sizes for keyset-paginated lists
+HISTORY_PAGE_SIZE = 12
+LOAN_PAGE_SIZE = 25
+PORTFOLIO_PAGE_SIZE = 25 # groups per page on the cross-group portfolio (sortable, so offset-paginated)
+MEETING_PAGE_SIZE = 20 # groups per page of the landing page's upcoming meetings
+
+# Archive tier: finalized sessions older than the horizon move to per-year files
+ARCHIVE_DIR = "archive"
+ARCHIVE_HORIZON_MONTHS = 24
+ARCHIVE_ATTACH_LIMIT = 10 # SQLite's default maximum of attached databases per connection
+
+# Online backups (see BackupScheduler)
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL_HOURS = 6
+BACKUP_KEEP = 28 # scheduled snapshots kept (one week at the default interval)
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.05 # seconds between steps, when writers get the database back
+
+# Background jobs (see JobExecutor)
+JOB_THREADS = 4
+JOB_PROCESSES = 2
+JOB_POLL_SECONDS = 2
+JOB_HISTORY_LIMIT = 50 # finished jobs kept (with their results) across all sessions
+IMPORT_CHUNK_ROWS = 500 # rows per executemany in bulk_import_members (progress granularity)
+
+# Session housekeeping (see collect_stale_keys)
+SESSION_IDLE_MINUTES = 30 # sessions not seen for this long drop out of the admin metrics
+
+# Meeting schedule: how a group's next_meeting_date moves on once a month is finalized (see next_meeting_after)
+MEETING_RECURRENCES = ["weekly", "fortnightly", "monthly"]
+DEFAULT_RECURRENCE = "monthly"
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
@@ -0,0 +1,1783 @@
+"""Data layer: schema and migrations, groups, members, sessions, the loans ledger and history readers."""
+import pandas as pd
+import sqlite3
+import csv
+import tempfile
+import os
+import random
+from datetime import datetime
+
+from .config import (
+    ARCHIVE_ATTACH_LIMIT, DB_FILE, DEFAULT_RECURRENCE, HISTORY_PAGE_SIZE, IMPORT_CHUNK_ROWS, LOAN_PAGE_SIZE,
+    MEETING_PAGE_SIZE, MONTHS, PORTFOLIO_PAGE_SIZE, RULE_COLS,
+)
+from .engine import (
+    AuditConflictError, DuplicateMemberError, ID_CHARS, IDENTITY_MIN_LEN, MERGE_COLS, PHONE_CHARS, REPLAY_COLS,
+    SEARCH_MAX_RESULTS, TXN_LEDGER_COLS, apply_carry_forward, apply_waterfall, fts_member_query, get_period, identity_keys,
+    merge_member_edits, next_meeting_after, normalize_identity, period_label, rules_for_period,
+)
+from .archive import get_archive_years, history_batches, open_history, read_history
+
+def init_db():
+    """Initializes the SQLite database with required tables."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    # Groups Table
+    c.execute('''CREATE TABLE IF NOT EXISTS groups (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+    
+    # Members Table
+    c.execute('''CREATE TABLE IF NOT EXISTS members (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id INTEGER,
+                    name TEXT,
+                    photo_path TEXT,
+                    joined_date DATE,
+
+                    account_number TEXT UNIQUE,
+                    phone TEXT,
+                    id_number TEXT,
+                    email TEXT,
+                    residence TEXT,
+                    sponsor_name TEXT,
+                    next_of_kin TEXT,
+                    role TEXT DEFAULT 'Member',
+                    
+                    national_id TEXT,
+                    kra_pin TEXT,
+                    dob TEXT,
+                    gender TEXT,
+                    occupation TEXT,
+                    next_of_kin_name TEXT,
+                    next_of_kin_phone TEXT,
+                    
+                    FOREIGN KEY(group_id) REFERENCES groups(id)
+                )''')
+    
+    # Simple migration check for existing databases
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN phone TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN id_number TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN next_of_kin TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN account_number INTEGER UNIQUE")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN role TEXT DEFAULT 'Member'")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN email TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN residence TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN sponsor_name TEXT")
+    except sqlite3.OperationalError:
+        pass
+                
+    # Audit Sessions Table
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id INTEGER,
+                    month TEXT,
+                    year INTEGER,
+                    is_finalized BOOLEAN DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(group_id, month, year)
+                )''')
+    
+    # Transactions Table
+    c.execute('''CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id INTEGER,
+                    member_id INTEGER,
+                    cash_today INTEGER DEFAULT 0,
+                    fines INTEGER DEFAULT 0,
+                    savings_bf INTEGER DEFAULT 0,
+                    savings_today INTEGER DEFAULT 0,
+                    savings_cf INTEGER DEFAULT 0,
+                    loan_bf INTEGER DEFAULT 0,
+                    loan_principal INTEGER DEFAULT 0,
+                    loan_interest INTEGER DEFAULT 0,
+                    loan_cf INTEGER DEFAULT 0,
+                    advance_bf INTEGER DEFAULT 0,
+                    advance_principal INTEGER DEFAULT 0,
+                    advance_interest INTEGER DEFAULT 0,
+                    advance_cf INTEGER DEFAULT 0,
+                    attendance_status TEXT DEFAULT 'Present',
+                    new_loan INTEGER DEFAULT 0,
+                    new_advance INTEGER DEFAULT 0,
+                    savings_withdrawal INTEGER DEFAULT 0,
+                    guarantors TEXT,
+                    loan_image TEXT,
+                    FOREIGN KEY(session_id) REFERENCES audit_sessions(id),
+                    FOREIGN KEY(member_id) REFERENCES members(id)
+                )''')
+    
+    # Migration for members table (if legacy DB exists)
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN account_number INTEGER")
+    except sqlite3.OperationalError:
+        pass
+        
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN phone TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN id_number TEXT")
+    except sqlite3.OperationalError:
+        pass
+        
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN next_of_kin TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        c.execute("ALTER TABLE members ADD COLUMN photo_path TEXT")
+    except sqlite3.OperationalError:
+        pass
+        
+    # Migration for Deep KYC
+    new_cols = ['national_id', 'kra_pin', 'dob', 'gender', 'occupation', 'next_of_kin_name', 'next_of_kin_phone']
+    for col in new_cols:
+        try:
+            c.execute(f"ALTER TABLE members ADD COLUMN {col} TEXT")
+        except sqlite3.OperationalError:
+            pass
+
+    # Migration for attendance_status
+    try:
+        c.execute("ALTER TABLE transactions ADD COLUMN attendance_status TEXT DEFAULT 'Present'")
+    except sqlite3.OperationalError:
+        pass
+        
+    # Migration for new_loan (Allocation Stage)
+    try:
+        c.execute("ALTER TABLE transactions ADD COLUMN new_loan INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass
+
+    # Migration for bank_balance_closing (Audit Sessions)
+    try:
+        c.execute("ALTER TABLE audit_sessions ADD COLUMN bank_balance_closing INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass
+    
+    # Migration for groups table (next_meeting_date)
+    try:
+        c.execute("ALTER TABLE groups ADD COLUMN next_meeting_date TEXT")
+    except sqlite3.OperationalError:
+        pass
+    # Meeting schedule: how next_meeting_date moves on when a month is finalized (see advance_meeting_date)
+    try:
+        c.execute(f"ALTER TABLE groups ADD COLUMN meeting_recurrence TEXT DEFAULT '{DEFAULT_RECURRENCE}'")
+    except sqlite3.OperationalError:
+        pass
+    # Day of the month monthly meetings fall on, so a clamped date (28 Feb) doesn't become the new day
+    try:
+        c.execute("ALTER TABLE groups ADD COLUMN meeting_day INTEGER")
+    except sqlite3.OperationalError:
+        pass
+    # Older versions stored a missing first meeting date as the text 'None'
+    c.execute("UPDATE groups SET next_meeting_date = NULL WHERE next_meeting_date IN ('', 'None')")
+    c.execute("UPDATE groups SET meeting_day = CAST(strftime('%d', next_meeting_date) AS INTEGER) "
+              "WHERE meeting_day IS NULL AND next_meeting_date IS NOT NULL")
+    # Upcoming meetings are read as a date range in (date, id) order (see get_upcoming_meetings)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_groups_next_meeting ON groups(next_meeting_date, id)")
+    
+    # Migration for guarantors and loan_image
+    try:
+        c.execute("ALTER TABLE transactions ADD COLUMN guarantors TEXT")
+    except sqlite3.OperationalError:
+        pass
+        
+    try:
+        c.execute("ALTER TABLE transactions ADD COLUMN loan_image TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+    # Migration for new_advance and savings_withdrawal
+    try:
+        c.execute("ALTER TABLE transactions ADD COLUMN new_advance INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        c.execute("ALTER TABLE transactions ADD COLUMN savings_withdrawal INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass
+
+    # Migration for period (sortable Year * 12 + MonthIndex) on audit sessions
+    try:
+        c.execute("ALTER TABLE audit_sessions ADD COLUMN period INTEGER")
+    except sqlite3.OperationalError:
+        pass
+    month_case = " ".join(f"WHEN '{m}' THEN {i}" for i, m in enumerate(MONTHS))
+    c.execute(f"UPDATE audit_sessions SET period = year * 12 + (CASE month {month_case} END) WHERE period IS NULL")
+
+    # Loans Ledger (one row per New Loan / New Advance, repaid over later sessions)
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loans'")
+    loans_table_exists = c.fetchone() is not None
+
+    c.execute('''CREATE TABLE IF NOT EXISTS loans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id INTEGER,
+                    member_id INTEGER,
+                    session_id INTEGER,
+                    transaction_id INTEGER,
+                    loan_type TEXT,
+                    period INTEGER,
+                    principal INTEGER DEFAULT 0,
+                    outstanding INTEGER DEFAULT 0,
+                    status TEXT DEFAULT 'Open',
+                    guarantors TEXT,
+                    loan_image TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(group_id) REFERENCES groups(id),
+                    FOREIGN KEY(member_id) REFERENCES members(id),
+                    FOREIGN KEY(session_id) REFERENCES audit_sessions(id)
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS loan_repayments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    loan_id INTEGER,
+                    session_id INTEGER,
+                    amount INTEGER DEFAULT 0,
+                    FOREIGN KEY(loan_id) REFERENCES loans(id),
+                    FOREIGN KEY(session_id) REFERENCES audit_sessions(id)
+                )''')
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_group_status ON loans(group_id, status, period, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_member_open ON loans(member_id, loan_type, status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_session ON loans(session_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loan_repayments_session ON loan_repayments(session_id)")
+
+    # Migration for finalized_at (statement / analytics cache invalidation)
+    try:
+        c.execute("ALTER TABLE audit_sessions ADD COLUMN finalized_at TIMESTAMP")
+    except sqlite3.OperationalError:
+        pass
+
+    # Row versions for optimistic concurrency (see save_session / update_member_details)
+    for table in ('audit_sessions', 'members'):
+        try:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+
+    # Member statements read one member's transactions across all periods
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_member ON transactions(member_id, session_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_session ON transactions(session_id)")
+
+    # Keyset pagination of a group's history on (period, id)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_group_period ON audit_sessions(group_id, is_finalized, period, id)")
+
+    # Archive tier: one row per per-year archive file (see archive_sessions)
+    c.execute('''CREATE TABLE IF NOT EXISTS archive_files (
+                    year INTEGER PRIMARY KEY,
+                    path TEXT,
+                    sessions INTEGER DEFAULT 0,
+                    cutoff_period INTEGER,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+    # Per-group by-laws: interest rates and fines, each row in force from effective_period onwards
+    c.execute('''CREATE TABLE IF NOT EXISTS group_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id INTEGER,
+                    effective_period INTEGER,
+                    loan_rate REAL,
+                    advance_rate REAL,
+                    fine_late INTEGER,
+                    fine_absent INTEGER,
+                    fine_apology INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(group_id, effective_period),
+                    FOREIGN KEY(group_id) REFERENCES groups(id)
+                )''')
+
+    # Change tracking for offline device sync (see export_sync_bundle / import_sync_bundle)
+    install_change_tracking(c)
+
+    # Cross-group member search (see search_members)
+    install_member_search(c)
+    # Normalized ID / phone keys for duplicate detection (see find_identity_matches)
+    install_identity_keys(c)
+
+    # Legacy databases: build the ledger once from the finalized history
+    if not loans_table_exists:
+        rebuild_loan_ledger(c)
+
+    conn.commit()
+    conn.close()
+
+def generate_account_number():
+    """Generates a unique 6-digit account number."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    while True:
+        # Generate 6-digit string
+        acc_num = str(random.randint(100000, 999999))
+        c.execute("SELECT id FROM members WHERE account_number = ?", (acc_num,))
+        if not c.fetchone():
+            conn.close()
+            return acc_num
+
+def _meeting_dicts(rows):
+    return [{'id': r[0], 'name': r[1], 'meeting_date': r[2], 'recurrence': r[3]} for r in rows]
+
+def get_all_groups_extended():
+    """
+    Returns a list of dicts: {'id', 'name', 'meeting_date', 'recurrence'}, soonest meeting first.
+    Groups without a meeting date (meeting_date None) come last, by name.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT id, name, next_meeting_date, meeting_recurrence FROM groups "
+              "ORDER BY next_meeting_date IS NULL, next_meeting_date, name")
+    rows = c.fetchall()
+    conn.close()
+    return _meeting_dicts(rows)
+
+def get_upcoming_meetings(start=None, end=None, after=None, limit=MEETING_PAGE_SIZE, unscheduled=False):
+    """
+    Returns one page of groups whose next meeting falls between start and end (ISO dates, inclusive;
+    None leaves that side open), soonest first - a range scan of idx_groups_next_meeting.
+    unscheduled: list the groups without a meeting date instead (start/end are ignored).
+    after: (meeting_date, id) cursor from the previous page, or None for the first page.
+    Returns: (list of dicts like get_all_groups_extended, next_cursor) - next_cursor is None on the last page.
+    """
+    query = "SELECT id, name, next_meeting_date, meeting_recurrence FROM groups"
+    params = []
+    if unscheduled:
+        query += " WHERE next_meeting_date IS NULL"
+        if after:
+            query += " AND id > ?"
+            params.append(after[1])
+    else:
+        query += " WHERE next_meeting_date IS NOT NULL"
+        if start:
+            query += " AND next_meeting_date >= ?"
+            params.append(start)
+        if end:
+            query += " AND next_meeting_date <= ?"
+            params.append(end)
+        if after:
+            query += " AND (next_meeting_date, id) > (?, ?)"
+            params += list(after)
+    query += " ORDER BY next_meeting_date, id LIMIT ?"
+    params.append(limit + 1)
+    
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute(query, tuple(params)).fetchall()
+    conn.close()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][2], rows[-1][0])
+    return _meeting_dicts(rows), next_cursor
+
+def get_meeting_schedule(group_id):
+    """Returns (next_meeting_date or None, recurrence) for a group."""
+    conn = sqlite3.connect(DB_FILE)
+    row = conn.execute("SELECT next_meeting_date, meeting_recurrence FROM groups WHERE id = ?", (group_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None, DEFAULT_RECURRENCE
+    return row[0], row[1] or DEFAULT_RECURRENCE
+
+def set_meeting_schedule(group_id, next_meeting_date, recurrence):
+    """Sets a group's next meeting date (date, ISO string or None) and how it repeats; its day becomes the monthly day."""
+    conn = sqlite3.connect(DB_FILE)
+    next_date = str(next_meeting_date) if next_meeting_date else None
+    conn.execute("UPDATE groups SET next_meeting_date = ?, meeting_recurrence = ?, "
+                 "meeting_day = CAST(strftime('%d', ?) AS INTEGER) WHERE id = ?", (next_date, recurrence, next_date, group_id))
+    conn.commit()
+    conn.close()
+
+def advance_meeting_date(c, group_id, today=None):
+    """
+    Moves a group's next meeting to the first date of its schedule after today, inside the caller's
+    transaction. Dates still ahead are left alone, so re-finalizing an older month changes nothing.
+    Returns: the (possibly unchanged) next meeting date, or None if the group has none.
+    """
+    row = c.execute("SELECT next_meeting_date, meeting_recurrence, meeting_day FROM groups WHERE id = ?", (group_id,)).fetchone()
+    if not row or not row[0]:
+        return None
+    nxt = next_meeting_after(row[0], row[1] or DEFAULT_RECURRENCE, today or datetime.now().strftime('%Y-%m-%d'), day=row[2])
+    if nxt != row[0]:
+        c.execute("UPDATE groups SET next_meeting_date = ? WHERE id = ?", (nxt, group_id))
+    return nxt
+
+def load_group_data(group_id):
+    """
+    Loads members by GROUP ID (not name, for safety).
+    Returns: (group_name, members_list) 
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    c.execute("SELECT name FROM groups WHERE id = ?", (group_id,))
+    row = c.fetchone()
+    if not row:
+        conn.close()
+        return None, []
+        
+    group_name = row[0]
+    
+    c.execute("SELECT id, name FROM members WHERE group_id = ?", (group_id,))
+    members = c.fetchall()
+    
+    conn.close()
+    return group_name, members
+
+def get_member_lookup(group_id):
+    """Returns {member_id: (account_number, phone)} for a group in one query."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT id, account_number, phone FROM members WHERE group_id = ?", (group_id,))
+    rows = c.fetchall()
+    conn.close()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+def create_new_group(name, member_names, first_meeting_date, recurrence=DEFAULT_RECURRENCE):
+    """Creates a new group and its initial members. recurrence: how meetings repeat after the first one."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    try:
+        first = str(first_meeting_date) if first_meeting_date else None
+        c.execute("INSERT INTO groups (name, next_meeting_date, meeting_recurrence, meeting_day) "
+                  "VALUES (?, ?, ?, CAST(strftime('%d', ?) AS INTEGER))", (name, first, recurrence, first))
+        group_id = c.lastrowid
+        conn.commit() # Commit group first so FK works
+        conn.close() # Close to be safe, though add_member opens its own
+        
+        for m_name in member_names:
+            # Use add_member helper to ensure consistency
+            # Pass defaults for new KYC fields
+            add_member(group_id, m_name.strip(), phone="", id_num="")
+        
+        return group_id
+    except sqlite3.IntegrityError:
+        if conn: conn.close()
+        return None # Name exists
+    except Exception as e:
+        print(e)
+        if conn: conn.close()
+        return None
+
+def save_session(group_id, month, year, df, bank_close=0, base=None):
+    """
+    Saves the audit session data to the database.
+    base: {'version', 'df'} captured when the audit was opened (see capture_audit_base). If the session's
+    version has moved since, another auditor saved in between: their members are merged in where the edits
+    don't overlap, and AuditConflictError is raised (nothing written) where they do.
+    If later months were already finalized, they are recomputed from this month's CF.
+    A next meeting date that has passed moves on along the group's schedule (see advance_meeting_date).
+    Returns: (session_id, list of periods whose figures moved, merged ledger or None if no merge was needed,
+              bank closing written - recomputed from the merged cash flows when a merge happened)
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    # Hold the write lock from the version check to the commit
+    c.execute("BEGIN IMMEDIATE")
+    c.execute("SELECT id, version FROM audit_sessions WHERE group_id = ? AND month = ? AND year = ?", (group_id, month, year))
+    row = c.fetchone()
+    
+    merged = None
+    if base is not None and row and (row[1] or 0) != base['version']:
+        theirs = read_saved_ledger(c, row[0])
+        merged, taken, conflicts = merge_member_edits(base['df'], df, theirs)
+        if conflicts:
+            conn.rollback()
+            conn.close()
+            raise AuditConflictError(merged, theirs, conflicts, row[1] or 0)
+        df = merged
+        # Bank closing follows the merged cash flows (same rule as the allocation screen)
+        num = lambda col: pd.to_numeric(df[col], errors='coerce').fillna(0).sum()
+        cash_in = num('Total Cash Today')
+        money_out = num('New Loan') + num('New Advance') + num('Savings Withdrawal')
+        bank_close = int(max(get_previous_bank_balance(group_id, month, year) + cash_in - money_out, 0))
+    
+    # CF as replay_later_sessions would compute it (New Loan is entered after the collection screen's Calculate)
+    session_id = write_session(c, group_id, month, year, apply_carry_forward(df), bank_close)
+    moved = replay_later_sessions(c, group_id, get_period(month, year))
+    advance_meeting_date(c, group_id)
+    conn.commit()
+    conn.close()
+    return session_id, moved, merged, bank_close
+
+# transactions columns written from the ledger, in write_session's order
+TXN_WRITE_COLS = ['cash_today', 'fines', 'savings_bf', 'savings_today', 'savings_cf',
+                  'loan_bf', 'loan_principal', 'loan_interest', 'loan_cf',
+                  'advance_bf', 'advance_principal', 'advance_interest', 'advance_cf',
+                  'attendance_status', 'new_loan', 'new_advance', 'savings_withdrawal', 'guarantors', 'loan_image']
+
+def write_session(c, group_id, month, year, df, bank_close=0):
+    """
+    Writes one finalized session + its transactions inside the caller's transaction.
+    A re-finalize updates each member's row in place (keyed by session and member) and only when it
+    changed, so sync bundles carry just the members that moved.
+    """
+    # Check if session exists
+    c.execute("SELECT id FROM audit_sessions WHERE group_id = ? AND month = ? AND year = ?", (group_id, month, year))
+    row = c.fetchone()
+    
+    period = get_period(month, year)
+
+    if row:
+        session_id = row[0]
+        # Update existing session finalize status and bank balance
+        c.execute("UPDATE audit_sessions SET is_finalized = 1, bank_balance_closing = ?, period = ?, finalized_at = CURRENT_TIMESTAMP, "
+                  "version = COALESCE(version, 0) + 1 WHERE id = ?", (bank_close, period, session_id))
+    else:
+        # Create new session
+        c.execute("INSERT INTO audit_sessions (group_id, month, year, is_finalized, bank_balance_closing, period, finalized_at, version) VALUES (?, ?, ?, 1, ?, ?, CURRENT_TIMESTAMP, 1)", 
+                  (group_id, month, year, bank_close, period))
+        session_id = c.lastrowid
+        
+    # 2. Transactions, updated in place per member: unchanged rows keep their uid and stay out of change_log
+    c.execute(f"SELECT member_id, id, {', '.join(TXN_WRITE_COLS)} FROM transactions WHERE session_id = ?", (session_id,))
+    existing = {r[0]: (r[1], tuple(r[2:])) for r in c.fetchall()}
+    set_clause = ", ".join(f"{col} = ?" for col in TXN_WRITE_COLS)
+    # df should have 'Member ID' and all financial columns
+    for _, row in df.iterrows():
+        # Ensure fallback to defaults if NaN or missing
+        def get_val(key):
+            try:
+                val = row[key]
+                return int(float(val)) if pd.notnull(val) else 0
+            except (ValueError, KeyError):
+                return 0
+        
+        def get_text(key, default=None):
+            val = row.get(key, default)
+            return val if pd.notnull(val) else None
+                
+        values = (get_val('Total Cash Today'), get_val('Fines'),
+                  get_val('Savings BF'), get_val('Savings Today'), get_val('Savings CF'),
+                  get_val('Loan BF'), get_val('Loan Principal'), get_val('Loan Interest'), get_val('Loan CF'),
+                  get_val('Advance BF'), get_val('Advance Principal'), get_val('Advance Interest'), get_val('Advance CF'),
+                  get_text('Attendance', 'Present'),
+                  get_val('New Loan'), get_val('New Advance'), get_val('Savings Withdrawal'),
+                  get_text('Guarantors'), get_text('Loan Image'))
+        member_id = int(row['Member ID'])
+        if member_id in existing:
+            txn_id, current = existing.pop(member_id)
+            if current != values:
+                c.execute(f"UPDATE transactions SET {set_clause} WHERE id = ?", values + (txn_id,))
+        else:
+            c.execute(f"INSERT INTO transactions (session_id, member_id, {', '.join(TXN_WRITE_COLS)}) "
+                      f"VALUES ({', '.join('?' * (len(TXN_WRITE_COLS) + 2))})", (session_id, member_id) + values)
+    # Members no longer in this month's ledger
+    c.executemany("DELETE FROM transactions WHERE id = ?", [(txn_id,) for txn_id, _ in existing.values()])
+
+    # 3. Keep the Loans Ledger in step (new allocations + repayments)
+    sync_loan_ledger(c, group_id, session_id, period)
+    return session_id
+
+# --- Loans Ledger ---
+
+def sync_loan_ledger(c, group_id, session_id, period):
+    """
+    Applies a finalized session to the loans ledger (inside the caller's transaction).
+    1. Reverses repayments this session made earlier (re-finalize is idempotent).
+    2. Opens / resizes loans for New Loan and New Advance allocations.
+    3. Applies Loan / Advance Principal repayments to the member's open loans, oldest first.
+    """
+    # 1. Undo previous repayments by this session
+    c.execute("SELECT loan_id, amount FROM loan_repayments WHERE session_id = ?", (session_id,))
+    for loan_id, amount in c.fetchall():
+        c.execute("UPDATE loans SET outstanding = outstanding + ?, status = 'Open' WHERE id = ?", (amount, loan_id))
+    c.execute("DELETE FROM loan_repayments WHERE session_id = ?", (session_id,))
+
+    c.execute('''SELECT id, member_id, new_loan, new_advance, loan_principal, advance_principal, guarantors, loan_image
+                 FROM transactions WHERE session_id = ?''', (session_id,))
+    txns = c.fetchall()
+
+    # 2. Allocations: one loan per member per type per session
+    c.execute("SELECT id, member_id, loan_type, principal, outstanding FROM loans WHERE session_id = ?", (session_id,))
+    existing = {(r[1], r[2]): (r[0], r[3], r[4]) for r in c.fetchall()}
+
+    allocated = set()
+    for tid, mid, new_loan, new_adv, _, _, guarantors, loan_image in txns:
+        for loan_type, amount in (("Loan", new_loan or 0), ("Advance", new_adv or 0)):
+            if amount <= 0:
+                continue
+            allocated.add((mid, loan_type))
+            if (mid, loan_type) in existing:
+                loan_id, principal, outstanding = existing[(mid, loan_type)]
+                outstanding = max(outstanding + amount - principal, 0)
+                c.execute('''UPDATE loans SET transaction_id = ?, principal = ?, outstanding = ?, status = ?,
+                                period = ?, guarantors = ?,
+                                loan_image = COALESCE(loan_image, ?)
+                             WHERE id = ?''',
+                          (tid, amount, outstanding, "Open" if outstanding > 0 else "Closed",
+                           period, guarantors, loan_image, loan_id))
+            else:
+                c.execute('''INSERT INTO loans (group_id, member_id, session_id, transaction_id, loan_type, period,
+                                                principal, outstanding, status, guarantors, loan_image)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Open', ?, ?)''',
+                          (group_id, mid, session_id, tid, loan_type, period, amount, amount, guarantors, loan_image))
+
+    # Allocations removed on re-finalize
+    for key, (loan_id, _, _) in existing.items():
+        if key not in allocated:
+            c.execute("DELETE FROM loan_repayments WHERE loan_id = ?", (loan_id,))
+            c.execute("DELETE FROM loans WHERE id = ?", (loan_id,))
+
+    # 3. Repayments: oldest open loan first, only loans issued before this period
+    for tid, mid, _, _, loan_prin, adv_prin, _, _ in txns:
+        for loan_type, paid in (("Loan", loan_prin or 0), ("Advance", adv_prin or 0)):
+            if paid <= 0:
+                continue
+            c.execute('''SELECT id, outstanding FROM loans
+                         WHERE member_id = ? AND loan_type = ? AND status = 'Open' AND period < ?
+                         ORDER BY period ASC, id ASC''', (mid, loan_type, period))
+            for loan_id, outstanding in c.fetchall():
+                if paid <= 0:
+                    break
+                applied = min(paid, outstanding)
+                paid -= applied
+                remaining = outstanding - applied
+                c.execute("UPDATE loans SET outstanding = ?, status = ? WHERE id = ?",
+                          (remaining, "Open" if remaining > 0 else "Closed", loan_id))
+                c.execute("INSERT INTO loan_repayments (loan_id, session_id, amount) VALUES (?, ?, ?)",
+                          (loan_id, session_id, applied))
+
+# --- Historical Backfill ---
+BACKFILL_NUMERIC_COLS = [
+    'Total Cash Today', 'Fines',
+    'Savings BF', 'Savings Today', 'Savings Withdrawal', 'Savings CF',
+    'Loan BF', 'New Loan', 'Loan Principal', 'Loan Interest', 'Loan CF',
+    'Advance BF', 'New Advance', 'Advance Principal', 'Advance Interest', 'Advance CF'
+]
+# (BF column, CF column of the previous month it must equal)
+BF_CF_LINKS = [('Savings BF', 'Savings CF'), ('Loan BF', 'Loan CF'), ('Advance BF', 'Advance CF')]
+
+def parse_backfill_file(raw_df, group_id):
+    """
+    Maps a multi-month ledger file (same layout as the Master Ledger export) onto the group's members.
+    Members are matched by Account No, falling back to Member Name.
+    Returns: (ledger_df with 'Member ID' and 'Period', errors_df)
+    """
+    df = raw_df.copy()
+    df.columns = [str(col).strip() for col in df.columns]
+    
+    missing = [col for col in ['Month', 'Year'] if col not in df.columns]
+    if 'Account No' not in df.columns and 'Member Name' not in df.columns:
+        missing.append('Account No / Member Name')
+    if missing:
+        return pd.DataFrame(), pd.DataFrame([{'Row': '-', 'Problem': f"Missing column: {col}"} for col in missing])
+    
+    df['row'] = df.index + 2 # Header is line 1
+    problems = []
+    
+    # Period from Month (name or 1-12) + Year
+    month_idx = df['Month'].astype(str).str.strip().str.title().map({m: i for i, m in enumerate(MONTHS)})
+    month_num = pd.to_numeric(df['Month'], errors='coerce')
+    month_idx = month_idx.fillna(month_num.where(month_num.between(1, 12)) - 1)
+    year = pd.to_numeric(df['Year'], errors='coerce')
+    df['Period'] = year * 12 + month_idx
+    bad = df[df['Period'].isna()]
+    problems.append(pd.DataFrame({'Row': bad['row'], 'Problem': "Unrecognised Month / Year"}))
+    
+    # Member ID from Account No, else Name
+    lookup = get_member_lookup(group_id)
+    _, members = load_group_data(group_id)
+    by_acc = {str(acc): mid for mid, (acc, _) in lookup.items() if acc}
+    by_name = {str(name).strip().lower(): mid for mid, name in members}
+    
+    member_id = pd.Series(pd.NA, index=df.index, dtype="Int64")
+    if 'Account No' in df.columns:
+        accounts = df['Account No']
+        if pd.api.types.is_float_dtype(accounts):
+            # Numeric upload with blanks: 123456.0 -> "123456"
+            accounts = accounts.round().astype("Int64")
+        member_id = accounts.astype(str).str.strip().map(by_acc).astype("Int64")
+    if 'Member Name' in df.columns:
+        member_id = member_id.fillna(df['Member Name'].astype(str).str.strip().str.lower().map(by_name).astype("Int64"))
+    df['Member ID'] = member_id
+    unknown = df[df['Member ID'].isna()]
+    problems.append(pd.DataFrame({'Row': unknown['row'], 'Problem': "Member not found in this group"}))
+    
+    dups = df[df['Member ID'].notna() & df['Period'].notna() & df.duplicated(['Member ID', 'Period'], keep=False)]
+    problems.append(pd.DataFrame({'Row': dups['row'], 'Problem': "Member appears twice in the same month"}))
+    
+    for col in BACKFILL_NUMERIC_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int) if col in df.columns else 0
+    if 'Attendance' not in df.columns:
+        df['Attendance'] = "Present"
+    
+    errors = pd.concat(problems, ignore_index=True)
+    ledger = df.dropna(subset=['Period', 'Member ID']).copy()
+    ledger['Period'] = ledger['Period'].astype(int)
+    ledger['Member ID'] = ledger['Member ID'].astype(int)
+    ledger['Month'] = ledger['Period'].map(lambda p: MONTHS[p % 12])
+    ledger['Year'] = ledger['Period'] // 12
+    return ledger, errors
+
+def validate_bf_cf_chain(ledger, group_id):
+    """
+    Checks every member's BF against the previous month's CF, column-wise, via a shifted join.
+    The previous month comes from the file itself or, for the earliest months, the database.
+    A member missing from an existing previous month is expected to open at 0.
+    Returns: DataFrame of broken links (Member, Period, Field, Expected, Found).
+    """
+    cf_cols = [cf for _, cf in BF_CF_LINKS]
+    prev = ledger[['Member ID', 'Period'] + cf_cols]
+    available = set(ledger['Period'])
+    
+    # Predecessors that are not in the file: one query for all of them
+    needed = sorted({int(p) - 1 for p in ledger['Period'].unique()} - available)
+    if needed:
+        conn = sqlite3.connect(DB_FILE)
+        marks = ",".join("?" * len(needed))
+        db_prev = pd.read_sql_query(
+            f'''SELECT t.member_id AS "Member ID", s.period AS "Period",
+                      t.savings_cf AS "Savings CF", t.loan_cf AS "Loan CF", t.advance_cf AS "Advance CF"
+               FROM transactions t JOIN audit_sessions s ON t.session_id = s.id
+               WHERE s.group_id = ? AND s.is_finalized = 1 AND s.period IN ({marks})''',
+            conn, params=[group_id] + needed)
+        conn.close()
+        available |= set(db_prev['Period'])
+        prev = pd.concat([prev, db_prev], ignore_index=True)
+    
+    # Shift: last month's CF becomes this month's expected BF
+    prev = prev.assign(Period=prev['Period'] + 1).rename(columns={cf: f"{cf} Prev" for cf in cf_cols})
+    merged = ledger.merge(prev, on=['Member ID', 'Period'], how='left')
+    has_prev = (merged['Period'] - 1).isin(available)
+    
+    broken = []
+    for bf, cf in BF_CF_LINKS:
+        expected = merged[f"{cf} Prev"].fillna(0).astype(int)
+        bad = merged[has_prev & (merged[bf] != expected)]
+        broken.append(pd.DataFrame({
+            'Member ID': bad['Member ID'],
+            'Member': bad['Member Name'] if 'Member Name' in bad.columns else bad['Member ID'].astype(str),
+            'Period': bad['Period'],
+            'Field': bf,
+            'Expected (Prev CF)': expected[bad.index],
+            'Found': bad[bf]
+        }))
+    result = pd.concat(broken, ignore_index=True).sort_values(['Period', 'Member', 'Field']).reset_index(drop=True)
+    result['Period'] = result['Period'].map(period_label)
+    return result
+
+def get_finalized_periods(group_id):
+    """Set of periods the group already has finalized sessions for."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT period FROM audit_sessions WHERE group_id = ? AND is_finalized = 1", (group_id,))
+    periods = {r[0] for r in c.fetchall()}
+    conn.close()
+    return periods
+
+def backfill_sessions(group_id, ledger, periods, progress=None):
+    """
+    Writes the given months of a validated backfill in one transaction, oldest first.
+    progress: optional callback(fraction, message), called once per month.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    try:
+        for i, period in enumerate(sorted(int(p) for p in periods)):
+            if progress:
+                progress(i / len(periods), f"Writing {period_label(period)}")
+            month_df = ledger[ledger['Period'] == period]
+            bank_close = int(pd.to_numeric(month_df['Bank Balance'], errors='coerce').fillna(0).iloc[0]) if 'Bank Balance' in month_df.columns else 0
+            write_session(c, group_id, MONTHS[period % 12], period // 12, month_df, bank_close)
+        # Earliest first, so months already in the database between or after backfilled ones follow from their CF
+        for period in sorted(int(p) for p in periods):
+            replay_later_sessions(c, group_id, period)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(periods)
+
+# --- Group Rules (By-Laws) ---
+def fetch_group_rules(c, group_id):
+    """All rule rows for a group, oldest first, read through the caller's cursor."""
+    c.execute(f"SELECT effective_period, {', '.join(RULE_COLS)} FROM group_rules WHERE group_id = ? ORDER BY effective_period",
+              (group_id,))
+    return pd.DataFrame(c.fetchall(), columns=['effective_period'] + RULE_COLS)
+
+def get_group_rules(group_id):
+    conn = sqlite3.connect(DB_FILE)
+    rules = fetch_group_rules(conn.cursor(), group_id)
+    conn.close()
+    return rules
+
+def save_group_rule(group_id, effective_period, rules):
+    """Adds (or replaces) the group's rules taking effect from `effective_period`."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute(f'''INSERT OR REPLACE INTO group_rules (group_id, effective_period, {', '.join(RULE_COLS)})
+                  VALUES (?, ?, {', '.join('?' for _ in RULE_COLS)})''',
+              (group_id, int(effective_period)) + tuple(rules[col] for col in RULE_COLS))
+    conn.commit()
+    conn.close()
+
+def delete_group_rule(group_id, effective_period):
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("DELETE FROM group_rules WHERE group_id = ? AND effective_period = ?", (group_id, int(effective_period)))
+    conn.commit()
+    conn.close()
+
+def replay_later_sessions(c, group_id, from_period):
+    """
+    Replays the finalized months after `from_period`, in order, inside the caller's transaction.
+    Each month takes BF from the previous month's CF and reruns the waterfall for all members at once.
+    Only rows whose values changed are written; the replay stops at the first month that didn't move
+    (or at a gap in the months, where carry-forward doesn't apply). Bank closings are then re-chained
+    through every later finalized month with the same rule as save_session. Rewritten sessions get a
+    new finalized_at and version, so exports and other open audits pick the change up.
+    Returns: list of periods that changed.
+    """
+    touched = {} # session id -> period
+    period = from_period
+    db_cols = list(TXN_LEDGER_COLS.keys())
+    rules_df = fetch_group_rules(c, group_id)
+    
+    while True:
+        c.execute("SELECT id FROM audit_sessions WHERE group_id = ? AND period = ? AND is_finalized = 1", (group_id, period))
+        prev_row = c.fetchone()
+        c.execute("SELECT id FROM audit_sessions WHERE group_id = ? AND period = ? AND is_finalized = 1", (group_id, period + 1))
+        next_row = c.fetchone()
+        if not prev_row or not next_row:
+            break
+        
+        c.execute("SELECT member_id, savings_cf, loan_cf, advance_cf FROM transactions WHERE session_id = ?", (prev_row[0],))
+        prev_cf = pd.DataFrame(c.fetchall(), columns=['member_id', 'Savings BF', 'Loan BF', 'Advance BF'])
+        
+        c.execute(f"SELECT id, member_id, {', '.join(db_cols)} FROM transactions WHERE session_id = ?", (next_row[0],))
+        current = pd.DataFrame(c.fetchall(), columns=['id', 'member_id'] + db_cols).fillna(0)
+        if current.empty:
+            break
+        
+        # Shifted join: previous CF becomes this month's BF (0 for members new this month)
+        ledger = current.rename(columns=TXN_LEDGER_COLS).drop(columns=['Savings BF', 'Loan BF', 'Advance BF'])
+        ledger = ledger.merge(prev_cf, on='member_id', how='left').fillna({'Savings BF': 0, 'Loan BF': 0, 'Advance BF': 0})
+        recalculated = apply_waterfall(ledger, rules_for_period(rules_df, period + 1)).rename(columns={v: k for k, v in TXN_LEDGER_COLS.items()})
+        
+        new_vals = recalculated.set_index('id')[REPLAY_COLS].astype(int)
+        old_vals = current.set_index('id').loc[new_vals.index, REPLAY_COLS].astype(int)
+        changed = new_vals[(new_vals != old_vals).any(axis=1)]
+        if changed.empty:
+            break
+        
+        set_clause = ", ".join(f"{col} = ?" for col in REPLAY_COLS)
+        c.executemany(f"UPDATE transactions SET {set_clause} WHERE id = ?",
+                      [tuple(int(v) for v in vals) + (int(tid),) for tid, vals in zip(changed.index, changed.values)])
+        period += 1
+        touched[next_row[0]] = period
+    
+    # Bank: previous closing + cash in - money out, floored at 0, over the (unchanged) cash flows of each month
+    c.execute('''SELECT s.id, s.period, COALESCE(s.bank_balance_closing, 0), SUM(COALESCE(t.cash_today, 0)),
+                        SUM(COALESCE(t.new_loan, 0) + COALESCE(t.new_advance, 0) + COALESCE(t.savings_withdrawal, 0))
+                 FROM audit_sessions s LEFT JOIN transactions t ON t.session_id = s.id
+                 WHERE s.group_id = ? AND s.is_finalized = 1 AND s.period >= ?
+                 GROUP BY s.id ORDER BY s.period, s.id''', (group_id, from_period))
+    flows = c.fetchall()
+    bank_updates = []
+    prev_close = flows[0][2] if flows else 0
+    for session_id, p, closing, cash_in, money_out in flows[1:]:
+        expected = int(max(prev_close + (cash_in or 0) - (money_out or 0), 0))
+        if expected != closing:
+            bank_updates.append((expected, session_id))
+            touched[session_id] = p
+        prev_close = expected
+    c.executemany("UPDATE audit_sessions SET bank_balance_closing = ? WHERE id = ?", bank_updates)
+    c.executemany("UPDATE audit_sessions SET finalized_at = CURRENT_TIMESTAMP, version = COALESCE(version, 0) + 1 WHERE id = ?",
+                  [(session_id,) for session_id in touched])
+    return sorted(set(touched.values()))
+
+def get_session_version(group_id, month, year):
+    """Version of a group's session for the month (0 if none saved yet)."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT version FROM audit_sessions WHERE group_id = ? AND month = ? AND year = ?", (group_id, month, year))
+    row = c.fetchone()
+    conn.close()
+    return (row[0] or 0) if row else 0
+
+def read_saved_ledger(c, session_id):
+    """The saved transactions of a session as a ledger DataFrame (audit_df column names)."""
+    db_cols = list(TXN_LEDGER_COLS.keys()) + ['new_advance', 'savings_withdrawal', 'attendance_status', 'guarantors', 'loan_image']
+    c.execute(f"SELECT member_id, {', '.join(db_cols)} FROM transactions WHERE session_id = ?", (session_id,))
+    return pd.DataFrame(c.fetchall(), columns=['Member ID'] + MERGE_COLS)
+
+def rebuild_loan_ledger(c):
+    """Replays every finalized session, in period order, into an empty loans ledger."""
+    c.execute("SELECT id, group_id, period FROM audit_sessions WHERE is_finalized = 1 ORDER BY period ASC, id ASC")
+    for session_id, group_id, period in c.fetchall():
+        sync_loan_ledger(c, group_id, session_id, period)
+
+def get_previous_month_data(group_id, current_month, current_year):
+    """
+    Finds the most recent finalized session BEFORE the current month/year.
+    For strict 'Previous Month' logic, we calculate expected prev month.
+    Returns: DataFrame containing CF values renamed to BF, or None.
+    """
+    months = ["January", "February", "March", "April", "May", "June", 
+              "July", "August", "September", "October", "November", "December"]
+    
+    try:
+        curr_idx = months.index(current_month)
+        if curr_idx == 0:
+            prev_month = "December"
+            prev_year = current_year - 1
+        else:
+            prev_month = months[curr_idx - 1]
+            prev_year = current_year
+    except ValueError:
+        return None
+
+    # The previous month may already be in the archive
+    conn = open_history([prev_year] if prev_year in get_archive_years() else [])
+    c = conn.cursor()
+    
+    # Find session ID
+    c.execute("SELECT id FROM history_sessions WHERE group_id=? AND month=? AND year=? AND is_finalized=1", 
+              (group_id, prev_month, prev_year))
+    res = c.fetchone()
+    
+    if not res:
+        conn.close()
+        return None
+        
+    session_id = res[0]
+    
+    # Fetch Data
+    query = '''
+        SELECT m.name, m.id, 
+               t.savings_cf, t.loan_cf, t.advance_cf
+        FROM history_transactions t
+        JOIN members m ON t.member_id = m.id
+        WHERE t.session_id = ?
+    '''
+    c.execute(query, (session_id,))
+    rows = c.fetchall()
+    conn.close()
+    
+    # Create DF with "BF" columns mapped from "CF"
+    data = []
+    for r in rows:
+        # r: name, id, sav_cf, loan_cf, adv_cf
+        data.append({
+            'Member Name': r[0],
+            'Member ID': r[1],
+            'Savings BF': r[2],
+            'Loan BF': r[3],
+            'Advance BF': r[4]
+        })
+        
+    return pd.DataFrame(data)
+
+def get_audit_history(group_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Returns one page of finalized sessions for a group, newest period first.
+    before: (period, id) cursor from the previous page, or None for the first page.
+    Archive years are only attached once a page runs past the live database, newest first,
+    ARCHIVE_ATTACH_LIMIT files at a time (archived months are all older than the live ones).
+    Returns: (rows, next_cursor) - next_cursor is None on the last page.
+    """
+    query = "SELECT id, month, year, created_at, period FROM history_sessions WHERE group_id=? AND is_finalized=1"
+    params = [group_id]
+    if before:
+        query += " AND (period, id) < (?, ?)"
+        params += list(before)
+    query += " ORDER BY period DESC, id DESC LIMIT ?"
+    
+    older_years = [y for y in get_archive_years() if not before or y <= before[0] // 12]
+    batches = [([], True)] + [(older_years[max(end - ARCHIVE_ATTACH_LIMIT, 0):end], False)
+                              for end in range(len(older_years), 0, -ARCHIVE_ATTACH_LIMIT)]
+    rows = []
+    for years, include_hot in batches:
+        conn = open_history(years, include_hot=include_hot)
+        rows += conn.execute(query, tuple(params) + (limit + 1 - len(rows),)).fetchall()
+        conn.close()
+        if len(rows) > limit:
+            break
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][4], rows[-1][0])
+    return rows, next_cursor
+
+def get_previous_bank_balance(group_id, current_month, current_year):
+    """
+    Retrieves the closing bank balance from the LAST finalized session.
+    It does NOT require strict consecutive months (handles skipped months).
+    """
+    try:
+        curr_val = get_period(current_month, current_year)
+    except ValueError:
+        return 0
+    
+    query = '''SELECT bank_balance_closing FROM history_sessions
+               WHERE group_id=? AND is_finalized=1 AND period < ?
+               ORDER BY period DESC, id DESC LIMIT 1'''
+    # Live database first; the archive only if the group has nothing newer
+    older_years = [y for y in get_archive_years() if y <= int(current_year)]
+    for years in ([], older_years[-ARCHIVE_ATTACH_LIMIT:]):
+        conn = open_history(years)
+        row = conn.execute(query, (group_id, curr_val)).fetchone()
+        conn.close()
+        if row or not older_years:
+            break
+    
+    if not row:
+        return 0
+    return int(row[0] or 0)
+
+def load_full_session_data(session_id):
+    """Loads all transaction data + attendance for a session (from the archive if it has been moved there)."""
+    query = '''
+        SELECT m.name, m.id,
+               t.cash_today, t.fines,
+               t.savings_bf, t.savings_today, t.savings_cf,
+               t.loan_bf, t.loan_principal, t.loan_interest, t.loan_cf,
+               t.advance_bf, t.advance_principal, t.advance_interest, t.advance_cf,
+               t.attendance_status, t.new_loan, t.new_advance, t.savings_withdrawal, t.guarantors, t.loan_image
+        FROM history_transactions t
+        JOIN members m ON t.member_id = m.id
+        WHERE t.session_id = ?
+    '''
+    rows = read_history(query, (session_id,), years=[])
+    if rows.empty:
+        rows = read_history(query, (session_id,))
+    
+    cols = [
+        'Member Name', 'Member ID', 
+        'Total Cash Today', 'Fines', 
+        'Savings BF', 'Savings Today', 'Savings CF',
+        'Loan BF', 'Loan Principal', 'Loan Interest', 'Loan CF',
+        'Advance BF', 'Advance Principal', 'Advance Interest', 'Advance CF',
+        'Attendance', 'New Loan', 'New Advance', 'Savings Withdrawal', 'Guarantors', 'Loan Image'
+    ]
+    rows.columns = cols
+    return rows
+
+# --- Ledger Export (XLSX / CSV, streamed from the cursor) ---
+LEDGER_EXPORT_COLS = [
+    ('Group', 'g.name'), ('Month', 's.month'), ('Year', 's.year'),
+    ('Account No', 'm.account_number'), ('Member Name', 'm.name'), ('Attendance', 't.attendance_status'),
+    ('Total Cash Today', 't.cash_today'), ('Fines', 't.fines'),
+    ('Savings BF', 't.savings_bf'), ('Savings Today', 't.savings_today'),
+    ('Savings Withdrawal', 't.savings_withdrawal'), ('Savings CF', 't.savings_cf'),
+    ('Loan BF', 't.loan_bf'), ('New Loan', 't.new_loan'), ('Loan Principal', 't.loan_principal'),
+    ('Loan Interest', 't.loan_interest'), ('Loan CF', 't.loan_cf'),
+    ('Advance BF', 't.advance_bf'), ('New Advance', 't.new_advance'), ('Advance Principal', 't.advance_principal'),
+    ('Advance Interest', 't.advance_interest'), ('Advance CF', 't.advance_cf'),
+    ('Guarantors', 't.guarantors')
+]
+EXPORT_BATCH_SIZE = 500
+
+def iter_ledger_rows(group_id, session_id=None, year=None):
+    """
+    Yields Master Ledger rows for one session, one year, or a group's full history.
+    Rows are pulled from the cursor in batches, so memory stays flat however long the history is.
+    Archived years are read through the history views, oldest first.
+    """
+    select_cols = ", ".join(col for _, col in LEDGER_EXPORT_COLS)
+    query = f'''
+        SELECT {select_cols}
+        FROM history_transactions t
+        JOIN history_sessions s ON t.session_id = s.id
+        JOIN groups g ON s.group_id = g.id
+        LEFT JOIN members m ON t.member_id = m.id
+        WHERE s.group_id = ? AND s.is_finalized = 1
+    '''
+    params = [group_id]
+    if session_id is not None:
+        query += " AND s.id = ?"
+        params.append(session_id)
+    if year is not None:
+        query += " AND s.year = ?"
+        params.append(year)
+    query += " ORDER BY s.period, s.id, t.id"
+    
+    archived = get_archive_years()
+    for conn in history_batches([year] if year in archived else [] if year is not None else archived):
+        try:
+            c = conn.cursor()
+            c.execute(query, tuple(params))
+            while True:
+                batch = c.fetchmany(EXPORT_BATCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    yield row
+        finally:
+            conn.close()
+
+def export_ledger(fmt, group_id, session_id=None, year=None):
+    """
+    Streams the ledger to an XLSX (openpyxl write-only mode) or CSV file in a temporary directory,
+    so the rows never sit in memory as a DataFrame. The directory is removed before returning.
+    Returns: the file's bytes.
+    """
+    header = [label for label, _ in LEDGER_EXPORT_COLS]
+    rows = iter_ledger_rows(group_id, session_id=session_id, year=year)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"ledger.{fmt}")
+        if fmt == "xlsx":
+            from openpyxl import Workbook
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Master Ledger")
+            ws.append(header)
+            for row in rows:
+                ws.append(list(row))
+            wb.save(path)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+        with open(path, "rb") as f:
+            return f.read()
+
+def get_finalized_sessions_by_year(group_id):
+    """Returns {year: [(session_id, month), ...]} in period order, for export pickers."""
+    rows = read_history("SELECT id, month, year, period FROM history_sessions WHERE group_id = ? AND is_finalized = 1", (group_id,))
+    rows = rows.sort_values(['period', 'id'], ascending=False)
+    
+    by_year = {}
+    for sid, month, year in zip(rows['id'].astype(int), rows['month'], rows['year'].astype(int)):
+        by_year.setdefault(year, []).append((sid, month))
+    return by_year
+
+# --- Device Sync (change log + compressed delta bundles) ---
+# Synced tables in dependency order, with their foreign keys: {fk column: (parent table, uid column in the bundle)}
+SYNC_TABLES = {
+    'groups': {},
+    'members': {'group_id': ('groups', 'group_uid')},
+    'audit_sessions': {'group_id': ('groups', 'group_uid')},
+    'transactions': {'session_id': ('audit_sessions', 'session_uid'), 'member_id': ('members', 'member_uid')},
+}
+
+def install_change_tracking(c):
+    """
+    Gives every synced row a uid that is the same in every copy of the database, and logs each
+    insert/update/delete to change_log through triggers. Rows that predate tracking get 'legacy-<table>-<id>',
+    so copies of one database agree on them without a sync.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tbl TEXT,
+                    row_uid TEXT,
+                    op TEXT
+                )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log(tbl, row_uid, seq)")
+    c.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+    c.execute("INSERT OR IGNORE INTO sync_state (key, value) VALUES ('device_id', lower(hex(randomblob(8))))")
+    # One row per device whose bundles were imported here: how far we've read its log, and ours at that moment
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_peers (
+                    device_id TEXT PRIMARY KEY,
+                    remote_seq INTEGER DEFAULT 0,
+                    local_seq INTEGER DEFAULT 0,
+                    imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+    for table in SYNC_TABLES:
+        try:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT")
+        except sqlite3.OperationalError:
+            pass
+        c.execute(f"UPDATE {table} SET uid = 'legacy-{table}-' || id WHERE uid IS NULL")
+        c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table}(uid)")
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {table} BEGIN
+                        UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id AND NEW.uid IS NULL;
+                        INSERT INTO change_log (tbl, row_uid, op) VALUES ('{table}', (SELECT uid FROM {table} WHERE id = NEW.id), 'U');
+                      END''')
+        # OLD.uid is NULL only for the insert trigger's own uid assignment
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_update AFTER UPDATE ON {table} WHEN OLD.uid IS NOT NULL BEGIN
+                        INSERT INTO change_log (tbl, row_uid, op) VALUES ('{table}', NEW.uid, 'U');
+                      END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {table} BEGIN
+                        INSERT INTO change_log (tbl, row_uid, op) VALUES ('{table}', OLD.uid, 'D');
+                      END''')
+
+# --- Member Search (FTS5, all groups) ---
+def _strip_sql(expr, chars):
+    """SQL for `expr` with each of `chars` removed."""
+    for ch in chars:
+        expr = f"replace({expr}, '{ch}', '')"
+    return expr
+
+def _digits_sql(expr):
+    """SQL for `expr` with the separators people type in phone numbers removed."""
+    return _strip_sql(expr, PHONE_CHARS)
+
+def _member_search_values(row):
+    """SELECT list filling member_search from a members row (`row` is NEW or a table alias)."""
+    phone = _digits_sql(f"COALESCE({row}.phone, '')")
+    return f'''{row}.id, {row}.name,
+               {phone} || CASE WHEN {phone} LIKE '254_%' THEN ' 0' || substr({phone}, 4) ELSE '' END,
+               COALESCE({row}.national_id, '') || ' ' || COALESCE({row}.id_number, ''),
+               COALESCE(CAST({row}.account_number AS TEXT), ''), COALESCE({row}.residence, '')'''
+
+def install_member_search(c):
+    """
+    Full-text index over every member's name, phone, ID numbers, account number and residence
+    (rowid = members.id), kept current by triggers. Built from the members table the first time.
+    """
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='member_search'")
+    exists = c.fetchone() is not None
+    # Prefix indexes make "wanj*" / "0712*" lookups a single b-tree seek
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS member_search USING fts5(
+                    name, phone, id_no, account, residence, tokenize='unicode61', prefix='2 3 4')''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_member_search_insert AFTER INSERT ON members BEGIN
+                    INSERT INTO member_search (rowid, name, phone, id_no, account, residence) VALUES ({_member_search_values('NEW')});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_member_search_update
+                  AFTER UPDATE OF name, phone, national_id, id_number, account_number, residence ON members BEGIN
+                    DELETE FROM member_search WHERE rowid = OLD.id;
+                    INSERT INTO member_search (rowid, name, phone, id_no, account, residence) VALUES ({_member_search_values('NEW')});
+                  END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_member_search_delete AFTER DELETE ON members BEGIN
+                    DELETE FROM member_search WHERE rowid = OLD.id;
+                  END''')
+    if not exists:
+        c.execute(f"INSERT INTO member_search (rowid, name, phone, id_no, account, residence) SELECT {_member_search_values('m')} FROM members m")
+
+def search_members(query, limit=SEARCH_MAX_RESULTS):
+    """
+    Finds members in every group by name, phone, national ID / ID number, account number or residence
+    (each word as a prefix), best matches first.
+    Returns: DataFrame [Member ID, Group ID, Name, Group, Account No, Phone, ID Number, Residence]
+    """
+    match = fts_member_query(query)
+    cols = ['Member ID', 'Group ID', 'Name', 'Group', 'Account No', 'Phone', 'ID Number', 'Residence']
+    if not match:
+        return pd.DataFrame(columns=cols)
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute('''
+        SELECT m.id, m.group_id, m.name, g.name, m.account_number, m.phone,
+               COALESCE(NULLIF(m.national_id, ''), m.id_number), m.residence
+        FROM member_search s
+        JOIN members m ON m.id = s.rowid
+        LEFT JOIN groups g ON g.id = m.group_id
+        WHERE member_search MATCH ?
+        ORDER BY s.rank
+        LIMIT ?
+    ''', (match, limit)).fetchall()
+    conn.close()
+    return pd.DataFrame(rows, columns=cols)
+
+# --- Identity Keys (duplicate members across groups) ---
+def _identity_exprs(row):
+    """(kind, SQL expression) for each identity key of a members row; same normalization as normalize_identity."""
+    exprs = []
+    for col in ('national_id', 'id_number'):
+        exprs.append(('id', "upper(" + _strip_sql(f"COALESCE({row}.{col}, '')", ID_CHARS) + ")"))
+    digits = _digits_sql(f"COALESCE({row}.phone, '')")
+    exprs.append(('phone', f"CASE WHEN {digits} LIKE '254_%' THEN '0' || substr({digits}, 4) ELSE {digits} END"))
+    return exprs
+
+def _identity_rows(row, source=""):
+    """SELECT of (kind, value, member_id) for `row` (NEW in a trigger, or an alias over `source`)."""
+    parts = [f"SELECT '{kind}' AS kind, {expr} AS value, {row}.id AS member_id {source}" for kind, expr in _identity_exprs(row)]
+    return f"SELECT * FROM ({' UNION ALL '.join(parts)}) WHERE length(value) >= {IDENTITY_MIN_LEN}"
+
+def install_identity_keys(c):
+    """
+    Normalized ID numbers and phones of every member in member_identity, indexed on (kind, value) and kept
+    current by triggers, so duplicate checks are index lookups instead of scans of members.
+    """
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='member_identity'")
+    exists = c.fetchone() is not None
+    c.execute('''CREATE TABLE IF NOT EXISTS member_identity (
+                    kind TEXT,
+                    value TEXT,
+                    member_id INTEGER,
+                    PRIMARY KEY (kind, value, member_id)
+                ) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_member_identity_member ON member_identity(member_id)")
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_member_identity_insert AFTER INSERT ON members BEGIN
+                    INSERT OR IGNORE INTO member_identity (kind, value, member_id) {_identity_rows('NEW')};
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_member_identity_update AFTER UPDATE OF phone, national_id, id_number ON members BEGIN
+                    DELETE FROM member_identity WHERE member_id = OLD.id;
+                    INSERT OR IGNORE INTO member_identity (kind, value, member_id) {_identity_rows('NEW')};
+                  END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_member_identity_delete AFTER DELETE ON members BEGIN
+                    DELETE FROM member_identity WHERE member_id = OLD.id;
+                  END''')
+    if not exists:
+        c.execute(f"INSERT OR IGNORE INTO member_identity (kind, value, member_id) {_identity_rows('m', 'FROM members m')}")
+
+def find_identity_matches(phone=None, national_id=None, id_number=None, c=None):
+    """
+    Existing members sharing a normalized phone or ID number with the given values (one index lookup per key).
+    c: cursor to run on (inside the caller's transaction); a connection of its own otherwise.
+    Returns: DataFrame [Member ID, Name, Group, Account No, Matched On]
+    """
+    cols = ['Member ID', 'Name', 'Group', 'Account No', 'Matched On']
+    keys = sorted(identity_keys(phone, national_id, id_number))
+    if not keys:
+        return pd.DataFrame(columns=cols)
+    if c is None:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            return find_identity_matches(phone, national_id, id_number, conn.cursor())
+        finally:
+            conn.close()
+    where = " OR ".join(["(i.kind = ? AND i.value = ?)"] * len(keys))
+    c.execute(f'''SELECT m.id, m.name, g.name, m.account_number,
+                        CASE i.kind WHEN 'id' THEN 'ID ' ELSE 'Phone ' END || i.value
+                 FROM member_identity i
+                 JOIN members m ON m.id = i.member_id
+                 LEFT JOIN groups g ON g.id = m.group_id
+                 WHERE {where}
+                 ORDER BY m.id''', [v for key in keys for v in key])
+    return pd.DataFrame(c.fetchall(), columns=cols)
+
+def duplicate_identity_report():
+    """
+    Every member whose normalized ID number or phone is shared with another member record (any group):
+    the same person registered more than once. One row per member per shared key, grouped by the key.
+    Returns: DataFrame [Matched On, Value, Member ID, Name, Group, Account No, Joined]
+    """
+    conn = sqlite3.connect(DB_FILE)
+    df = pd.read_sql_query('''
+        WITH shared AS (
+            SELECT kind, value FROM member_identity
+            GROUP BY kind, value HAVING COUNT(*) > 1
+        )
+        SELECT CASE i.kind WHEN 'id' THEN 'ID Number' ELSE 'Phone' END AS "Matched On", i.value AS "Value",
+               m.id AS "Member ID", m.name AS "Name", g.name AS "Group", m.account_number AS "Account No",
+               m.joined_date AS "Joined"
+        FROM shared s
+        JOIN member_identity i ON i.kind = s.kind AND i.value = s.value
+        JOIN members m ON m.id = i.member_id
+        LEFT JOIN groups g ON g.id = m.group_id
+        ORDER BY i.kind, i.value, m.id
+    ''', conn)
+    conn.close()
+    return df
+
+def get_member_details(member_id):
+    """Fetches all details for a specific member."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT * FROM members WHERE id = ?", (member_id,))
+    row = c.fetchone()
+    # row: id, group_id, name, photo_path, joined_date, phone, id_number, next_of_kin
+    if row:
+        # Get column names
+        cols = [description[0] for description in c.description]
+        return dict(zip(cols, row))
+    return None
+
+def update_member_details(member_id, phone, id_num, kin, photo_path=None, expected_version=None):
+    """
+    Updates member profile.
+    expected_version: the member's version when the form was opened; the update is refused if someone saved since.
+    Returns: True if saved, False on a version conflict.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    query = "UPDATE members SET phone=?, id_number=?, next_of_kin=?, version=COALESCE(version, 0) + 1"
+    params = [phone, id_num, kin]
+    
+    if photo_path:
+        query += ", photo_path=?"
+        params.append(photo_path)
+        
+    query += " WHERE id=?"
+    params.append(member_id)
+    if expected_version is not None:
+        query += " AND COALESCE(version, 0) = ?"
+        params.append(expected_version)
+    
+    c.execute(query, tuple(params))
+    saved = c.rowcount == 1
+    conn.commit()
+    conn.close()
+    return saved
+
+def update_member_role(member_id, new_role):
+    """Updates member role (Admin only)."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("UPDATE members SET role = ?, version = COALESCE(version, 0) + 1 WHERE id = ?", (new_role, member_id))
+    conn.commit()
+    conn.close()
+def save_uploaded_file(uploaded_file, member_id):
+    """Saves uploaded photo to assets/profiles."""
+    if not os.path.exists("assets/profiles"):
+        os.makedirs("assets/profiles")
+    
+    ext = uploaded_file.name.split('.')[-1]
+    fname = f"member_{member_id}.{ext}"
+    path = os.path.join("assets/profiles", fname)
+    
+    with open(path, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+
+    return path
+
+def store_member_photo(uploaded_file, member_id):
+    """Saves a profile photo and points the member at it. Runs as a background job."""
+    path = save_uploaded_file(uploaded_file, member_id)
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("UPDATE members SET photo_path = ? WHERE id = ?", (path, member_id))
+    conn.commit()
+    conn.close()
+    return path
+
+def add_member(group_id, name, phone, id_num, email=None, residence=None, sponsor=None,
+               kra_pin=None, dob=None, gender=None, occupation=None, 
+               next_of_kin_name=None, next_of_kin_phone=None, allow_duplicate=False):
+    """
+    Adds a new member. Returns False if the insert fails.
+    Raises DuplicateMemberError (with the matching members) when the phone or ID number already belongs
+    to another member, unless allow_duplicate.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    acc_num = generate_account_number()
+    try:
+        # Hold the write lock from the duplicate check to the insert
+        c.execute("BEGIN IMMEDIATE")
+        matches = find_identity_matches(phone, id_number=id_num, c=c) if not allow_duplicate else None
+        if matches is not None and not matches.empty:
+            conn.rollback()
+            raise DuplicateMemberError(matches)
+        c.execute('''INSERT INTO members (
+            group_id, name, joined_date, account_number, phone, id_number, 
+            email, residence, sponsor_name,
+            kra_pin, dob, gender, occupation, next_of_kin_name, next_of_kin_phone
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', 
+          (group_id, name, datetime.now().date(), acc_num, phone, id_num, 
+           email, residence, sponsor,
+           kra_pin, dob, gender, occupation, next_of_kin_name, next_of_kin_phone))
+        conn.commit()
+        return True
+    except DuplicateMemberError:
+        raise
+    except Exception as e:
+        print(f"Error adding member: {e}")
+        return False
+    finally:
+        conn.close()
+
+# --- Bulk Member Import ---
+MEMBER_IMPORT_COLS = [
+    'name', 'national_id', 'phone', 'kra_pin', 'dob', 'gender', 'occupation',
+    'email', 'residence', 'sponsor_name', 'next_of_kin_name', 'next_of_kin_phone'
+]
+MEMBER_IMPORT_REQUIRED = ['name', 'national_id', 'phone']
+MEMBER_IMPORT_ALIASES = {'full_name': 'name', 'id_number': 'national_id', 'id': 'national_id', 'sponsor': 'sponsor_name'}
+
+def validate_member_import(raw_df):
+    """
+    Validates a whole membership file at once (column-wise, no per-row DB calls).
+    Checks required fields, duplicate IDs/phones inside the file and against the members table.
+    Returns: (clean_df, errors_df) - errors_df has one row per problem (Row = line in the CSV).
+    """
+    df = raw_df.copy()
+    df.columns = [str(col).strip().lower().replace(" ", "_") for col in df.columns]
+    df = df.rename(columns=MEMBER_IMPORT_ALIASES)
+    
+    missing_cols = [col for col in MEMBER_IMPORT_REQUIRED if col not in df.columns]
+    if missing_cols:
+        errors = pd.DataFrame([{'Row': '-', 'Field': col, 'Problem': "Missing column"} for col in missing_cols])
+        return df, errors
+        
+    for col in MEMBER_IMPORT_COLS:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[MEMBER_IMPORT_COLS].fillna("").astype(str).apply(lambda col: col.str.strip())
+    df['row'] = df.index + 2 # Header is line 1
+    
+    problems = []
+    
+    # 1. Required fields
+    for col in MEMBER_IMPORT_REQUIRED:
+        blank = df[df[col] == ""]
+        problems.append(pd.DataFrame({'Row': blank['row'], 'Field': col, 'Problem': "Required field is empty"}))
+    
+    # 2. Duplicates inside the file (on the normalized keys, so "0712 345 678" and "+254712345678" collide)
+    keys = pd.DataFrame({'row': df['row'], 'national_id': df['national_id'].map(lambda v: normalize_identity('id', v)),
+                         'phone': df['phone'].map(lambda v: normalize_identity('phone', v))})
+    for col in ['national_id', 'phone']:
+        filled = keys[keys[col].notna()]
+        dups = filled[filled.duplicated(col, keep=False)]
+        problems.append(pd.DataFrame({'Row': dups['row'], 'Field': col, 'Problem': "Duplicate in file: " + df.loc[dups.index, col]}))
+    
+    # 3. Duplicates against existing members (one indexed join on member_identity)
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("CREATE TEMP TABLE import_keys (row_no INTEGER, field TEXT, kind TEXT, value TEXT)")
+    for col, kind in [('national_id', 'id'), ('phone', 'phone')]:
+        filled = keys[keys[col].notna()]
+        c.executemany("INSERT INTO import_keys VALUES (?, ?, ?, ?)",
+                      [(int(r), col, kind, v) for r, v in zip(filled['row'], filled[col])])
+    c.execute('''SELECT DISTINCT k.row_no, k.field,
+                        CASE k.kind WHEN 'id' THEN 'ID' ELSE 'Phone' END || ' already registered to ' || m.name
+                        || COALESCE(' (' || g.name || ')', '')
+                 FROM import_keys k
+                 JOIN member_identity i ON i.kind = k.kind AND i.value = k.value
+                 JOIN members m ON m.id = i.member_id
+                 LEFT JOIN groups g ON g.id = m.group_id
+              ''')
+    existing = c.fetchall()
+    conn.close()
+    problems.append(pd.DataFrame(existing, columns=['Row', 'Field', 'Problem']))
+    
+    errors = pd.concat(problems, ignore_index=True).sort_values(['Row', 'Field']).reset_index(drop=True)
+    return df.drop(columns=['row']), errors
+
+def allocate_account_numbers(c, count):
+    """Allocates `count` unused 6-digit account numbers with a single lookup of the taken ones."""
+    c.execute("SELECT account_number FROM members WHERE account_number IS NOT NULL")
+    taken = {str(r[0]) for r in c.fetchall()}
+    
+    allocated = set()
+    while len(allocated) < count:
+        for n in random.sample(range(100000, 1000000), count - len(allocated)):
+            acc = str(n)
+            if acc not in taken:
+                allocated.add(acc)
+    return list(allocated)
+
+def bulk_import_members(group_id, clean_df, progress=None):
+    """
+    Inserts a validated membership file in one transaction. Returns number of members added.
+    progress: optional callback(fraction, message), called every IMPORT_CHUNK_ROWS rows.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    try:
+        acc_nums = allocate_account_numbers(c, len(clean_df))
+        joined = datetime.now().date()
+        rows = [
+            (group_id, r.name, joined, acc, r.phone, r.national_id, r.national_id,
+             r.email, r.residence, r.sponsor_name,
+             r.kra_pin, r.dob, r.gender, r.occupation, r.next_of_kin_name, r.next_of_kin_phone)
+            for r, acc in zip(clean_df.itertuples(index=False), acc_nums)
+        ]
+        for start in range(0, len(rows), IMPORT_CHUNK_ROWS):
+            if progress:
+                progress(start / len(rows), f"Imported {start} of {len(rows)}")
+            c.executemany('''INSERT INTO members (
+                group_id, name, joined_date, account_number, phone, id_number, national_id,
+                email, residence, sponsor_name,
+                kra_pin, dob, gender, occupation, next_of_kin_name, next_of_kin_phone
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows[start:start + IMPORT_CHUNK_ROWS])
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def check_if_guarantor(name):
+    """Checks if a member (by Name) is listed as a guarantor on an open loan."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    # Simple substring check (ideal world would use IDs, but requirement is Text names)
+    c.execute("SELECT id FROM loans WHERE status = 'Open' AND guarantors LIKE ?", (f"%{name}%",))
+    res = c.fetchone()
+    conn.close()
+    return res is not None
+
+def delete_member(member_id):
+    """Deletes a member."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("DELETE FROM members WHERE id = ?", (member_id,))
+    conn.commit()
+    conn.close()
+
+def save_loan_image(uploaded_file, loan_id):
+    """Saves the scanned loan form against a loan in the ledger."""
+    if not os.path.exists("assets/loans"):
+        os.makedirs("assets/loans")
+    
+    ext = uploaded_file.name.split('.')[-1]
+    fname = f"loan_{loan_id}.{ext}"
+    path = os.path.join("assets/loans", fname)
+    
+    with open(path, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+        
+    # Update DB (ledger + originating transaction)
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("UPDATE loans SET loan_image = ? WHERE id = ?", (path, loan_id))
+    c.execute("UPDATE transactions SET loan_image = ? WHERE id = (SELECT transaction_id FROM loans WHERE id = ?)", (path, loan_id))
+    conn.commit()
+    conn.close()
+    return path
+
+def get_active_loans(group_id, before=None, limit=LOAN_PAGE_SIZE):
+    """
+    Fetches one page of open loans/advances for the group from the loans ledger
+    (which stays in the live database when the sessions that issued them are archived).
+    before: (period, loan id) cursor from the previous page, or None for the first page.
+    Returns: (DataFrame, next_cursor) - next_cursor is None on the last page.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    query = '''
+        SELECT l.id, m.name, l.loan_type, l.principal, l.outstanding, l.guarantors, l.loan_image, l.period
+        FROM loans l
+        JOIN members m ON l.member_id = m.id
+        WHERE l.group_id = ? AND l.status = 'Open'
+    '''
+    params = [group_id]
+    if before:
+        query += " AND (l.period, l.id) < (?, ?)"
+        params += list(before)
+    query += " ORDER BY l.period DESC, l.id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    c.execute(query, tuple(params))
+    rows = c.fetchall()
+    conn.close()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][7], rows[-1][0])
+    
+    data = []
+    for r in rows:
+        data.append({
+            'Loan ID': r[0],
+            'Borrower': r[1],
+            'Date': period_label(r[7]), # Issue month from the ledger: the session may be archived
+            'Type': r[2],
+            'Amount': r[3],
+            'Outstanding': r[4],
+            'Guarantors': r[5] if r[5] else "None",
+            'Image': r[6]
+        })
+    return pd.DataFrame(data), next_cursor
+
+def get_latest_balances(group_id):
+    """
+    Closing balances of the group's latest finalized session, plus what members actually paid that month.
+    Returns: (period or None, DataFrame one row per member).
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT id, period FROM audit_sessions WHERE group_id = ? AND is_finalized = 1 ORDER BY period DESC, id DESC LIMIT 1", (group_id,))
+    res = c.fetchone()
+    if not res:
+        conn.close()
+        return None, pd.DataFrame()
+
+    c.execute('''
+        SELECT m.id, m.name, t.savings_cf, t.loan_cf, t.advance_cf,
+               t.cash_today, t.loan_bf, t.loan_principal, t.advance_bf, t.advance_principal
+        FROM transactions t
+        JOIN members m ON t.member_id = m.id
+        WHERE t.session_id = ?
+        ORDER BY m.id
+    ''', (res[0],))
+    cols = ['Member ID', 'Name', 'Savings CF', 'Loan CF', 'Advance CF',
+            'Total Cash Today', 'Loan BF', 'Loan Principal', 'Advance BF', 'Advance Principal']
+    balances = pd.DataFrame(c.fetchall(), columns=cols).fillna(0)
+    conn.close()
+    return res[1], balances
+
+# --- Cross-Group Portfolio ---
+# Sortable columns -> SQL expression in get_portfolio_overview (NULLs, i.e. never finalized, always last)
+PORTFOLIO_SORTS = {
+    'Group': 'g.name COLLATE NOCASE',
+    'Savings Pool': 'tot.savings',
+    'Outstanding Loans': 'tot.outstanding',
+    'Bank Balance': 's.bank_balance_closing',
+    'Last Finalized': 'ls.period',
+    'Attendance %': 'tot.attendance',
+    'Members': 'tot.members',
+}
+PORTFOLIO_COLS = ['Group ID', 'Group', 'Last Finalized', 'Members', 'Savings Pool', 'Outstanding Loans',
+                  'Bank Balance', 'Attendance %']
+
+def get_portfolio_overview(sort_by='Savings Pool', descending=True, page=0, page_size=PORTFOLIO_PAGE_SIZE):
+    """
+    Every group's position at its latest finalized session, in one grouped query: savings pool (Savings CF),
+    outstanding loans and advances (Loan CF + Advance CF), bank balance, and attendance (Present or Late).
+    Sorted and paginated in SQL. Groups whose latest session is archived or that never finalized show blanks.
+    Returns: (DataFrame page with PORTFOLIO_COLS, totals dict over all groups: groups, savings, outstanding, bank)
+    """
+    order = PORTFOLIO_SORTS[sort_by]
+    direction = "DESC" if descending else "ASC"
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute(f'''
+        WITH latest AS (
+            SELECT group_id, MAX(period) AS period
+            FROM audit_sessions WHERE is_finalized = 1
+            GROUP BY group_id
+        ), ls AS (
+            SELECT s.group_id, s.period, MAX(s.id) AS session_id
+            FROM audit_sessions s JOIN latest l ON l.group_id = s.group_id AND l.period = s.period
+            WHERE s.is_finalized = 1
+            GROUP BY s.group_id
+        ), tot AS (
+            SELECT ls.group_id, COUNT(*) AS members,
+                   SUM(COALESCE(t.savings_cf, 0)) AS savings,
+                   SUM(COALESCE(t.loan_cf, 0) + COALESCE(t.advance_cf, 0)) AS outstanding,
+                   100.0 * SUM(COALESCE(t.attendance_status, 'Present') IN ('Present', 'Late')) / COUNT(*) AS attendance
+            FROM ls JOIN transactions t ON t.session_id = ls.session_id
+            GROUP BY ls.group_id
+        )
+        SELECT g.id, g.name, ls.period, tot.members, tot.savings, tot.outstanding, s.bank_balance_closing,
+               ROUND(tot.attendance, 1),
+               COUNT(*) OVER (), SUM(tot.savings) OVER (), SUM(tot.outstanding) OVER (), SUM(s.bank_balance_closing) OVER ()
+        FROM groups g
+        LEFT JOIN ls ON ls.group_id = g.id
+        LEFT JOIN audit_sessions s ON s.id = ls.session_id
+        LEFT JOIN tot ON tot.group_id = g.id
+        ORDER BY {order} IS NULL, {order} {direction}, g.id
+        LIMIT ? OFFSET ?
+    ''', (page_size, page * page_size))
+    rows = c.fetchall()
+    if not rows and page > 0:
+        conn.close()
+        return get_portfolio_overview(sort_by, descending, 0, page_size)
+    conn.close()
+    
+    df = pd.DataFrame([r[:8] for r in rows], columns=PORTFOLIO_COLS)
+    df['Last Finalized'] = df['Last Finalized'].map(lambda p: period_label(p) if pd.notna(p) else "")
+    first = rows[0] if rows else (None,) * 12
+    totals = {'groups': first[8] or 0, 'savings': int(first[9] or 0), 'outstanding': int(first[10] or 0), 'bank': int(first[11] or 0)}
+    return df, totals
@@ -0,0 +1,471 @@
+"""
+Calculation engine: periods, the repayment waterfall, by-law lookups, merges and projections.
+
+Pure pandas/numpy - nothing here touches the database or Streamlit.
+"""
+import pandas as pd
+import numpy as np
+import re
+
+from .config import DEFAULT_RULES, MONTHS, RULE_COLS
+
+def get_period(month, year):
+    """Converts a month name + year into a sortable period number (Year * 12 + MonthIndex)."""
+    return int(year) * 12 + MONTHS.index(month)
+
+def period_label(period):
+    """Period number -> 'January 2025'."""
+    return f"{MONTHS[int(period) % 12]} {int(period) // 12}"
+
+def rules_for_periods(rules_df, periods):
+    """
+    Rules in force for each period: the latest row with effective_period <= period,
+    or DEFAULT_RULES before the group's first row. One searchsorted over all periods.
+    Returns: DataFrame aligned with `periods`.
+    """
+    periods = np.asarray(list(periods), dtype=int)
+    table = pd.concat([pd.DataFrame([DEFAULT_RULES]), rules_df[RULE_COLS]], ignore_index=True)
+    pos = np.searchsorted(rules_df['effective_period'].to_numpy(int), periods, side='right')
+    return table.iloc[pos].reset_index(drop=True)
+
+def rules_for_period(rules_df, period):
+    r = rules_for_periods(rules_df, [period]).iloc[0]
+    return {col: (float(r[col]) if col.endswith('_rate') else int(r[col])) for col in RULE_COLS}
+
+def fine_schedule(rules):
+    """Attendance status -> fine, for Series.map (statuses not listed are not fined)."""
+    return {'Late': rules['fine_late'], 'Absent': rules['fine_absent'], 'Apology': rules['fine_apology']}
+
+# --- Meeting Schedule ---
+def next_meeting_after(meeting_date, recurrence, today, day=None):
+    """
+    First date of the schedule starting on meeting_date (repeating weekly / fortnightly / monthly) that falls
+    after `today`; meeting_date itself if it is still ahead. Missed meetings are skipped, not queued.
+    day: the day of the month monthly meetings fall on (default: meeting_date's), clamped to short months
+    without drifting - 31 Jan -> 28 Feb -> 31 Mar. ISO date strings in and out.
+    """
+    start, today = pd.Timestamp(meeting_date), pd.Timestamp(today)
+    if start > today:
+        return start.strftime('%Y-%m-%d')
+    if recurrence == 'monthly':
+        day = int(day or start.day)
+        months = (today.year - start.year) * 12 + today.month - start.month
+        for step in (months, months + 1):
+            first = start.replace(day=1) + pd.DateOffset(months=step)
+            nxt = first.replace(day=min(day, first.days_in_month))
+            if nxt > today:
+                break
+    else:
+        days = 14 if recurrence == 'fortnightly' else 7
+        nxt = start + pd.Timedelta(days=((today - start).days // days + 1) * days)
+    return nxt.strftime('%Y-%m-%d')
+
+# --- Cascade Recompute ---
+# transactions column -> ledger (DataFrame) column
+TXN_LEDGER_COLS = {
+    'cash_today': 'Total Cash Today', 'fines': 'Fines',
+    'savings_bf': 'Savings BF', 'savings_today': 'Savings Today', 'savings_cf': 'Savings CF',
+    'loan_bf': 'Loan BF', 'loan_principal': 'Loan Principal', 'loan_interest': 'Loan Interest', 'loan_cf': 'Loan CF',
+    'advance_bf': 'Advance BF', 'advance_principal': 'Advance Principal', 'advance_interest': 'Advance Interest', 'advance_cf': 'Advance CF',
+    'new_loan': 'New Loan'
+}
+# Columns the replay may rewrite
+REPLAY_COLS = ['savings_bf', 'loan_bf', 'advance_bf',
+               'loan_interest', 'advance_interest', 'savings_today',
+               'savings_cf', 'loan_cf', 'advance_cf']
+
+# --- Concurrent Audits (optimistic versioning + per-member merge) ---
+# Ledger columns compared and carried when merging two auditors' work on one month
+MERGE_COLS = list(TXN_LEDGER_COLS.values()) + ['New Advance', 'Savings Withdrawal', 'Attendance', 'Guarantors', 'Loan Image']
+MERGE_TEXT_COLS = ['Attendance', 'Guarantors', 'Loan Image']
+# What an auditor actually enters; BF, interest and CF follow from these via the waterfall
+MERGE_INPUT_COLS = ['Attendance', 'Total Cash Today', 'Fines', 'Loan Principal', 'Advance Principal',
+                    'New Loan', 'New Advance', 'Savings Withdrawal', 'Guarantors', 'Loan Image']
+
+class AuditConflictError(Exception):
+    """
+    Raised by save_session when another auditor saved the same month and both changed some of the same members.
+    merged: my ledger with their non-overlapping members merged in; theirs: the saved ledger;
+    conflicts: Member IDs both changed differently; version: the saved session's version.
+    """
+    def __init__(self, merged, theirs, conflicts, version):
+        super().__init__(f"{len(conflicts)} member(s) were changed by another auditor")
+        self.merged = merged
+        self.theirs = theirs
+        self.conflicts = conflicts
+        self.version = version
+
+def replace_member_rows(df, source_df, member_ids):
+    """Copy of `df` with the MERGE_COLS of the given members taken from `source_df`."""
+    out = df.set_index('Member ID')
+    src = source_df.set_index('Member ID')
+    ids = [m for m in member_ids if m in src.index and m in out.index]
+    if ids:
+        out = out.astype({col: object for col in MERGE_COLS if col in out.columns})
+        out.loc[ids, MERGE_COLS] = src.loc[ids, MERGE_COLS].values
+    return out.reset_index()[df.columns]
+
+def merge_member_edits(base_df, mine_df, theirs_df):
+    """
+    Three-way merge of one month's ledger, member by member. `base_df` is the ledger both auditors started from.
+    A member counts as changed when any MERGE_INPUT_COLS value differs from the base. Members only the other
+    auditor changed are taken whole from `theirs_df`; members only I changed keep my figures.
+    Returns: (merged DataFrame, ids taken from theirs, ids both changed differently).
+    """
+    num_cols = [col for col in MERGE_COLS if col not in MERGE_TEXT_COLS]
+    
+    def norm(df):
+        out = df.drop_duplicates('Member ID').set_index('Member ID').reindex(columns=MERGE_COLS)
+        out[num_cols] = out[num_cols].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+        out[MERGE_TEXT_COLS] = out[MERGE_TEXT_COLS].fillna('').astype(str)
+        return out
+    
+    mine = norm(mine_df)
+    base = norm(base_df).reindex(mine.index)
+    theirs = norm(theirs_df).reindex(mine.index)
+    in_theirs = mine.index.isin(theirs_df['Member ID'])
+    
+    def differs(a, b):
+        return a[MERGE_INPUT_COLS].ne(b[MERGE_INPUT_COLS]).any(axis=1)
+    
+    mine_changed = differs(mine, base)
+    theirs_changed = differs(theirs, base) & in_theirs
+    conflicts = mine.index[mine_changed & theirs_changed & differs(mine, theirs)].tolist()
+    taken = mine.index[theirs_changed & ~mine_changed].tolist()
+    return replace_member_rows(mine_df, theirs_df, taken), taken, conflicts
+
+def compact_int(values, dtype='int32'):
+    """`values` as `dtype` (blanks read as 0) when every value is a whole number that fits; else unchanged."""
+    vals = pd.to_numeric(values, errors='coerce')
+    if (vals.isna() & values.notna()).any():
+        return values
+    vals = vals.fillna(0)
+    if (vals % 1 == 0).all() and (vals.abs() <= np.iinfo(dtype).max).all():
+        return vals.astype(dtype)
+    return values
+
+def compact_merge_base(df):
+    """
+    The part of a ledger merge_member_edits compares against: Member ID and MERGE_INPUT_COLS,
+    whole-number columns as int32. About a third of the full frame, for keeping in session state.
+    """
+    out = df.reindex(columns=['Member ID'] + MERGE_INPUT_COLS)
+    for col in out.columns:
+        if col not in MERGE_TEXT_COLS:
+            out[col] = compact_int(out[col])
+    return out
+
+ATTENDANCE_STATUSES = ["Present", "Late", "Absent", "Apology"]
+
+def compact_ledger(df):
+    """
+    The working ledger as kept in session state: whole-number columns as int64 (not int32 - the screens
+    add up cells as numpy scalars), Member Name and Attendance as categoricals. Write to it with set_ledger_value.
+    """
+    out = df.copy()
+    for col in out.columns:
+        if col == 'Member Name':
+            out[col] = out[col].astype('category')
+        elif col == 'Attendance':
+            extra = sorted(set(out[col].dropna().astype(str)) - set(ATTENDANCE_STATUSES))
+            out[col] = pd.Categorical(out[col], categories=ATTENDANCE_STATUSES + extra)
+        elif col not in MERGE_TEXT_COLS:
+            out[col] = compact_int(out[col], 'int64')
+    return out
+
+def set_ledger_value(df, idx, col, value):
+    """
+    Writes one cell of a (possibly compact) ledger in place. A value the column's compact dtype can't
+    hold - a fraction, a blank, a status that isn't a category - turns the column back to object first.
+    """
+    dtype = df[col].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        fits = pd.isna(value) or value in dtype.categories
+    elif pd.api.types.is_integer_dtype(dtype):
+        num = pd.to_numeric(value, errors='coerce')
+        fits = pd.notna(num) and num % 1 == 0 and abs(num) <= np.iinfo(dtype).max
+    else:
+        fits = True
+    if not fits:
+        df[col] = df[col].astype(object)
+    df.at[idx, col] = value
+
+def check_loan_eligibility(status):
+    """Returns True if member is eligible for loan (Present or Late)."""
+    return status in ["Present", "Late"]
+
+# --- 2. State & Data Logic ---
+
+def init_empty_dataframe(members_list):
+    """Creates a fresh dataframe for the session with 0s."""
+    cols = [
+        'Member Name', 'Member ID', 
+        'Total Cash Today', 'Fines', 
+        'Savings BF', 'Savings Today', 'Savings CF',
+        'Loan BF', 'Loan Principal', 'Loan Interest', 'Loan CF',
+        'Advance BF', 'Advance Principal', 'Advance Interest', 'Advance CF',
+        'Attendance', 'New Loan', 'New Advance', 'Savings Withdrawal', 'Guarantors', 'Loan Image'
+    ]
+    df = pd.DataFrame(columns=cols)
+    
+    names = [m[1] for m in members_list]
+    ids = [m[0] for m in members_list]
+    
+    df['Member Name'] = names
+    df['Member ID'] = ids
+    df['Attendance'] = "Present"
+    
+    for c in cols[2:-4]: # Skip Member info, Attendance, New Loan, New Adv, Savings W/D, Guarantors (handled separately)
+       pass 
+    
+    # Initialize numeric columns explicitly
+    numeric_defaults = [
+        'Total Cash Today', 'Fines', 
+        'Savings BF', 'Savings Today', 'Savings CF',
+        'Loan BF', 'Loan Principal', 'Loan Interest', 'Loan CF',
+        'Advance BF', 'Advance Principal', 'Advance Interest', 'Advance CF',
+        'New Loan', 'New Advance', 'Savings Withdrawal'
+    ]
+    for c in numeric_defaults:
+        df[c] = 0
+    return df
+
+def merge_carry_forward(empty_df, prev_df):
+    """Merges previous month balances into the new empty dataframe."""
+    # prev_df has: Member ID, Savings BF, Loan BF, Advance BF (mapped from CF)
+    
+    # We use Member ID as key to map
+    empty_df = empty_df.set_index('Member ID')
+    prev_df = prev_df.set_index('Member ID')
+    
+    # Update matched indices (frame-level update: Series.update on a column is a no-op under Copy-on-Write)
+    bf_cols = [col for col in ['Savings BF', 'Loan BF', 'Advance BF'] if col in prev_df.columns]
+    empty_df.update(prev_df[bf_cols])
+
+    return empty_df.reset_index()
+
+# --- Member Search Index ---
+SEARCH_MAX_RESULTS = 20
+
+def build_member_search_index(audit_df, lookup):
+    """
+    Builds an in-memory prefix index over member name, account number and phone.
+    Returns: dict {prefix: set(row positions in audit_df)}
+    """
+    index = {}
+    for pos, (name, mid) in enumerate(zip(audit_df['Member Name'], audit_df['Member ID'])):
+        acc, phone = lookup.get(int(mid), (None, None))
+
+        terms = set()
+        name_str = str(name).strip().lower()
+        if name_str:
+            terms.add(name_str)
+            terms.update(name_str.split())
+        if acc:
+            terms.add(str(acc).strip())
+        if phone:
+            digits = "".join(ch for ch in str(phone) if ch.isdigit())
+            if digits:
+                terms.add(digits)
+
+        for term in terms:
+            for i in range(1, len(term) + 1):
+                index.setdefault(term[:i], set()).add(pos)
+    return index
+
+def search_member_index(index, query):
+    """Returns sorted row positions matching every word of the query as a prefix."""
+    words = query.strip().lower().split()
+    if not words:
+        return []
+
+    hits = None
+    for w in words:
+        # Phones are indexed as digits only, so strip separators users type in
+        if any(ch.isdigit() for ch in w):
+            w = "".join(ch for ch in w if ch.isdigit()) or w
+        matches = index.get(w, set())
+        hits = matches if hits is None else hits & matches
+        if not hits:
+            return []
+    return sorted(hits)[:SEARCH_MAX_RESULTS]
+
+PHONE_CHARS = " -+()./"
+
+def local_phone(digits):
+    """'254712345678' -> '0712345678' (Kenyan international to local form); other numbers unchanged."""
+    return "0" + digits[3:] if digits.startswith("254") and len(digits) > 3 else digits
+
+ID_CHARS = " -./"
+ASCII_UPPER = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ") # SQLite's upper() leaves other letters
+IDENTITY_MIN_LEN = 5 # shorter values (blanks, "0", "N/A") are not treated as identities
+
+def normalize_identity(kind, value):
+    """
+    Identity key as stored in member_identity: 'id' -> ASCII upper case without separators,
+    'phone' -> without separators, in local 07... form. Must match the SQL in install_identity_keys.
+    Returns None for values too short to identify anyone.
+    """
+    value = "" if value is None or pd.isna(value) else str(value)
+    if kind == 'phone':
+        value = local_phone("".join(ch for ch in value if ch not in PHONE_CHARS))
+    else:
+        value = "".join(ch for ch in value if ch not in ID_CHARS).translate(ASCII_UPPER)
+    return value if len(value) >= IDENTITY_MIN_LEN else None
+
+def identity_keys(phone=None, national_id=None, id_number=None):
+    """A member's identity keys: set of (kind, value)."""
+    keys = {('phone', normalize_identity('phone', phone))}
+    keys |= {('id', normalize_identity('id', v)) for v in (national_id, id_number)}
+    return {k for k in keys if k[1]}
+
+class DuplicateMemberError(Exception):
+    """
+    Raised by add_member when the phone or ID number already belongs to a member.
+    matches: find_identity_matches rows for the members it matched.
+    """
+    def __init__(self, matches):
+        super().__init__("; ".join(identity_match_messages(matches)))
+        self.matches = matches
+
+def identity_match_messages(matches):
+    """find_identity_matches rows worded as the bulk import reports them: 'ID already registered to Name (Group)'."""
+    return [f"{on.split()[0]} already registered to {name}" + (f" ({group})" if pd.notna(group) and group else "")
+            for on, name, group in zip(matches['Matched On'], matches['Name'], matches['Group'])]
+
+def fts_member_query(query):
+    """
+    User text -> FTS5 MATCH expression for the member_search table: every word must match as a prefix.
+    Numbers lose their separators (digit groups typed with spaces count as one number); a number
+    starting 254 also matches its local 07... form. Returns None when there is nothing to search for.
+    """
+    terms = []
+    for word in re.sub(r"(?<=[\d)])[ .()-]+(?=[\d(])", "", query).split():
+        if any(ch.isdigit() for ch in word) and all(ch.isdigit() or ch in PHONE_CHARS for ch in word):
+            digits = "".join(ch for ch in word if ch.isdigit())
+            forms = sorted({digits, local_phone(digits)})
+            terms.append("(" + " OR ".join(f'"{f}"*' for f in forms) + ")")
+        else:
+            word = word.replace('"', '""')
+            if word.strip(PHONE_CHARS + "'*^:"):
+                terms.append(f'"{word}"*')
+    return " AND ".join(terms) or None
+
+def round_to_five(n):
+    """Rounds a number to the nearest 5."""
+    return 5 * round(n / 5)
+
+def round_to_five_array(values):
+    """Vectorized round_to_five (same half-to-even rounding as round())."""
+    return (5 * np.round(np.asarray(values, dtype=float) / 5)).astype(int)
+
+def int_column(df, name):
+    """A ledger column as ints (blanks and missing columns read as 0)."""
+    if name not in df.columns:
+        return pd.Series(0, index=df.index)
+    return pd.to_numeric(df[name], errors='coerce').fillna(0).astype(int)
+
+CF_COLS = ['Savings CF', 'Loan CF', 'Advance CF']
+
+def apply_carry_forward(df):
+    """
+    Recomputes the CF columns from the BF columns, Savings Today, principal repaid and New Loan.
+    The only CF rule: the waterfall, the audit screens and save_session all go through it, so a
+    finalized month is exactly what replaying it from the previous month gives.
+    """
+    out = df.copy()
+    out['Savings CF'] = int_column(out, 'Savings BF') + int_column(out, 'Savings Today')
+    out['Loan CF'] = int_column(out, 'Loan BF') - int_column(out, 'Loan Principal') + int_column(out, 'New Loan')
+    out['Advance CF'] = int_column(out, 'Advance BF') - int_column(out, 'Advance Principal')
+    return out
+
+def apply_waterfall(df, rules=None):
+    """
+    Vectorized calculate_waterfall: recomputes interest, Savings Today and the CF columns for every row.
+    `rules` holds the rates (scalars, or per-row arrays from rules_for_periods); defaults to DEFAULT_RULES.
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    out = df.copy()
+    col = lambda name: int_column(out, name)
+    
+    adv_bf = col('Advance BF')
+    loan_bf = col('Loan BF')
+    loan_prin = col('Loan Principal')
+    adv_prin = col('Advance Principal')
+    
+    adv_int = round_to_five_array(adv_bf * np.asarray(rules['advance_rate'], dtype=float))
+    loan_int = round_to_five_array(loan_bf * np.asarray(rules['loan_rate'], dtype=float))
+    out['Advance Interest'] = adv_int
+    out['Loan Interest'] = loan_int
+    
+    deductions = col('Fines') + loan_prin + loan_int + adv_prin + adv_int
+    out['Savings Today'] = col('Total Cash Today') - deductions
+    return apply_carry_forward(out)
+
+# --- Balance Projection ---
+PROJECTION_MAX_MONTHS = 36
+PROJECTION_SCENARIO_COLS = ['Scenario', 'Monthly Cash', 'Loan Repayment %', 'Advance Repayment %']
+
+def default_projection_scenarios(balances):
+    """Baseline = last month's average cash and repayment rates; plus a higher-savings and a slow-repayment case."""
+    def rate(paid, bf):
+        total = balances[bf].sum()
+        return round(100 * balances[paid].sum() / total, 1) if total else 0.0
+
+    cash = float(round_to_five(balances['Total Cash Today'].mean())) if not balances.empty else 0.0
+    loan_rate = rate('Loan Principal', 'Loan BF')
+    adv_rate = rate('Advance Principal', 'Advance BF')
+    return pd.DataFrame([
+        ["Baseline", cash, loan_rate, adv_rate],
+        ["Higher Savings", cash * 1.5, loan_rate, adv_rate],
+        ["Slow Repayment", cash, loan_rate / 2, adv_rate / 2],
+    ], columns=PROJECTION_SCENARIO_COLS)
+
+def project_balances(balances, scenarios, months, month_rules=None):
+    """
+    Runs the calculate_waterfall rules forward `months` times for every scenario and member at once.
+    `month_rules` (rules_for_periods over the projected periods) supplies each month's rates; defaults to DEFAULT_RULES.
+    State is a (scenarios x members) array per balance; each month:
+      interest    = round_to_five(advance rate x Advance BF), round_to_five(loan rate x Loan BF)
+      principal   = round_to_five(BF x repayment rate), capped at the BF
+      Savings Today = Monthly Cash - (principal + interest)
+    Returns: (summary DataFrame per scenario and month, final per-member balances per scenario).
+    """
+    names = scenarios['Scenario'].astype(str).tolist()
+    def param(col, scale=1.0):
+        return pd.to_numeric(scenarios[col], errors='coerce').fillna(0).to_numpy(float)[:, None] / scale
+
+    cash = param('Monthly Cash')
+    loan_rate = param('Loan Repayment %', 100).clip(0, 1)
+    adv_rate = param('Advance Repayment %', 100).clip(0, 1)
+
+    shape = (len(names), len(balances))
+    sav = np.broadcast_to(balances['Savings CF'].to_numpy(int), shape).copy()
+    loan = np.broadcast_to(balances['Loan CF'].to_numpy(int), shape).copy()
+    adv = np.broadcast_to(balances['Advance CF'].to_numpy(int), shape).copy()
+
+    rows = []
+    for step in range(1, months + 1):
+        rules = DEFAULT_RULES if month_rules is None else month_rules.iloc[step - 1]
+        adv_int = round_to_five_array(adv * rules['advance_rate'])
+        loan_int = round_to_five_array(loan * rules['loan_rate'])
+        loan_prin = np.minimum(loan, round_to_five_array(loan * loan_rate))
+        adv_prin = np.minimum(adv, round_to_five_array(adv * adv_rate))
+
+        sav = sav + (cash - (loan_prin + loan_int + adv_prin + adv_int)).astype(int)
+        loan = loan - loan_prin
+        adv = adv - adv_prin
+
+        rows.append(pd.DataFrame({
+            'Scenario': names, 'Month': step,
+            'Savings Pool': sav.sum(axis=1), 'Loan Book': loan.sum(axis=1), 'Advance Book': adv.sum(axis=1),
+            'Interest Income': (loan_int + adv_int).sum(axis=1),
+        }))
+
+    summary = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+    final = pd.DataFrame({
+        'Scenario': np.repeat(names, shape[1]),
+        'Name': np.tile(balances['Name'].to_numpy(), shape[0]),
+        'Savings': sav.ravel(), 'Loan': loan.ravel(), 'Advance': adv.ravel(),
+    })
+    return summary, final
@@ -0,0 +1,168 @@
+"""
+Incremental columnar export of the transaction history.
+
+Writes `transactions` joined with `audit_sessions` and `members` to Parquet (or Arrow IPC)
+files partitioned by year and group, so analysts never have to copy or lock the live
+audit_data.db. Only sessions finalized since the last export are written (watermark on
+audit_sessions.finalized_at); each session is one file, so a re-finalized month simply
+overwrites its own file.
+
+Usage:
+    python -m audit_tool.export_history export [--db audit_data.db] [--out exports] [--format parquet|ipc]
+    python -m audit_tool.export_history query "SELECT group_name, SUM(savings_today) FROM ledger GROUP BY 1"
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+
+from .config import DB_FILE
+
+EXPORT_DIR = "exports"
+WATERMARK_FILE = "_watermark.json"
+
+FILE_EXT = {"parquet": "parquet", "ipc": "arrow"}
+
+EXPORT_QUERY = '''
+    SELECT s.id AS session_id, s.group_id, g.name AS group_name,
+           s.year, s.month, s.period, s.finalized_at, s.bank_balance_closing,
+           t.id AS transaction_id, t.member_id, m.name AS member_name, m.account_number,
+           t.attendance_status, t.cash_today, t.fines,
+           t.savings_bf, t.savings_today, t.savings_withdrawal, t.savings_cf,
+           t.loan_bf, t.new_loan, t.loan_principal, t.loan_interest, t.loan_cf,
+           t.advance_bf, t.new_advance, t.advance_principal, t.advance_interest, t.advance_cf,
+           t.guarantors
+    FROM transactions t
+    JOIN audit_sessions s ON t.session_id = s.id
+    LEFT JOIN groups g ON s.group_id = g.id
+    LEFT JOIN members m ON t.member_id = m.id
+    WHERE t.session_id = ?
+    ORDER BY t.id
+'''
+
+
+def connect_readonly(db_path):
+    """Opens the live database read-only so the export never takes a write lock."""
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+
+def read_watermark(out_dir):
+    """Returns (finalized_at, ids of sessions already exported at exactly that timestamp)."""
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None, set()
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("finalized_at"), set(data.get("session_ids", []))
+
+
+def write_watermark(out_dir, finalized_at, session_ids):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"finalized_at": finalized_at, "session_ids": sorted(session_ids)}, f)
+    os.replace(tmp, path)
+
+
+def get_sessions_to_export(conn, watermark, seen_ids):
+    """
+    Finalized sessions since the watermark. Uses >= because finalized_at has one-second
+    resolution, then skips the sessions already exported at exactly the watermark.
+    """
+    c = conn.cursor()
+    if watermark is None:
+        c.execute("SELECT id, group_id, year, finalized_at FROM audit_sessions WHERE is_finalized = 1 ORDER BY id")
+    else:
+        c.execute("SELECT id, group_id, year, finalized_at FROM audit_sessions "
+                  "WHERE is_finalized = 1 AND finalized_at >= ? ORDER BY id", (watermark,))
+    return [r for r in c.fetchall() if not (r[3] == watermark and r[0] in seen_ids)]
+
+
+def write_partition(table, path, fmt):
+    """Writes one session's rows atomically (temp file + rename)."""
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        pq.write_table(table, tmp)
+    else:
+        feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def export_history(db_path=DB_FILE, out_dir=EXPORT_DIR, fmt="parquet"):
+    """Exports sessions finalized since the last run. Returns the number of sessions written."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        sys.exit("pyarrow is required for the export: pip install pyarrow")
+
+    os.makedirs(out_dir, exist_ok=True)
+    watermark, seen_ids = read_watermark(out_dir)
+
+    conn = connect_readonly(db_path)
+    sessions = get_sessions_to_export(conn, watermark, seen_ids)
+
+    new_watermark = watermark
+    for session_id, group_id, year, finalized_at in sessions:
+        df = pd.read_sql_query(EXPORT_QUERY, conn, params=(session_id,))
+        part_dir = os.path.join(out_dir, f"year={year}", f"group_id={group_id}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"session_{session_id}.{FILE_EXT[fmt]}")
+
+        # Partition keys live in the directory names, not the files
+        table = pa.Table.from_pandas(df.drop(columns=["year", "group_id"]), preserve_index=False)
+        write_partition(table, path, fmt)
+
+        if finalized_at and (new_watermark is None or finalized_at > new_watermark):
+            new_watermark = finalized_at
+            seen_ids = set()
+        if finalized_at == new_watermark:
+            seen_ids.add(session_id)
+
+    conn.close()
+    if new_watermark is not None:
+        write_watermark(out_dir, new_watermark, seen_ids)
+    return len(sessions)
+
+
+def query_history(sql, out_dir=EXPORT_DIR, fmt="parquet"):
+    """Runs SQL in-process (DuckDB) against the exported files, exposed as the `ledger` table."""
+    try:
+        import duckdb
+        import pyarrow.dataset as ds
+    except ImportError:
+        sys.exit("duckdb and pyarrow are required for queries: pip install duckdb pyarrow")
+
+    fmt_name = "parquet" if fmt == "parquet" else "feather"
+    ledger = ds.dataset(out_dir, format=fmt_name, partitioning="hive",
+                        exclude_invalid_files=True, ignore_prefixes=["_", "."])
+    con = duckdb.connect()
+    con.register("ledger", ledger)
+    return con.execute(sql).df()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar export of the audit transaction history.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_exp = sub.add_parser("export", help="Append sessions finalized since the last export")
+    p_exp.add_argument("--db", default=DB_FILE)
+    p_exp.add_argument("--out", default=EXPORT_DIR)
+    p_exp.add_argument("--format", choices=sorted(FILE_EXT), default="parquet")
+
+    p_q = sub.add_parser("query", help="Query the exported history (table name: ledger)")
+    p_q.add_argument("sql")
+    p_q.add_argument("--out", default=EXPORT_DIR)
+    p_q.add_argument("--format", choices=sorted(FILE_EXT), default="parquet")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        n = export_history(args.db, args.out, args.format)
+        print(f"✅ Exported {n} session(s) to {args.out}")
+    else:
+        print(query_history(args.sql, args.out, args.format).to_string(index=False))
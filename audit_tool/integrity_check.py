@@ -0,0 +1,215 @@
+"""
+Database-wide integrity audit.
+
+Detects ledger drift with set-based SQL, one group per worker process:
+  * cf_formula     - Savings CF != BF + Today, Loan CF != BF - Principal + New Loan,
+                     Advance CF != BF - Principal
+  * bf_chain       - a BF that doesn't match the member's CF in the previous month
+  * orphan_member  - transactions pointing at members removed by delete_member
+  * bank_chain     - bank_balance_closing != previous closing + cash in - money out
+                     (floored at 0, as the allocation screen does)
+
+Once older months are archived, each group's newest archived session seeds the two chains, so the
+first live month is checked against it rather than against zero.
+
+Usage:
+    python -m audit_tool.integrity_check [--db audit_data.db] [--out integrity_report.csv] [--workers 4]
+"""
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .config import DB_FILE, MONTHS
+
+REPORT_FILE = "integrity_report.csv"
+
+REPORT_COLS = ['group_id', 'check', 'period', 'member_id', 'transaction_id', 'field', 'expected', 'found']
+
+CHECKS = {
+    'cf_formula': '''
+        SELECT s.period, t.member_id, t.id AS transaction_id,
+               t.savings_bf, t.savings_today, t.savings_cf,
+               t.loan_bf, t.loan_principal, t.new_loan, t.loan_cf,
+               t.advance_bf, t.advance_principal, t.advance_cf
+        FROM checked_transactions t
+        JOIN checked_sessions s ON t.session_id = s.id
+        WHERE s.group_id = ? AND s.is_finalized = 1 AND s.seed = 0
+          AND (  COALESCE(t.savings_cf, 0) != COALESCE(t.savings_bf, 0) + COALESCE(t.savings_today, 0)
+              OR COALESCE(t.loan_cf, 0) != COALESCE(t.loan_bf, 0) - COALESCE(t.loan_principal, 0) + COALESCE(t.new_loan, 0)
+              OR COALESCE(t.advance_cf, 0) != COALESCE(t.advance_bf, 0) - COALESCE(t.advance_principal, 0))
+    ''',
+    'bf_chain': '''
+        WITH ordered AS (
+            SELECT s.period, s.seed, t.member_id, t.id AS transaction_id,
+                   t.savings_bf, t.loan_bf, t.advance_bf,
+                   LAG(s.period) OVER w AS prev_period,
+                   LAG(t.savings_cf) OVER w AS prev_savings_cf,
+                   LAG(t.loan_cf) OVER w AS prev_loan_cf,
+                   LAG(t.advance_cf) OVER w AS prev_advance_cf
+            FROM checked_transactions t
+            JOIN checked_sessions s ON t.session_id = s.id
+            WHERE s.group_id = ? AND s.is_finalized = 1
+            WINDOW w AS (PARTITION BY t.member_id ORDER BY s.period, s.id)
+        )
+        SELECT * FROM ordered
+        WHERE prev_period = period - 1 AND seed = 0
+          AND (  COALESCE(savings_bf, 0) != COALESCE(prev_savings_cf, 0)
+              OR COALESCE(loan_bf, 0) != COALESCE(prev_loan_cf, 0)
+              OR COALESCE(advance_bf, 0) != COALESCE(prev_advance_cf, 0))
+    ''',
+    'orphan_member': '''
+        SELECT s.period, t.member_id, t.id AS transaction_id
+        FROM checked_transactions t
+        JOIN checked_sessions s ON t.session_id = s.id
+        LEFT JOIN members m ON t.member_id = m.id
+        WHERE s.group_id = ? AND s.seed = 0 AND m.id IS NULL
+    ''',
+    'bank_chain': '''
+        WITH flows AS (
+            SELECT s.id, s.period, s.seed, COALESCE(s.bank_balance_closing, 0) AS closing,
+                   SUM(COALESCE(t.cash_today, 0)) AS cash_in,
+                   SUM(COALESCE(t.new_loan, 0) + COALESCE(t.new_advance, 0) + COALESCE(t.savings_withdrawal, 0)) AS money_out
+            FROM checked_sessions s
+            LEFT JOIN checked_transactions t ON t.session_id = s.id
+            WHERE s.group_id = ? AND s.is_finalized = 1
+            GROUP BY s.id
+        ),
+        chained AS (
+            SELECT period, seed, closing,
+                   MAX(COALESCE(LAG(closing) OVER (ORDER BY period, id), 0) + cash_in - money_out, 0) AS expected
+            FROM flows
+        )
+        SELECT period, closing, expected FROM chained WHERE seed = 0 AND closing != expected
+    ''',
+}
+
+# (field, expected expression, found column) per multi-field check
+FIELD_RULES = {
+    'cf_formula': [
+        ('Savings CF', lambda d: d['savings_bf'] + d['savings_today'], 'savings_cf'),
+        ('Loan CF', lambda d: d['loan_bf'] - d['loan_principal'] + d['new_loan'], 'loan_cf'),
+        ('Advance CF', lambda d: d['advance_bf'] - d['advance_principal'], 'advance_cf'),
+    ],
+    'bf_chain': [
+        ('Savings BF', lambda d: d['prev_savings_cf'], 'savings_bf'),
+        ('Loan BF', lambda d: d['prev_loan_cf'], 'loan_bf'),
+        ('Advance BF', lambda d: d['prev_advance_cf'], 'advance_bf'),
+    ],
+}
+
+
+def connect_readonly(db_path):
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+
+def attach_seed(conn, db_path, group_id):
+    """
+    ATTACHes (read-only, as 'arc') the archive file holding the group's newest archived session.
+    Archive paths are relative to the app's directory, i.e. the database's. Returns the session id or None.
+    """
+    try:
+        files = conn.execute("SELECT year, path FROM archive_files ORDER BY year DESC").fetchall()
+    except sqlite3.OperationalError:
+        return None # Database from before the archive tier
+    base = os.path.dirname(os.path.abspath(db_path))
+    for _, path in files:
+        path = os.path.join(base, path)
+        if not os.path.exists(path):
+            continue
+        conn.execute("ATTACH DATABASE ? AS arc", (f"file:{path}?mode=ro",))
+        row = conn.execute("SELECT id FROM arc.audit_sessions WHERE group_id = ? AND is_finalized = 1 "
+                           "ORDER BY period DESC, id DESC LIMIT 1", (group_id,)).fetchone()
+        if row:
+            return row[0]
+        conn.execute("DETACH DATABASE arc")
+    return None
+
+
+def create_check_views(conn, seed_id):
+    """Temp views checked_sessions / checked_transactions: the live tables, plus the seed session (seed = 1)."""
+    for view, table, key in (('checked_sessions', 'audit_sessions', 'id'), ('checked_transactions', 'transactions', 'session_id')):
+        cols = [r[1] for r in conn.execute(f"PRAGMA main.table_info({table})")]
+        sql = f"SELECT {', '.join(cols)}, 0 AS seed FROM main.{table}"
+        if seed_id is not None:
+            # Archive files written before a later migration lack the newer columns
+            have = {r[1] for r in conn.execute(f"PRAGMA arc.table_info({table})")}
+            sql += (" UNION ALL SELECT " + ", ".join(col if col in have else f"NULL AS {col}" for col in cols)
+                    + f", 1 FROM arc.{table} WHERE {key} = {int(seed_id)}")
+        conn.execute(f"CREATE TEMP VIEW {view} AS {sql}")
+
+
+def check_group(args):
+    """Worker: runs every check for one group. Returns a DataFrame of violations."""
+    db_path, group_id = args
+    conn = connect_readonly(db_path)
+    create_check_views(conn, attach_seed(conn, db_path, group_id))
+    found = []
+    for name, sql in CHECKS.items():
+        df = pd.read_sql_query(sql, conn, params=(group_id,))
+        if df.empty:
+            continue
+
+        if name in FIELD_RULES:
+            df = df.fillna(0)
+            # One report row per field that actually disagrees
+            for field, expected_fn, found_col in FIELD_RULES[name]:
+                expected = expected_fn(df)
+                bad = df[expected != df[found_col]]
+                found.append(pd.DataFrame({
+                    'check': name, 'period': bad['period'], 'member_id': bad['member_id'],
+                    'transaction_id': bad['transaction_id'], 'field': field,
+                    'expected': expected[bad.index], 'found': bad[found_col]
+                }))
+        elif name == 'orphan_member':
+            found.append(df.assign(check=name, field='member_id', expected='existing member', found=df['member_id']))
+        elif name == 'bank_chain':
+            found.append(df.rename(columns={'closing': 'found'}).assign(check=name, field='bank_balance_closing'))
+    conn.close()
+
+    if not found:
+        return pd.DataFrame(columns=REPORT_COLS)
+    result = pd.concat(found, ignore_index=True).reindex(columns=REPORT_COLS)
+    result['group_id'] = group_id
+    return result
+
+
+def run_integrity_audit(db_path=DB_FILE, workers=None):
+    """Spreads groups across worker processes. Returns the combined violations report."""
+    conn = connect_readonly(db_path)
+    session_cols = {r[1] for r in conn.execute("PRAGMA table_info(audit_sessions)")}
+    if 'period' not in session_cols:
+        conn.close()
+        raise SystemExit("audit_sessions has no period column yet - open the app once so init_db() migrates the database.")
+    groups = conn.execute("SELECT id, name FROM groups ORDER BY id").fetchall()
+    conn.close()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(check_group, [(db_path, gid) for gid, _ in groups], chunksize=8))
+
+    report = pd.concat([r for r in results if not r.empty] or [pd.DataFrame(columns=REPORT_COLS)], ignore_index=True)
+    for col in ['period', 'member_id', 'transaction_id']:
+        report[col] = pd.to_numeric(report[col]).astype("Int64")
+    names = dict(groups)
+    report.insert(1, 'group_name', report['group_id'].map(names))
+    report.insert(4, 'month', report['period'].map(
+        lambda p: f"{MONTHS[int(p) % 12]} {int(p) // 12}" if pd.notnull(p) else ""))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit the ledger database for drift.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--out", default=REPORT_FILE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    report = run_integrity_audit(args.db, args.workers)
+    report.to_csv(args.out, index=False)
+    if report.empty:
+        print("✅ No integrity violations found.")
+    else:
+        print(f"❌ {len(report)} violation(s) written to {args.out}")
+        print(report.groupby('check').size().to_string())
@@ -0,0 +1,87 @@
+"""Background job executor (thread + process pools) for work that must not block a rerun."""
+import threading
+import uuid
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .config import JOB_HISTORY_LIMIT, JOB_PROCESSES, JOB_THREADS
+
+# --- Background Jobs (shared thread + process pools) ---
+class JobExecutor:
+    """
+    Runs slow work (reports, uploads, bulk writes) off the script thread so reruns never wait on it.
+    submit() returns a job id at once; jobs() reports status, progress and result.
+    Thread jobs submitted with progress=True get a `progress(fraction, message)` keyword argument.
+    Process jobs must be top-level functions of an importable module (not of this script); their
+    arguments are pickled and progress jumps from 0 to 1.
+    One per server process, via get_job_executor().
+    """
+    def __init__(self, threads=JOB_THREADS, processes=JOB_PROCESSES):
+        self.threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="audit-job")
+        self.processes = None
+        self.process_workers = processes
+        self.lock = threading.Lock()
+        self.records = {}
+    
+    def submit(self, fn, *args, label="", owner=None, kind="thread", progress=False,
+               done_text=None, download=None, clear_keys=(), **kwargs):
+        """
+        done_text: message shown when finished ('{result}' is filled in, or a callable of the result);
+        download: (file_name, mime) for bytes results;
+        clear_keys: session_state keys the submitting session drops once the job finishes (stale caches).
+        """
+        job_id = uuid.uuid4().hex[:8]
+        record = {'id': job_id, 'label': label or fn.__name__, 'owner': owner, 'kind': kind,
+                  'status': 'Queued', 'progress': 0.0, 'message': '', 'result': None, 'error': None,
+                  'done_text': done_text, 'download': download, 'clear_keys': list(clear_keys),
+                  'submitted': datetime.now(), 'finished': None}
+        with self.lock:
+            self.records[job_id] = record
+            finished = [j for j in self.records.values() if j['finished']]
+            for old in finished[:max(0, len(self.records) - JOB_HISTORY_LIMIT)]:
+                del self.records[old['id']]
+        
+        if kind == "process":
+            if self.processes is None:
+                # spawn: forking a server process full of threads is not safe
+                self.processes = ProcessPoolExecutor(max_workers=self.process_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            record['status'] = 'Running'
+            future = self.processes.submit(fn, *args, **kwargs)
+        else:
+            if progress:
+                kwargs['progress'] = lambda fraction, message="": self.update(job_id, progress=float(fraction), message=message)
+            future = self.threads.submit(self.run_thread_job, job_id, fn, args, kwargs)
+        future.add_done_callback(lambda f: self.finish(job_id, f))
+        return job_id
+    
+    def run_thread_job(self, job_id, fn, args, kwargs):
+        self.update(job_id, status='Running')
+        return fn(*args, **kwargs)
+    
+    def update(self, job_id, **fields):
+        with self.lock:
+            if job_id in self.records:
+                self.records[job_id].update(fields)
+    
+    def finish(self, job_id, future):
+        error = future.exception()
+        self.update(job_id, status='Failed' if error else 'Done', progress=1.0, finished=datetime.now(),
+                    result=None if error else future.result(), error=str(error) if error else None)
+    
+    def jobs(self, owner):
+        """Snapshot of one session's jobs, newest first."""
+        with self.lock:
+            return [dict(j) for j in reversed(self.records.values()) if j['owner'] == owner]
+    
+    def forget(self, owner):
+        """Drops a session's finished jobs (and their results)."""
+        with self.lock:
+            for job_id in [j['id'] for j in self.records.values() if j['owner'] == owner and j['finished']]:
+                del self.records[job_id]
+
+def integrity_report_csv(db_path):
+    """Runs integrity_check over the database and returns the violations report as CSV bytes."""
+    from . import integrity_check
+    return integrity_check.run_integrity_audit(db_path).to_csv(index=False).encode('utf-8')
@@ -0,0 +1,274 @@
+"""PDF reports. Imports FPDF, so it is only imported when a report is actually built."""
+import pandas as pd
+from fpdf import FPDF
+
+from .db import get_member_details
+
+# --- 3. Reporting PDF ---
+class PDF(FPDF):
+    # Header text is passed in (not read from st.session_state) so reports can render on a job thread
+    def __init__(self, group_name="", period_text="", orientation='P'):
+        super().__init__(orientation=orientation)
+        self.group_name = group_name
+        self.period_text = period_text
+    
+    def header(self):
+        # Color: Navy (30, 60, 100)
+        self.set_text_color(30, 60, 100)
+        self.set_font('Arial', 'B', 16)
+        title = f"{self.group_name}"
+        self.cell(0, 10, title, 0, 1, 'L')
+        
+        # Color: Teal (0, 150, 150)
+        self.set_text_color(0, 150, 150)
+        self.set_font('Arial', 'B', 12)
+        subtitle = f"Audit Report | {self.period_text}"
+        self.cell(0, 8, subtitle, 0, 1, 'L')
+        self.ln(5)
+        
+        # Reset to black
+        self.set_text_color(0, 0, 0)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(128, 128, 128)
+        self.cell(0, 10, f'Page {self.page_no()} - Generated by Group Audit Tool', 0, 0, 'C')
+
+    def section_title(self, label):
+        self.set_fill_color(240, 240, 240) # Light Grey
+        self.set_text_color(0, 150, 150) # Teal
+        self.set_font('Arial', 'B', 12)
+        self.cell(0, 8, f"  {label}", 0, 1, 'L', fill=True)
+        self.ln(2)
+        self.set_text_color(0, 0, 0)
+        
+    def financial_summary(self, data):
+        self.set_font('Arial', '', 10)
+        
+        # Box for Stats
+        self.set_draw_color(0, 150, 150)
+        self.set_line_width(0.5)
+        
+        # Row 1
+        self.cell(60, 8, f"Total Cash Collected: {data['cash_in']:,}", 0, 0)
+        self.cell(60, 8, f"Bank Reserve (BF): {data['bank_bf']:,}", 0, 1)
+        
+        # Row 2
+        self.cell(60, 8, f"Total New Loans: {data['new_loans']:,}", 0, 0)
+        
+        if data['withdrawal'] > 0:
+            self.set_text_color(200, 0, 0) # Red warning
+            self.cell(60, 8, f"Withdrawn from Reserve: {data['withdrawal']:,}", 0, 1)
+        else:
+             self.set_text_color(0, 100, 0)
+             self.cell(60, 8, f"Deposited to Reserve: {data['to_bank']:,}", 0, 1)
+        
+        self.set_text_color(0, 0, 0)
+        
+        # Row 3 (Ext Borrowing)
+        if data['ext_borrowing'] > 0:
+            self.set_text_color(255, 0, 0)
+            self.cell(60, 8, f"External Borrowing: {data['ext_borrowing']:,}", 0, 1)
+        else:
+             self.cell(60, 8, "External Borrowing: 0", 0, 1)
+             
+        self.set_text_color(0,0,0)
+        self.ln(5)
+
+    def attendance_summary(self, counts):
+        self.set_font('Arial', '', 10)
+        self.cell(40, 8, f"Present: {counts.get('Present', 0)}", 0, 0)
+        self.cell(40, 8, f"Late: {counts.get('Late', 0)}", 0, 0)
+        self.cell(40, 8, f"Absent: {counts.get('Absent', 0)}", 0, 1)
+        self.ln(5)
+
+    def master_ledger(self, df):
+        # Columns: Acct No, Name, Attend, Sav In, Loan Repaid, New Loan, Fines
+        # Widths
+        w_acct = 25
+        w_name = 45
+        w_att = 25
+        w_sav = 25
+        w_rep = 25
+        w_new = 25
+        w_fine = 20
+        
+        # Header
+        self.set_fill_color(30, 60, 100) # Navy
+        self.set_text_color(255, 255, 255)
+        self.set_font('Arial', 'B', 9)
+        
+        self.cell(w_acct, 7, "Acct No", 1, 0, 'C', True)
+        self.cell(w_name, 7, "Name", 1, 0, 'L', True)
+        self.cell(w_att, 7, "Status", 1, 0, 'C', True)
+        self.cell(w_sav, 7, "Savings", 1, 0, 'R', True)
+        self.cell(w_rep, 7, "Repaid", 1, 0, 'R', True)
+        self.cell(w_new, 7, "New Loan", 1, 0, 'R', True)
+        self.cell(w_fine, 7, "Fines", 1, 1, 'R', True)
+        
+        # Rows
+        self.set_text_color(0, 0, 0)
+        self.set_font('Arial', '', 9)
+        self.set_fill_color(240, 240, 240) # Light Grey
+        
+        fill = False
+        
+        for idx, row in df.iterrows():
+            mid = row['Member ID']
+            d = get_member_details(int(mid))
+            acc = str(d.get('account_number', 'N/A'))
+            
+            # Safe extraction helper
+            def get_safe_int(key):
+                try:
+                    val = row.get(key, 0)
+                    return int(float(val)) if pd.notnull(val) else 0
+                except:
+                    return 0
+
+            repaid = get_safe_int('Loan Principal') + get_safe_int('Advance Principal')
+            sav_today = get_safe_int('Savings Today')
+            nl = get_safe_int('New Loan')
+            fine = get_safe_int('Fines')
+            
+            self.cell(w_acct, 6, acc, 1, 0, 'C', fill)
+            self.cell(w_name, 6, str(row['Member Name'])[:22], 1, 0, 'L', fill)
+            self.cell(w_att, 6, str(row.get('Attendance', '')), 1, 0, 'C', fill)
+            
+            self.cell(w_sav, 6, f"{sav_today:,}", 1, 0, 'R', fill)
+            self.cell(w_rep, 6, f"{repaid:,}", 1, 0, 'R', fill)
+            self.cell(w_new, 6, f"{nl:,}", 1, 0, 'R', fill)
+            self.cell(w_fine, 6, f"{fine:,}", 1, 1, 'R', fill)
+            
+            fill = not fill # Toggle stripe
+            self.ln()
+
+def generate_pdf_report(audit_df, bank_bf, group_name, month, year):
+    """Generates the upgraded PDF report. Takes everything as arguments so it can run as a background job."""
+    # 1. Sanitize Dataframe
+    # Create clean copy and fill ALL NaNs with 0 (User Request)
+    clean_df = audit_df.copy()
+    clean_df.fillna(0, inplace=True)
+    
+    # Ensure numeric columns are strictly integers for cleaner display/calculations
+    numeric_cols = ['Total Cash Today', 'Savings Today', 'Loan Principal', 'Loan Interest', 
+                    'Advance Principal', 'Advance Interest', 'New Loan', 'Fines', 
+                    'Savings BF', 'Loan BF', 'Advance BF']
+    
+    for c in numeric_cols:
+        if c in clean_df.columns:
+            # Coerce to number (handles empty strings), fill any resulting NaNs with 0, convert to int
+            clean_df[c] = pd.to_numeric(clean_df[c], errors='coerce').fillna(0).astype(int)
+            
+    # 2. Calculate Banking Metrics
+    cash_in = int(clean_df['Total Cash Today'].sum())
+    new_loans = int(clean_df['New Loan'].sum())
+    
+    gap = cash_in - new_loans
+    
+    to_bank = 0
+    withdrawal = 0
+    ext_borrowing = 0
+    
+    if gap >= 0:
+        to_bank = gap
+    else:
+        deficit = abs(gap)
+        if bank_bf >= deficit:
+            withdrawal = deficit
+        else:
+            withdrawal = bank_bf
+            ext_borrowing = deficit - withdrawal
+            
+    fin_data = {
+        'cash_in': cash_in,
+        'bank_bf': bank_bf,
+        'new_loans': new_loans,
+        'to_bank': to_bank,
+        'withdrawal': withdrawal,
+        'ext_borrowing': ext_borrowing
+    }
+    
+    # 3. Attendance Counts
+    if 'Attendance' in clean_df.columns:
+        attend_counts = clean_df['Attendance'].value_counts().to_dict()
+    else:
+        attend_counts = {}
+    
+    # 4. Generate PDF
+    pdf = PDF(group_name, f"{month} {year}")
+    pdf.add_page()
+    
+    # Section A
+    pdf.section_title("Financial Executive Summary")
+    pdf.financial_summary(fin_data)
+    
+    # Section B
+    pdf.section_title("Attendance Summary")
+    pdf.attendance_summary(attend_counts)
+    
+    # Section C
+    pdf.section_title("Master Ledger")
+    # Pass cleanliness is next to godliness
+    pdf.master_ledger(clean_df)
+    
+    return pdf.output(dest='S').encode('latin-1')
+
+class StatementPDF(PDF):
+    def __init__(self, member_name, group_name, account_number):
+        super().__init__(group_name, orientation='L')
+        self.member_name = member_name
+        self.account_number = account_number
+
+    def header(self):
+        self.set_text_color(30, 60, 100)
+        self.set_font('Arial', 'B', 16)
+        self.cell(0, 10, f"{self.group_name}", 0, 1, 'L')
+        
+        self.set_text_color(0, 150, 150)
+        self.set_font('Arial', 'B', 12)
+        self.cell(0, 8, f"Member Statement | {self.member_name} | Acct No {self.account_number}", 0, 1, 'L')
+        self.ln(5)
+        self.set_text_color(0, 0, 0)
+
+    def statement_table(self, df):
+        cols = [
+            ("Period", 30, None), ("Status", 22, 'Status'), ("Savings In", 25, 'Savings In'),
+            ("Withdrawn", 25, 'Withdrawn'), ("Savings Bal", 28, 'Savings Balance'),
+            ("Loan Bal", 28, 'Loan Balance'), ("Advance Bal", 28, 'Advance Balance'),
+            ("Interest", 22, 'Interest Paid'), ("Fines", 20, 'Fines'), ("Interest YTD", 25, 'Interest To Date')
+        ]
+        
+        # Header
+        self.set_fill_color(30, 60, 100) # Navy
+        self.set_text_color(255, 255, 255)
+        self.set_font('Arial', 'B', 9)
+        for label, w, _ in cols:
+            self.cell(w, 7, label, 1, 0, 'C', True)
+        self.ln()
+        
+        # Rows
+        self.set_text_color(0, 0, 0)
+        self.set_font('Arial', '', 9)
+        self.set_fill_color(240, 240, 240) # Light Grey
+        fill = False
+        for rec in df.to_dict('records'):
+            for label, w, key in cols:
+                if key is None:
+                    text = f"{str(rec['Month'])[:3]} {rec['Year']}"
+                    self.cell(w, 6, text, 1, 0, 'L', fill)
+                elif key == 'Status':
+                    self.cell(w, 6, str(rec[key] or ''), 1, 0, 'C', fill)
+                else:
+                    self.cell(w, 6, f"{int(rec[key]):,}", 1, 0, 'R', fill)
+            self.ln()
+            fill = not fill
+
+def generate_member_statement_pdf(member_name, group_name, account_number, stmt_df):
+    """Renders a member statement DataFrame (see get_member_statement) to PDF bytes."""
+    pdf = StatementPDF(member_name, group_name, account_number)
+    pdf.add_page()
+    pdf.section_title("Statement of Account")
+    pdf.statement_table(stmt_df)
+    return pdf.output(dest='S').encode('latin-1')
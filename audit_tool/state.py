@@ -0,0 +1,383 @@
+"""Streamlit session state and per-process resources (database bootstrap, backup thread, job pool)."""
+import streamlit as st
+import pandas as pd
+import re
+import sys
+import time
+import uuid
+
+from .config import JOB_POLL_SECONDS, SESSION_IDLE_MINUTES
+from .engine import (
+    CF_COLS, apply_carry_forward, build_member_search_index, compact_ledger, compact_merge_base, fine_schedule, get_period,
+    round_to_five, rules_for_period, set_ledger_value,
+)
+from .db import (
+    init_db, get_active_loans, get_audit_history, get_group_rules, get_member_lookup, get_session_version,
+    get_upcoming_meetings,
+)
+from .backup import BackupScheduler
+from .jobs import JobExecutor
+
+# --- Startup ---
+# Fresh value per browser session (callables are called, e.g. one empty DataFrame each)
+SESSION_DEFAULTS = {
+    'setup_complete': False,
+    'current_member_index': 0,
+    'audit_df': pd.DataFrame,
+    'group_name': "",
+    'group_id': None,
+    'audit_month': "",
+    'audit_year': 2025,
+    'info_msg': "",
+    'show_navigation': False,
+    'viewing_profile': False,
+    'audit_stage': 'collection', # collection | allocation
+    'bank_balance_bf': 0, # New: Cumulative Banking
+    'viewing_global_stats': False,
+    'viewing_admin': False,
+    'admin_selected_group_id': None
+}
+
+@st.cache_resource
+def bootstrap():
+    """
+    Once per server process (main.py reruns on every interaction): migrates the database and
+    starts the backup thread. Returns the process's startup timings, filled in by record_timings.
+    """
+    init_db()
+    get_backup_scheduler()
+    return {}
+
+def session_initialized():
+    """False once a page has cleared the session (Exit) - until init_session_state runs on the next rerun."""
+    return 'setup_complete' in st.session_state
+
+def init_session_state():
+    for k, v in SESSION_DEFAULTS.items():
+        if k not in st.session_state:
+            st.session_state[k] = v() if callable(v) else v
+
+def record_timings(timings, script_start, import_ms):
+    """
+    Keeps the process's cold-start figures (first run only) and this session's render times.
+    script_start: time.perf_counter() at the top of main.py.
+    """
+    render_ms = (time.perf_counter() - script_start) * 1000
+    timings.setdefault('import_ms', import_ms)
+    timings.setdefault('first_render_ms', render_ms)
+    if not session_initialized():
+        return
+    st.session_state.setdefault('first_render_ms', render_ms)
+    st.session_state.last_render_ms = render_ms
+
+# --- Session Housekeeping ---
+# Widget keys made per member (and per month/stage on the collection screen). One set is live at a time;
+# the ledger already holds every value entered, so keys for other rows or periods are just dead weight.
+PERIOD_WIDGET_KEY = re.compile(r"^.+_(\d+)_([A-Za-z]+)_(\d+)_(collection|allocation)$")
+MEMBER_WIDGET_KEY = re.compile(r"^(?:new_adv|new_loan|guar|wd|save_alloc|attend)_(\d+)$")
+# Only meaningful while an audit is open / while a group is open in the Admin Panel
+AUDIT_KEYS = ['audit_base', 'audit_conflict', 'attendance_record', 'calculated_bank_close', 'audit_rules', 'audit_rules_key',
+              'member_search_index', 'member_search_key', 'history_rows', 'history_cursor', 'history_view_id']
+ADMIN_GROUP_KEYS = ['portfolio_loans', 'portfolio_cursor', 'portfolio_group_id']
+# The landing page's meeting list; finalizing moves meeting dates, so it is re-read after every audit
+LANDING_KEYS = ['meeting_rows', 'meeting_cursor', 'meeting_query']
+
+def collect_stale_keys():
+    """
+    Drops session keys that no page will read again: widget keys for members, months and stages other
+    than the one on screen, audit state once back on the landing page, and the loan portfolio once no
+    group is open in the Admin Panel, and the landing page's meeting list during an audit. Runs at the top of every rerun. Returns the number of keys dropped.
+    """
+    ss = st.session_state
+    in_audit = ss.setup_complete
+    live = (str(ss.current_member_index), str(ss.audit_month), str(ss.audit_year), ss.audit_stage)
+    stale = []
+    for key in list(ss.keys()):
+        if not isinstance(key, str):
+            continue
+        m = PERIOD_WIDGET_KEY.match(key)
+        if m and (not in_audit or m.groups() != live):
+            stale.append(key)
+            continue
+        m = MEMBER_WIDGET_KEY.match(key)
+        if m and (not in_audit or m.group(1) != live[0]):
+            stale.append(key)
+    if not in_audit:
+        stale += [k for k in AUDIT_KEYS if k in ss]
+        if len(ss.audit_df):
+            ss.audit_df = pd.DataFrame()
+    else:
+        stale += [k for k in LANDING_KEYS if k in ss]
+    if not (ss.viewing_admin and ss.admin_selected_group_id is not None):
+        stale += [k for k in ADMIN_GROUP_KEYS if k in ss]
+    for key in stale:
+        del ss[key]
+    return len(stale)
+
+def approx_size(obj, depth=0):
+    """Rough bytes held by a session value: DataFrames by their deep memory usage, containers recursively."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum() if isinstance(obj, pd.DataFrame) else obj.memory_usage(deep=True))
+    size = sys.getsizeof(obj)
+    if depth > 4:
+        return size
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, depth + 1) + approx_size(v, depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, depth + 1) for v in obj)
+    return size
+
+def session_footprint():
+    """This session's state as a DataFrame: Key, Bytes; largest first."""
+    rows = [(str(k), approx_size(v)) for k, v in st.session_state.items()]
+    return pd.DataFrame(rows, columns=['Key', 'Bytes']).sort_values('Bytes', ascending=False, ignore_index=True)
+
+@st.cache_resource
+def get_session_registry():
+    """Process-wide {session id: latest footprint}, updated at the end of every rerun (see record_footprint)."""
+    return {}
+
+def session_id():
+    """Stable id for this browser session (also owns its background jobs)."""
+    return st.session_state.setdefault('job_owner', uuid.uuid4().hex)
+
+def current_page():
+    ss = st.session_state
+    if ss.get('setup_complete'):
+        return 'Profile' if ss.get('viewing_profile') else f"Audit ({ss.get('audit_stage')})"
+    if ss.get('viewing_admin'):
+        return 'Admin'
+    return 'Global Stats' if ss.get('viewing_global_stats') else 'Home'
+
+def record_footprint():
+    """Stores this session's size in the registry and drops sessions idle for SESSION_IDLE_MINUTES."""
+    if not session_initialized():
+        return
+    footprint = session_footprint()
+    registry = get_session_registry()
+    now = time.time()
+    registry[session_id()] = {
+        'page': current_page(), 'keys': len(footprint), 'bytes': int(footprint['Bytes'].sum()), 'seen': now,
+    }
+    for sid, entry in list(registry.items()):
+        if now - entry['seen'] > SESSION_IDLE_MINUTES * 60:
+            registry.pop(sid, None)
+
+def session_overview():
+    """Live sessions for the admin metrics: Session, Page, Keys, Size (KB), Idle (min); largest first."""
+    now = time.time()
+    rows = [(sid[:8], e['page'], e['keys'], round(e['bytes'] / 1024, 1), round((now - e['seen']) / 60, 1))
+            for sid, e in list(get_session_registry().items())]
+    df = pd.DataFrame(rows, columns=['Session', 'Page', 'Keys', 'Size (KB)', 'Idle (min)'])
+    return df.sort_values('Size (KB)', ascending=False, ignore_index=True)
+
+@st.cache_resource
+def get_backup_scheduler():
+    scheduler = BackupScheduler()
+    scheduler.start()
+    return scheduler
+
+@st.cache_resource
+def get_job_executor():
+    return JobExecutor()
+
+def submit_job(fn, *args, **kwargs):
+    """Submits a job on behalf of the current browser session (see JobExecutor.submit)."""
+    return get_job_executor().submit(fn, *args, owner=session_id(), **kwargs)
+
+def job_tray():
+    """Sidebar list of this session's jobs: progress while running, result or download when done."""
+    jobs = get_job_executor().jobs(st.session_state.get('job_owner'))
+    if not jobs:
+        return
+    st.markdown("#### ⏳ Background Jobs")
+    seen = st.session_state.setdefault('jobs_seen', set())
+    for job in jobs:
+        icon = {'Queued': '🕓', 'Running': '⚙️', 'Done': '✅', 'Failed': '❌'}[job['status']]
+        st.caption(f"{icon} {job['label']}")
+        if job['status'] in ('Queued', 'Running'):
+            st.progress(job['progress'], text=job['message'] or job['status'])
+            continue
+        
+        if job['id'] not in seen:
+            # First time this session sees it finished: drop what it made stale
+            for key in job['clear_keys']:
+                st.session_state.pop(key, None)
+            seen.add(job['id'])
+        if job['status'] == 'Failed':
+            st.error(job['error'])
+        elif job['download'] and job['result'] is not None:
+            file_name, mime = job['download']
+            st.download_button("⬇️ Download", data=job['result'], file_name=file_name, mime=mime, key=f"job_dl_{job['id']}")
+        elif callable(job['done_text']):
+            st.success(job['done_text'](job['result']))
+        elif job['done_text']:
+            st.success(job['done_text'].format(result=job['result']))
+    if st.button("Clear Finished", key="jobs_clear"):
+        get_job_executor().forget(st.session_state.get('job_owner'))
+        st.rerun()
+
+def render_job_tray():
+    """Polls the tray as a fragment while this session has unfinished jobs, without rerunning the page."""
+    jobs = get_job_executor().jobs(st.session_state.get('job_owner'))
+    active = any(j['status'] in ('Queued', 'Running') for j in jobs)
+    with st.sidebar:
+        st.fragment(job_tray, run_every=JOB_POLL_SECONDS if active else None)()
+
+def get_member_search_index():
+    """Returns the search index for the loaded group, building it once per group."""
+    index_key = (st.session_state.group_id, len(st.session_state.audit_df))
+    if st.session_state.get('member_search_key') != index_key:
+        lookup = get_member_lookup(st.session_state.group_id)
+        st.session_state.member_search_index = build_member_search_index(st.session_state.audit_df, lookup)
+        st.session_state.member_search_key = index_key
+    return st.session_state.member_search_index
+
+def load_older_history():
+    """History dialog callback: appends the next (older) page of sessions."""
+    rows, cursor = get_audit_history(st.session_state.group_id, before=st.session_state.history_cursor)
+    st.session_state.history_rows = st.session_state.history_rows + rows
+    st.session_state.history_cursor = cursor
+
+def load_portfolio_page(group_id, reset=False):
+    """Loan Portfolio: loads the first page (reset) or appends the next older page."""
+    if reset or st.session_state.get('portfolio_group_id') != group_id:
+        st.session_state.portfolio_loans, st.session_state.portfolio_cursor = get_active_loans(group_id)
+        st.session_state.portfolio_group_id = group_id
+    elif st.session_state.portfolio_cursor:
+        page, cursor = get_active_loans(group_id, before=st.session_state.portfolio_cursor)
+        st.session_state.portfolio_loans = pd.concat([st.session_state.portfolio_loans, page], ignore_index=True)
+        st.session_state.portfolio_cursor = cursor
+
+def load_meetings_page(query, reset=False):
+    """
+    Landing page: loads the first page of upcoming meetings (reset) or appends the next one.
+    query: (start, end, unscheduled) - the arguments of get_upcoming_meetings for the chosen window.
+    """
+    start, end, unscheduled = query
+    if reset:
+        st.session_state.meeting_rows, st.session_state.meeting_cursor = get_upcoming_meetings(start, end, unscheduled=unscheduled)
+        st.session_state.meeting_query = query
+    elif st.session_state.meeting_cursor:
+        rows, cursor = get_upcoming_meetings(start, end, after=st.session_state.meeting_cursor, unscheduled=unscheduled)
+        st.session_state.meeting_rows = st.session_state.meeting_rows + rows
+        st.session_state.meeting_cursor = cursor
+
+def jump_to_member(widget_key):
+    """Search result callback: jumps the carousel straight to the selected member."""
+    pos = st.session_state.get(widget_key)
+    if pos is not None:
+        st.session_state.current_member_index = int(pos)
+
+def open_admin_member(widget_key, picks):
+    """Admin search callback: opens the member's group with the member selected in the inspector."""
+    mid = st.session_state.get(widget_key)
+    if mid in picks:
+        group_id, name, _ = picks[mid]
+        st.session_state.admin_selected_group_id = group_id
+        st.session_state.adm_insp_mem = name
+        st.session_state.pop(widget_key, None)
+
+def calculate_waterfall(idx):
+    """Performs financial calculations for a single row."""
+    df = st.session_state.audit_df
+    
+    # Helper to safely get int
+    def get_int(col):
+        try:
+            return int(float(df.at[idx, col]))
+        except:
+            return 0
+
+    adv_bf = get_int('Advance BF')
+    loan_bf = get_int('Loan BF')
+    fines = get_int('Fines')
+    loan_prin = get_int('Loan Principal')
+    adv_prin = get_int('Advance Principal')
+    cash_today = get_int('Total Cash Today')
+    
+    # Logic
+    # Apply rounding to interest (rates from the group's by-laws):
+    rules = get_audit_rules()
+    adv_int_raw = adv_bf * rules['advance_rate']
+    loan_int_raw = loan_bf * rules['loan_rate']
+    
+    adv_int = int(round_to_five(adv_int_raw))
+    loan_int = int(round_to_five(loan_int_raw))
+    
+    # Write interest FIRST so it's included in calculations if needed,
+    # or just stored. Logic: Deductions include Interest.
+    set_ledger_value(df, idx, 'Advance Interest', adv_int)
+    set_ledger_value(df, idx, 'Loan Interest', loan_int)
+    
+    deductions = fines + loan_prin + loan_int + adv_prin + adv_int
+    savings_today = cash_today - deductions
+    
+    # Write back results
+    set_ledger_value(df, idx, 'Savings Today', savings_today)
+    
+    st.session_state.audit_df = df
+    refresh_carry_forward(idx)
+
+def refresh_carry_forward(idx):
+    """Recomputes one member's CF columns (apply_carry_forward, the rule save_session writes with)."""
+    df = st.session_state.audit_df
+    cf = apply_carry_forward(df.loc[[idx]])
+    for col in CF_COLS:
+        set_ledger_value(df, idx, col, int(cf.at[idx, col]))
+
+def update_val(col, key=None):
+    """Input callback. `key`: the widget's key when it isn't the collection screen's "<col>_<idx>_<month>_<year>_<stage>"."""
+    idx = st.session_state.current_member_index
+    m = st.session_state.get('audit_month', 'NA')
+    y = st.session_state.get('audit_year', 'NA')
+    stage = st.session_state.get('audit_stage', 'collection')
+    key = key or f"{col}_{idx}_{m}_{y}_{stage}"
+    
+    if key in st.session_state:
+        set_ledger_value(st.session_state.audit_df, idx, col, st.session_state[key])
+        refresh_carry_forward(idx)
+
+def capture_audit_base():
+    """
+    Remembers the ledger and session version this auditor started from, so save_session can
+    tell another auditor's save apart from our own edits. Also stores the working ledger compactly
+    (compact_ledger) - every audit is opened or reloaded through here.
+    """
+    st.session_state.audit_df = compact_ledger(st.session_state.audit_df)
+    st.session_state.audit_base = {
+        'version': get_session_version(st.session_state.group_id, st.session_state.audit_month, st.session_state.audit_year),
+        'df': compact_merge_base(st.session_state.audit_df),
+    }
+
+def get_audit_rules():
+    """
+    The group's rules for the month being audited. Read from the database once per audit
+    (keyed on group + period) and kept in session state; clear 'audit_rules_key' to reload.
+    """
+    key = (st.session_state.group_id, get_period(st.session_state.audit_month, st.session_state.audit_year))
+    if st.session_state.get('audit_rules_key') != key:
+        st.session_state.audit_rules = rules_for_period(get_group_rules(key[0]), key[1])
+        st.session_state.audit_rules_key = key
+    return st.session_state.audit_rules
+
+def update_attendance_fines():
+    """Updates fines based on attendance."""
+    idx = st.session_state.current_member_index
+    status = st.session_state.get(f"attend_{idx}", "Present")
+    
+    # Update Status in DF
+    set_ledger_value(st.session_state.audit_df, idx, 'Attendance', status)
+    
+    # Auto-Fine Logic (group by-laws)
+    fine = fine_schedule(get_audit_rules()).get(status, 0)
+
+    # Update Fine in DF and Input
+    set_ledger_value(st.session_state.audit_df, idx, 'Fines', fine)
+    
+    # Crucial: Update the number_input session state key to reflect change immediately
+    m = st.session_state.get('audit_month', 'NA')
+    y = st.session_state.get('audit_year', 'NA')
+    stage = st.session_state.get('audit_stage', 'collection')
+    fine_key = f"Fines_{idx}_{m}_{y}_{stage}"
+    st.session_state[fine_key] = fine
@@ -0,0 +1,217 @@
+"""Offline device sync: compressed delta bundles built from change_log, imported idempotently."""
+import pandas as pd
+import sqlite3
+import gzip
+import json
+from datetime import datetime
+
+from .config import DB_FILE
+from .db import SYNC_TABLES, replay_later_sessions, sync_loan_ledger
+
+SYNC_FORMAT = 1
+SYNC_IGNORE_COLS = ['version'] # local counters, never compared or copied
+
+def get_sync_status(db_path=DB_FILE):
+    """Returns (device id, last exported change seq, changes logged since)."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    state = dict(c.execute("SELECT key, value FROM sync_state").fetchall())
+    last = int(state.get('last_export_seq', 0))
+    pending = c.execute("SELECT COUNT(DISTINCT tbl || row_uid) FROM change_log WHERE seq > ?", (last,)).fetchone()[0]
+    conn.close()
+    return state['device_id'], last, pending
+
+def reset_device_id(db_path=DB_FILE):
+    """Gives this database its own device id (for a laptop that started as a copy of the central file)."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE sync_state SET value = lower(hex(randomblob(8))) WHERE key = 'device_id'")
+    conn.execute("DELETE FROM sync_state WHERE key = 'last_export_seq'")
+    conn.commit()
+    conn.close()
+
+def export_sync_bundle(db_path=DB_FILE, since=None):
+    """
+    Packs every synced row changed since the last export (or since change `since`) into a gzipped JSON bundle:
+    current values for rows that still exist, uids for rows deleted. Foreign keys travel as uids.
+    Each row appears once however often it changed, so the bundle grows with the changes, not the database.
+    Returns: bundle bytes. Advances the export watermark.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    state = dict(c.execute("SELECT key, value FROM sync_state").fetchall())
+    since = int(state.get('last_export_seq', 0)) if since is None else int(since)
+    to_seq = c.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+    tables = {}
+    for table, fks in SYNC_TABLES.items():
+        joins = "".join(f" LEFT JOIN {parent} p{i} ON p{i}.id = r.{fk}" for i, (fk, (parent, _)) in enumerate(fks.items()))
+        uid_cols = "".join(f", p{i}.uid AS {uid_col}" for i, (parent, uid_col) in enumerate(fks.values()))
+        changed = "SELECT row_uid FROM change_log WHERE tbl = ? AND seq > ? AND seq <= ?"
+        c.execute(f"SELECT r.*{uid_cols} FROM {table} r{joins} WHERE r.uid IN ({changed})", (table, since, to_seq))
+        cols = [d[0] for d in c.description]
+        keep = [i for i, col in enumerate(cols) if col != 'id' and col not in fks and col not in SYNC_IGNORE_COLS]
+        rows = [[row[i] for i in keep] for row in c.fetchall()]
+
+        c.execute(f"SELECT DISTINCT row_uid FROM change_log l WHERE tbl = ? AND seq > ? AND seq <= ? "
+                  f"AND NOT EXISTS (SELECT 1 FROM {table} r WHERE r.uid = l.row_uid)", (table, since, to_seq))
+        deleted = [r[0] for r in c.fetchall() if r[0]]
+        if rows or deleted:
+            tables[table] = {'columns': [cols[i] for i in keep], 'rows': rows, 'deleted': deleted}
+
+    c.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_export_seq', ?)", (str(to_seq),))
+    conn.commit()
+    conn.close()
+
+    bundle = {'format': SYNC_FORMAT, 'device_id': state['device_id'], 'from_seq': since, 'to_seq': to_seq,
+              'created': datetime.now().isoformat(timespec='seconds'), 'tables': tables}
+    return gzip.compress(json.dumps(bundle, separators=(',', ':'), default=str).encode('utf-8'))
+
+def sync_row_label(table, record):
+    """Human-readable name of a bundle row for the conflict report."""
+    if table in ('groups', 'members'):
+        return str(record.get('name'))
+    if table == 'audit_sessions':
+        return f"{record.get('month')} {record.get('year')}"
+    return f"Transaction {str(record.get('uid'))[:8]}"
+
+def import_sync_bundle(data, db_path=DB_FILE):
+    """
+    Applies a bundle from another device in one transaction. Matching is by uid, so importing the
+    same bundle twice changes nothing. A row is left alone and reported when this database changed it
+    too since the last import from that device, or when it breaks a unique key here (same group name,
+    account number or audited month under another uid); a skipped session takes its transactions with it.
+    Imported months are then applied to the loans ledger and later months replayed, as a save would.
+    Returns: (summary dict, conflict report DataFrame).
+    """
+    bundle = json.loads(gzip.decompress(data).decode('utf-8'))
+    if bundle.get('format') != SYNC_FORMAT:
+        raise ValueError(f"Unsupported sync bundle format: {bundle.get('format')}")
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    device_id = c.execute("SELECT value FROM sync_state WHERE key = 'device_id'").fetchone()[0]
+    if bundle['device_id'] == device_id:
+        conn.rollback()
+        conn.close()
+        raise ValueError("This bundle came from this database (or a copy sharing its device id). "
+                         "Give the copy its own device id before exporting from it.")
+    peer = c.execute("SELECT remote_seq, local_seq FROM sync_peers WHERE device_id = ?", (bundle['device_id'],)).fetchone()
+    remote_seq, baseline = peer if peer else (0, 0)
+
+    report = []
+    if bundle['from_seq'] > remote_seq:
+        report.append(('—', f"Device {bundle['device_id']}",
+                       f"Changes #{remote_seq + 1}–#{bundle['from_seq']} were never imported; rows changed only then are missing."))
+
+    def changed_here(table, uid):
+        return c.execute("SELECT 1 FROM change_log WHERE tbl = ? AND row_uid = ? AND seq > ? LIMIT 1",
+                         (table, uid, baseline)).fetchone() is not None
+
+    applied = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    # uids whose children are skipped too: rows that couldn't be added, and months in conflict
+    skipped = {table: set() for table in SYNC_TABLES}
+    touched_sessions = set()
+    tables = bundle['tables']
+
+    for table, fks in SYNC_TABLES.items():
+        if table not in tables:
+            continue
+        local_cols = {r[1] for r in c.execute(f"PRAGMA table_info({table})")}
+        cols = tables[table]['columns']
+        use = [col for col in cols if col in local_cols]
+        parent_ids = {parent: dict(c.execute(f"SELECT uid, id FROM {parent}").fetchall())
+                      for parent, _ in fks.values()}
+
+        for values in tables[table]['rows']:
+            record = dict(zip(cols, values))
+            label = sync_row_label(table, record)
+
+            fk_vals, missing = {}, None
+            for fk, (parent, uid_col) in fks.items():
+                if record.get(uid_col) in skipped[parent]:
+                    missing = 'skipped'
+                elif record.get(uid_col) not in parent_ids[parent]:
+                    missing = f"Its {parent.rstrip('s').replace('_', ' ')} isn't in this database or the bundle"
+                fk_vals[fk] = parent_ids[parent].get(record.get(uid_col))
+            if missing:
+                skipped[table].add(record['uid'])
+                if missing != 'skipped':
+                    report.append((table, label, missing))
+                continue
+
+            row = {**{col: record[col] for col in use}, **fk_vals}
+            names = list(row)
+            c.execute(f"SELECT {', '.join(names)} FROM {table} WHERE uid = ?", (record['uid'],))
+            current = c.fetchone()
+            try:
+                if current is None:
+                    c.execute(f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                              tuple(row.values()))
+                    applied['inserted'] += 1
+                elif tuple(current) == tuple(row.values()):
+                    applied['unchanged'] += 1
+                    continue
+                elif changed_here(table, record['uid']):
+                    differs = [n for n, old, new in zip(names, current, row.values()) if old != new]
+                    report.append((table, label, "Changed on both devices: " + ", ".join(differs)))
+                    if table == 'audit_sessions':
+                        skipped[table].add(record['uid'])
+                    continue
+                else:
+                    c.execute(f"UPDATE {table} SET {', '.join(f'{n} = ?' for n in names)} WHERE uid = ?",
+                              tuple(row.values()) + (record['uid'],))
+                    applied['updated'] += 1
+            except sqlite3.IntegrityError as e:
+                report.append((table, label, f"Already exists here under another record ({e})"))
+                skipped[table].add(record['uid'])
+                continue
+
+            if table == 'audit_sessions':
+                touched_sessions.add(record['uid'])
+            elif table == 'transactions':
+                touched_sessions.add(record['session_uid'])
+
+    # Deletions, children first
+    for table in reversed(list(SYNC_TABLES)):
+        for uid in tables.get(table, {}).get('deleted', []):
+            if table == 'transactions':
+                owner = c.execute("SELECT s.uid FROM transactions t JOIN audit_sessions s ON s.id = t.session_id WHERE t.uid = ?",
+                                  (uid,)).fetchone()
+                if owner and owner[0] in skipped['audit_sessions']:
+                    continue
+            if c.execute(f"SELECT 1 FROM {table} WHERE uid = ?", (uid,)).fetchone() is None:
+                continue
+            if changed_here(table, uid):
+                report.append((table, uid[:8], "Deleted on the other device but changed here - kept"))
+                continue
+            if table == 'transactions' and owner:
+                touched_sessions.add(owner[0])
+            c.execute(f"DELETE FROM {table} WHERE uid = ?", (uid,))
+            applied['deleted'] += 1
+
+    # Carry imported months into the loans ledger and the months after them
+    if touched_sessions:
+        marks = ", ".join("?" * len(touched_sessions))
+        c.execute(f"SELECT id, group_id, period FROM audit_sessions WHERE is_finalized = 1 AND uid IN ({marks}) "
+                  "ORDER BY period, id", tuple(touched_sessions))
+        imported_periods = {}
+        for session_id, group_id, period in c.fetchall():
+            sync_loan_ledger(c, group_id, session_id, period)
+            imported_periods.setdefault(group_id, []).append(period)
+        # Earliest first: months between two imported ones (possibly only in this database) are re-chained too
+        for group_id, periods in imported_periods.items():
+            for period in sorted(set(periods)):
+                replay_later_sessions(c, group_id, period)
+
+    local_seq = c.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    c.execute('''INSERT INTO sync_peers (device_id, remote_seq, local_seq, imported_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                 ON CONFLICT(device_id) DO UPDATE SET remote_seq = MAX(remote_seq, excluded.remote_seq),
+                     local_seq = excluded.local_seq, imported_at = excluded.imported_at''',
+              (bundle['device_id'], bundle['to_seq'], local_seq))
+    conn.commit()
+    conn.close()
+
+    applied['conflicts'] = len(report)
+    return applied, pd.DataFrame(report, columns=['Table', 'Record', 'Problem'])
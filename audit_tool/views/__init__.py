@@ -0,0 +1 @@
+"""Page renderers, one module per page; main.py imports them on demand."""
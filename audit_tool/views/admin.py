@@ -0,0 +1,800 @@
+"""Admin Panel: group grid, maintenance, and per-group management tabs."""
+import streamlit as st
+import pandas as pd
+import sqlite3
+import os
+import time
+from datetime import datetime
+
+from .. import export_history, integrity_check
+from ..config import (
+    ARCHIVE_DIR, ARCHIVE_HORIZON_MONTHS, BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP, DB_FILE,
+    DEFAULT_RULES, MEETING_RECURRENCES, MONTHS,
+)
+from ..engine import (
+    PROJECTION_MAX_MONTHS, DuplicateMemberError, default_projection_scenarios, get_period, identity_match_messages,
+    period_label, project_balances, rules_for_period, rules_for_periods,
+)
+from ..archive import archive_path, archive_sessions, get_archive_cutoff, read_history
+from ..db import (
+    MEMBER_IMPORT_COLS, MEMBER_IMPORT_REQUIRED, add_member, backfill_sessions, bulk_import_members,
+    check_if_guarantor, delete_group_rule, delete_member, duplicate_identity_report, export_ledger,
+    find_identity_matches, get_all_groups_extended, get_finalized_periods, get_finalized_sessions_by_year,
+    get_group_rules, get_latest_balances, get_meeting_schedule, get_member_details, load_group_data,
+    parse_backfill_file, save_group_rule, save_loan_image, search_members, set_meeting_schedule,
+    update_member_role, validate_bf_cf_chain, validate_member_import,
+)
+from ..backup import list_backups, restore_backup
+from ..sync import export_sync_bundle, get_sync_status, import_sync_bundle, reset_device_id
+from ..jobs import integrity_report_csv
+from ..state import (
+    bootstrap, get_backup_scheduler, load_portfolio_page, open_admin_member, session_footprint, session_overview,
+    submit_job,
+)
+
+def get_member_statement_stamp(member_id):
+    """Cheap cache key for a member's statement: changes whenever a session holding the member is finalized."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute('''SELECT MAX(s.finalized_at), COUNT(*), MAX(s.id)
+                 FROM transactions t
+                 JOIN audit_sessions s ON t.session_id = s.id
+                 WHERE t.member_id = ? AND s.is_finalized = 1''', (member_id,))
+    row = c.fetchone()
+    conn.close()
+    return f"{row[0]}|{row[1]}|{row[2]}"
+
+STATEMENT_COLS = [
+    'Period', 'Month', 'Year', 'Status', 'Cash Paid',
+    'Savings In', 'Withdrawn', 'Savings Balance',
+    'New Loan', 'Loan Repaid', 'Loan Balance',
+    'New Advance', 'Advance Repaid', 'Advance Balance',
+    'Interest Paid', 'Fines',
+    'Net Savings To Date', 'Interest To Date', 'Fines To Date'
+]
+
+@st.cache_data(show_spinner=False)
+def get_member_statement(member_id, stamp):
+    """
+    Multi-year member statement in period (month) order, across the live database and the archive.
+    Each tier is read with one query; running totals are taken after the tiers are joined up.
+    `stamp` comes from get_member_statement_stamp so the cached copy lives until the member's next finalize.
+    """
+    query = '''
+        SELECT s.period, s.month, s.year, t.attendance_status,
+               COALESCE(t.cash_today, 0),
+               COALESCE(t.savings_today, 0), COALESCE(t.savings_withdrawal, 0), COALESCE(t.savings_cf, 0),
+               COALESCE(t.new_loan, 0), COALESCE(t.loan_principal, 0), COALESCE(t.loan_cf, 0),
+               COALESCE(t.new_advance, 0), COALESCE(t.advance_principal, 0), COALESCE(t.advance_cf, 0),
+               COALESCE(t.loan_interest, 0) + COALESCE(t.advance_interest, 0),
+               COALESCE(t.fines, 0)
+        FROM history_transactions t
+        JOIN history_sessions s ON t.session_id = s.id
+        WHERE t.member_id = ? AND s.is_finalized = 1
+        ORDER BY s.period, s.id
+    '''
+    stmt = read_history(query, (member_id,))
+    stmt.columns = STATEMENT_COLS[:-3]
+    stmt['Net Savings To Date'] = (stmt['Savings In'] - stmt['Withdrawn']).cumsum()
+    stmt['Interest To Date'] = stmt['Interest Paid'].cumsum()
+    stmt['Fines To Date'] = stmt['Fines'].cumsum()
+    return stmt
+
+@st.cache_data(show_spinner=False)
+def get_member_statement_pdf(member_id, stamp, member_name, group_name):
+    """PDF copy of the member statement (cached alongside the statement itself)."""
+    stmt_df = get_member_statement(member_id, stamp)
+    details = get_member_details(member_id) or {}
+    from ..reporting import generate_member_statement_pdf
+    return generate_member_statement_pdf(member_name, group_name, details.get('account_number', 'N/A'), stmt_df)
+
+def get_group_trends_stamp(group_id):
+    """Cheap cache key for a group's trends: changes whenever the group finalizes a session."""
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT MAX(finalized_at), COUNT(*), MAX(id) FROM audit_sessions WHERE group_id = ? AND is_finalized = 1", (group_id,))
+    row = c.fetchone()
+    conn.close()
+    return f"{row[0]}|{row[1]}|{row[2]}"
+
+# One grouped aggregate per metric, keyed on the session period
+TREND_QUERIES = {
+    'Savings Pool': "SUM(COALESCE(t.savings_cf, 0))",
+    'Loan Book': "SUM(COALESCE(t.loan_cf, 0) + COALESCE(t.advance_cf, 0))",
+    'Interest Income': "SUM(COALESCE(t.loan_interest, 0) + COALESCE(t.advance_interest, 0))",
+    'Attendance Rate (%)': "ROUND(100.0 * AVG(CASE WHEN t.attendance_status IN ('Present', 'Late') THEN 1 ELSE 0 END), 1)",
+}
+
+@st.cache_data(show_spinner=False)
+def get_group_trends(group_id, stamp):
+    """
+    Per-period time series of a group's savings pool, loan book, interest income and attendance rate.
+    `stamp` comes from get_group_trends_stamp so the cached copy lives until the group's next finalize.
+    Returns: DataFrame indexed by month start date, one column per metric.
+    """
+    series = {}
+    for metric, agg in TREND_QUERIES.items():
+        # A month's session sits wholly in one tier, so per-tier groups never overlap
+        rows = read_history(f'''SELECT s.period, {agg} AS value
+                                  FROM history_sessions s
+                                  JOIN history_transactions t ON t.session_id = s.id
+                                  WHERE s.group_id = ? AND s.is_finalized = 1
+                                  GROUP BY s.period''', (group_id,))
+        series[metric] = dict(zip(rows['period'], rows['value']))
+    
+    trends = pd.DataFrame(series).sort_index()
+    trends.index = [pd.Timestamp(year=int(p) // 12, month=int(p) % 12 + 1, day=1) for p in trends.index]
+    trends.index.name = 'Period'
+    return trends
+
+def view_admin_panel():
+    st.markdown("## ⚙️ Administration Panel")
+    
+    # --- Layer 1: Group Grid (Default) ---
+    if st.session_state.admin_selected_group_id is None:
+        if st.button("⬅️ Back to Home", key="admin_back_home"):
+            st.session_state.viewing_admin = False
+            st.rerun()
+            
+        st.divider()
+        
+        # --- Member Search (every group) ---
+        query = st.text_input("🔎 Find a Member", key="admin_member_search",
+                              placeholder="Name, phone, ID number, account no. or residence - across all groups")
+        if query:
+            t0 = time.perf_counter()
+            hits = search_members(query)
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if hits.empty:
+                st.caption(f"No matching member ({elapsed_ms:.0f} ms).")
+            else:
+                st.caption(f"{len(hits)} best match(es) in {elapsed_ms:.0f} ms")
+                st.dataframe(hits.drop(columns=['Member ID', 'Group ID']), hide_index=True, use_container_width=True)
+                picks = {int(r['Member ID']): (int(r['Group ID']), r['Name'], f"{r['Name']} - {r['Group']}")
+                         for _, r in hits.iterrows()}
+                st.selectbox("Open in Member Inspector", list(picks), index=None, placeholder="Select a member",
+                             format_func=lambda mid: picks[mid][2], key="admin_member_hit",
+                             on_change=open_admin_member, args=("admin_member_hit", picks))
+        
+        st.subheader("Select a Group to Manage")
+        
+        all_groups = get_all_groups_extended()
+        if not all_groups:
+            st.warning("No groups found. Create one on the home screen.")
+            return
+
+        cols = st.columns(3)
+        for i, group in enumerate(all_groups):
+            col = cols[i % 3]
+            # ID, Name, Meeting
+            gid = group['id']
+            with col:
+                 if st.button(f"📁 {group['name']}", key=f"g_btn_{gid}", use_container_width=True):
+                     st.session_state.admin_selected_group_id = gid
+                     st.rerun()
+        
+        # --- Duplicate Identities ---
+        st.divider()
+        with st.expander("🪪 Duplicate Identities"):
+            st.caption("Member records in any group that share an ID number or phone (compared without spaces, "
+                       "dashes or the +254 prefix) - usually one person registered more than once.")
+            dup_df = duplicate_identity_report()
+            if dup_df.empty:
+                st.success("✅ Every ID number and phone belongs to one member.")
+            else:
+                st.warning(f"⚠️ {dup_df.groupby(['Matched On', 'Value']).ngroups} shared identity(ies) across "
+                           f"{dup_df['Member ID'].nunique()} member record(s).")
+                st.dataframe(dup_df, hide_index=True, use_container_width=True)
+                st.download_button("⬇️ Download Report", data=dup_df.to_csv(index=False),
+                                   file_name="duplicate_identities.csv", mime="text/csv", key="dup_report_dl")
+        
+        # --- Archive Tier ---
+        with st.expander("🗄️ Archive Old Sessions"):
+            st.caption("Moves finalized months older than the horizon into one database file per year under "
+                       f"'{ARCHIVE_DIR}/'. History, statements and stats still read them; archived months can't be re-audited.")
+            conn = sqlite3.connect(DB_FILE)
+            archive_df = pd.read_sql_query("SELECT year, sessions, cutoff_period, archived_at FROM archive_files ORDER BY year", conn)
+            conn.close()
+            if not archive_df.empty:
+                st.dataframe(pd.DataFrame({
+                    'Year': archive_df['year'],
+                    'Sessions': archive_df['sessions'],
+                    'Archived Before': archive_df['cutoff_period'].map(period_label),
+                    'Size (KB)': [os.path.getsize(archive_path(y)) // 1024 if os.path.exists(archive_path(y)) else 0
+                                  for y in archive_df['year']],
+                    'Last Run': archive_df['archived_at'],
+                }), hide_index=True, use_container_width=True)
+            
+            horizon = st.number_input("Keep the last N months live", min_value=3, max_value=120,
+                                      value=ARCHIVE_HORIZON_MONTHS, key="archive_horizon")
+            if st.button("🗄️ Archive Now", key="archive_run"):
+                submit_job(archive_sessions, int(horizon), label="Archive old sessions", progress=True,
+                           done_text=lambda moved: ("Archived " + ", ".join(f"{n} session(s) from {y}" for y, n in moved.items()) + "."
+                                                    if moved else "Nothing older than the horizon to archive."))
+                st.toast("🗄️ Archiving in the background — progress is in the sidebar.")
+        
+        # --- Backups ---
+        with st.expander("💾 Backups"):
+            scheduler = get_backup_scheduler()
+            st.caption(f"Snapshots of the live database are taken every {BACKUP_INTERVAL_HOURS} hours in the background "
+                       f"and integrity-checked; the newest {BACKUP_KEEP} scheduled ones are kept in '{BACKUP_DIR}/'.")
+            
+            c_b1, c_b2, c_b3 = st.columns(3)
+            c_b1.metric("Last Backup", scheduler.last_run.strftime("%d %b %H:%M") if scheduler.last_run else "—")
+            c_b2.metric("Next Scheduled", datetime.fromtimestamp(scheduler.next_run).strftime("%d %b %H:%M"))
+            c_b3.metric("Status", "Running…" if scheduler.running else ("❌ Failed" if scheduler.last_error else "✅ OK"))
+            if scheduler.last_error:
+                st.error(scheduler.last_error)
+            if st.button("💾 Back Up Now", key="backup_now"):
+                scheduler.request()
+                st.toast("Backup started in the background.")
+            
+            backups = list_backups()
+            if backups:
+                st.dataframe(pd.DataFrame({
+                    'Snapshot': backups,
+                    'Size (KB)': [os.path.getsize(os.path.join(BACKUP_DIR, b)) // 1024 for b in backups],
+                }), hide_index=True, use_container_width=True)
+                
+                c_r1, c_r2 = st.columns([3, 1])
+                restore_name = c_r1.selectbox("Restore Snapshot", backups, key="restore_pick")
+                confirm = c_r1.checkbox("I understand the live data will be replaced (a pre-restore copy is kept).", key="restore_confirm")
+                c_r1.caption("This device's sync state is kept; other devices don't receive the restored data.")
+                if c_r2.button("♻️ Restore", key="restore_btn", disabled=not confirm):
+                    try:
+                        with st.spinner("Restoring..."):
+                            restore_backup(restore_name)
+                        st.cache_data.clear()
+                        st.success(f"Restored {restore_name}.")
+                    except sqlite3.DatabaseError as e:
+                        st.error(f"Restore failed: {e}")
+        
+        # --- Maintenance Jobs ---
+        with st.expander("🧰 Maintenance Jobs"):
+            st.caption("Run in the background; progress and results show in the sidebar.")
+            c_m1, c_m2 = st.columns(2)
+            if c_m1.button("🔍 Integrity Audit", key="job_integrity", use_container_width=True):
+                # Thread job: run_integrity_audit starts its own worker processes per group
+                submit_job(integrity_report_csv, DB_FILE, label="Integrity audit",
+                           download=(integrity_check.REPORT_FILE, "text/csv"))
+            export_fmt = c_m2.selectbox("Export Format", sorted(export_history.FILE_EXT), key="job_export_fmt")
+            if c_m2.button("📤 Analytics Export", key="job_export", use_container_width=True):
+                submit_job(export_history.export_history, DB_FILE, export_history.EXPORT_DIR, export_fmt, kind="process",
+                           label=f"Analytics export ({export_fmt})",
+                           done_text=f"Exported {{result}} new session(s) to '{export_history.EXPORT_DIR}/'.")
+        
+        # --- Device Sync ---
+        with st.expander("🔄 Device Sync"):
+            device_id, last_seq, pending = get_sync_status()
+            st.caption("Carries changes between two copies of the database (a field laptop and the office) without a network. "
+                       "Export a bundle on one, import it on the other; importing the same bundle twice is harmless.")
+            c_s1, c_s2 = st.columns(2)
+            c_s1.metric("This Device", device_id)
+            c_s2.metric("Changed Since Last Export", pending)
+            
+            resend = st.checkbox("Resend every tracked change (if a bundle went missing)", key="sync_resend")
+            if st.button("📦 Export Changes", key="sync_export"):
+                submit_job(export_sync_bundle, DB_FILE, 0 if resend else None, label="Sync bundle",
+                           download=(f"sync_{device_id}_{datetime.now().strftime('%Y%m%d_%H%M')}.json.gz", "application/gzip"))
+            
+            bundle_file = st.file_uploader("Import a Bundle", type=['gz'], key="sync_file")
+            if bundle_file and st.button("📥 Import Bundle", key="sync_import", type="primary"):
+                try:
+                    with st.spinner("Importing..."):
+                        summary, conflicts = import_sync_bundle(bundle_file.getvalue())
+                    st.cache_data.clear()
+                    st.success(f"Imported: {summary['inserted']} added, {summary['updated']} updated, "
+                               f"{summary['deleted']} removed, {summary['unchanged']} already up to date.")
+                    if not conflicts.empty:
+                        st.warning(f"⚠️ {len(conflicts)} record(s) were left as they are here:")
+                        st.dataframe(conflicts, hide_index=True, use_container_width=True)
+                except (ValueError, OSError) as e:
+                    st.error(f"Import failed: {e}")
+            
+            if st.button("🆔 New Device ID", key="sync_reset_id",
+                         help="Use once on a laptop that started as a copy of the office database"):
+                reset_device_id()
+                st.rerun()
+        
+        # --- Performance ---
+        with st.expander("⏱️ Performance"):
+            timings = bootstrap()
+            st.caption("Startup cost of this server process, how long pages take to draw in your session, "
+                       "and how much memory each open session holds.")
+            c_p1, c_p2, c_p3, c_p4 = st.columns(4)
+            c_p1.metric("Import (ms)", f"{timings.get('import_ms', 0):,.0f}")
+            c_p2.metric("First Render (ms)", f"{timings.get('first_render_ms', 0):,.0f}")
+            c_p3.metric("Your First Page (ms)", f"{st.session_state.get('first_render_ms', 0):,.0f}")
+            c_p4.metric("Last Page (ms)", f"{st.session_state.get('last_render_ms', 0):,.0f}")
+            
+            # Session memory (each rerun records its session's size; stale widget keys are dropped first)
+            sessions = session_overview()
+            mine = session_footprint()
+            c_p5, c_p6, c_p7 = st.columns(3)
+            c_p5.metric("Active Sessions", len(sessions))
+            c_p6.metric("This Session (KB)", f"{mine['Bytes'].sum() / 1024:,.1f}")
+            c_p7.metric("All Sessions (KB)", f"{sessions['Size (KB)'].sum():,.1f}")
+            c_t1, c_t2 = st.columns(2)
+            c_t1.caption("Sessions by size")
+            c_t1.dataframe(sessions, hide_index=True, use_container_width=True)
+            c_t2.caption("Largest keys in this session")
+            c_t2.dataframe(mine.head(10).assign(KB=lambda d: (d['Bytes'] / 1024).round(1))[['Key', 'KB']],
+                           hide_index=True, use_container_width=True)
+                     
+    # --- Layer 2 & 3: Group Detail & Drill Down ---
+    else:
+        # Load Group logic
+        gid = st.session_state.admin_selected_group_id
+        g_name, members_tuples = load_group_data(gid)
+        
+        # Header
+        c1, c2 = st.columns([1, 5])
+        if c1.button("⬅️ Back", key="admin_back_grid"):
+            st.session_state.admin_selected_group_id = None
+            st.session_state.pop('portfolio_group_id', None) # Reload loans on next visit
+            st.rerun()
+            
+        c2.markdown(f"### Managing: **{g_name}**")
+        st.divider()
+        
+        # Tabs for Group Management
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(["📊 Dashboard", "👥 Manage Members", "📂 Loan Portfolio", "📈 Trends", "📤 Export", "🗂️ Backfill", "🔮 Projection", "📜 By-Laws"])
+        
+        # --- Tab 1: Dashboard (Existing Logic) ---
+        with tab1:
+            st.markdown("#### 🏛️ Leadership Team")
+            
+            # We need full member details to filter by role
+            # members_tuples is just (id, name). fetch details for all.
+            full_members = []
+            leaders = []
+            
+            for mid, mname in members_tuples:
+                d = get_member_details(mid)
+                role = d.get('role', 'Member')
+                # Append dict for dataframe later
+                full_members.append({
+                    'ID': mid,
+                    'Name': mname,
+                    'Role': role,
+                    'Account No': d.get('account_number'),
+                    'Phone': d.get('phone')
+                })
+                
+                if role in ['Chairman', 'Secretary', 'Treasurer']:
+                    leaders.append((mname, role))
+            
+            if leaders:
+                l_cols = st.columns(len(leaders))
+                for idx, (lname, lrole) in enumerate(leaders):
+                    with l_cols[idx]:
+                        st.info(f"**{lrole}**\n\n{lname}")
+            else:
+                st.caption("No leadership roles assigned yet.")
+                
+            st.divider()
+            
+            st.markdown("#### 👥 Member Directory")
+            df_mem = pd.DataFrame(full_members)
+            
+            if not df_mem.empty:
+                st.dataframe(df_mem[['Name', 'Role', 'Account No', 'Phone', 'ID']], hide_index=True, use_container_width=True)
+            
+                # Update Role UI
+                with st.expander("🛠️ Update Member Role", expanded=False):
+                    c_mem, c_role, c_btn = st.columns([2, 2, 1])
+                    
+                    m_map = {m['Name']: m['ID'] for m in full_members}
+                    sel_name = c_mem.selectbox("Select Member", list(m_map.keys()), key="adm_sel_mem")
+                    
+                    # Default index
+                    # Find current role
+                    curr_role = next((m['Role'] for m in full_members if m['Name'] == sel_name), 'Member')
+                    roles = ["Member", "Chairman", "Secretary", "Treasurer"]
+                    
+                    new_role = c_role.selectbox("New Role", roles, index=roles.index(curr_role) if curr_role in roles else 0, key="adm_sel_role")
+                    
+                    if c_btn.button("Update", key="adm_update_btn"):
+                        update_member_role(m_map[sel_name], new_role)
+                        st.success(f"Updated {sel_name}!")
+                        st.rerun()
+
+            st.divider()
+
+            # Member Inspector
+            st.markdown("#### 🔍 Member Inspector (Drill-Down)")
+            if not df_mem.empty:
+                insp_name = st.selectbox("Select Member to Inspect", list(m_map.keys()), key="adm_insp_mem")
+                if insp_name:
+                    mid = m_map[insp_name]
+                    stamp = get_member_statement_stamp(mid)
+                    stmt_df = get_member_statement(mid, stamp)
+                    
+                    if not stmt_df.empty:
+                        st.write(f"**Member Statement for {insp_name}:**")
+                        st.dataframe(stmt_df.drop(columns=['Period']), use_container_width=True, hide_index=True)
+                        
+                        c_pdf, c_csv = st.columns(2)
+                        c_pdf.download_button("📄 Statement PDF", data=get_member_statement_pdf(mid, stamp, insp_name, g_name),
+                                              file_name=f"statement_{mid}.pdf", mime="application/pdf", use_container_width=True)
+                        c_csv.download_button("🧾 Statement CSV", data=stmt_df.drop(columns=['Period']).to_csv(index=False).encode('utf-8'),
+                                              file_name=f"statement_{mid}.csv", mime="text/csv", use_container_width=True)
+                    else:
+                        st.info(f"No activity found for {insp_name}.")
+
+        # --- Tab 2: Manage Members ---
+        with tab2:
+            st.subheader("Add New Member")
+            with st.form("add_member_form", clear_on_submit=True):
+                st.markdown("### ➕ Add New Member (Deep KYC)")
+                
+                # SECTION 1: CORE KYC
+                st.caption("Core Identity")
+                name_in = st.text_input("Full Name *")
+                
+                c_a1, c_a2 = st.columns(2)
+                id_num_in = c_a1.text_input("ID / Passport Number *")
+                kra_pin_in = c_a2.text_input("KRA PIN")
+                
+                c_b1, c_b2, c_b3 = st.columns(3)
+                dob_in = c_b1.date_input("Date of Birth", value=None)
+                gender_in = c_b2.selectbox("Gender", ["Select...", "Male", "Female"], index=0)
+                occu_in = c_b3.text_input("Occupation")
+
+                # SECTION 2: CONTACT & LOCATION
+                st.caption("Contact & Location")
+                c_c1, c_c2 = st.columns(2)
+                phone_in = c_c1.text_input("Phone Number")
+                email_in = c_c2.text_input("Email Address")
+                res_in = st.text_input("Residential Area")
+
+                # SECTION 3: NEXT OF KIN
+                st.caption("Next of Kin")
+                c_d1, c_d2 = st.columns(2)
+                nok_name = c_d1.text_input("NOK Name")
+                nok_phone = c_d2.text_input("NOK Phone")
+
+                # SECTION 4: SYSTEM
+                st.caption("System")
+                sponsor_in = st.text_input("Sponsor Name (Introduced By)")
+                allow_dup = st.checkbox("Register even if the ID number or phone already belongs to a member")
+                
+                submitted = st.form_submit_button("Add Member", type="primary")
+                
+                if submitted:
+                    matches = find_identity_matches(phone_in, id_number=id_num_in) if name_in and id_num_in else None
+                    if matches is not None and not matches.empty and not allow_dup:
+                        st.error(f"{'; '.join(identity_match_messages(matches))}. Check the member below, "
+                                 "or tick the box above to register anyway.")
+                        st.dataframe(matches, hide_index=True, use_container_width=True)
+                    elif name_in and id_num_in:
+                         # Convert DOB to string
+                         dob_str = str(dob_in) if dob_in else ""
+                         g_val = gender_in if gender_in != "Select..." else ""
+                         
+                         try:
+                             success = add_member(
+                                 group_id=gid, 
+                                 name=name_in, 
+                                 phone=phone_in, 
+                                 id_num=id_num_in,
+                                 email=email_in, 
+                                 residence=res_in, 
+                                 sponsor=sponsor_in,
+                                 kra_pin=kra_pin_in,
+                                 dob=dob_str,
+                                 gender=g_val,
+                                 occupation=occu_in,
+                                 next_of_kin_name=nok_name,
+                                 next_of_kin_phone=nok_phone,
+                                 allow_duplicate=allow_dup
+                             )
+                         except DuplicateMemberError as e:
+                             # Registered by someone else since the check above
+                             st.error(f"{e}. Tick the box above to register anyway.")
+                             st.dataframe(e.matches, hide_index=True, use_container_width=True)
+                             success = None
+                         if success:
+                             st.success(f"Added {name_in} successfully! (Auto-Account Generated)")
+                             st.rerun()
+                         elif success is False:
+                             st.error("Failed to add member. Check if Name or Account Number already exists.")
+                    else:
+                        st.error("Name and ID Number are required.")
+                         
+            st.divider()
+            
+            st.subheader("Bulk Import Members")
+            with st.expander("📥 Import Membership List (CSV)", expanded=False):
+                st.caption(f"Required columns: {', '.join(MEMBER_IMPORT_REQUIRED)}. Optional: {', '.join(MEMBER_IMPORT_COLS[3:])}.")
+                st.download_button("Download CSV Template", data=",".join(MEMBER_IMPORT_COLS) + "\n",
+                                   file_name="member_import_template.csv", mime="text/csv", key="imp_template")
+                
+                imp_file = st.file_uploader("Membership CSV", type=['csv'], key="imp_file")
+                if imp_file:
+                    raw_df = pd.read_csv(imp_file, dtype=str, keep_default_na=False)
+                    clean_df, errors = validate_member_import(raw_df)
+                    
+                    if not errors.empty:
+                        st.error(f"❌ {len(errors)} problem(s) found. Fix the file and upload again - nothing was imported.")
+                        st.dataframe(errors, hide_index=True, use_container_width=True)
+                    else:
+                        st.success(f"✅ {len(clean_df)} member(s) passed validation.")
+                        st.dataframe(clean_df, hide_index=True, use_container_width=True)
+                        if st.button(f"Import {len(clean_df)} Members", type="primary", key="imp_confirm"):
+                            submit_job(bulk_import_members, gid, clean_df.copy(), progress=True,
+                                       label=f"Import {len(clean_df)} members",
+                                       done_text="Imported {result} members (Auto-Accounts Generated).")
+                            st.toast("📥 Import running in the background — progress is in the sidebar.")
+            
+            st.divider()
+            
+            st.subheader("Remove Member")
+            if full_members:
+                del_name = st.selectbox("Select Member to Remove", [m['Name'] for m in full_members], key="del_sel_mem")
+                del_id = next((m['ID'] for m in full_members if m['Name'] == del_name), None)
+                
+                if st.button("🗑️ Delete Selected Member", type="primary"):
+                    # Guardrail
+                    if check_if_guarantor(del_name):
+                         st.error(f"❌ Cannot delete {del_name}. They are listed as a guarantor for an active loan.")
+                    else:
+                         delete_member(del_id)
+                         st.success(f"✅ Removed {del_name} from the group.")
+                         st.rerun()
+            else:
+                st.info("No members to delete.")
+
+        # --- Tab 3: Unified Borrowing Portfolio ---
+        with tab3:
+            st.subheader("📂 Active Borrowing Portfolio")
+            
+            if st.session_state.get('portfolio_group_id') != gid:
+                load_portfolio_page(gid, reset=True)
+            loans_df = st.session_state.portfolio_loans
+            if not loans_df.empty:
+                # Format Data for Display
+                display_data = []
+                for _, row in loans_df.iterrows():
+                     # Determine Form Status
+                     has_img = row['Image'] is not None and len(str(row['Image'])) > 5
+                     display_data.append({
+                         'Date': row['Date'],
+                         'Borrower': row['Borrower'],
+                         'Loan Amount': row['Amount'] if row['Type'] == 'Loan' else 0,
+                         'Advance Amount': row['Amount'] if row['Type'] == 'Advance' else 0,
+                         'Outstanding': row['Outstanding'],
+                         'Guarantors': row['Guarantors'],
+                         'Form Status': "✅ Uploaded" if has_img else "⏳ Pending"
+                     })
+                     
+                st.dataframe(pd.DataFrame(display_data), use_container_width=True)
+                
+                if st.session_state.portfolio_cursor:
+                    st.button(f"⬇️ Load Older Loans (showing {len(loans_df)})", key="portfolio_load_older",
+                              on_click=load_portfolio_page, args=(gid,))
+                
+                st.divider()
+                st.markdown("#### 📎 Loan Documentation")
+                
+                # Select Loan to Upload Doc
+                loan_opts = {f"{r['Borrower']} - {r['Type']} {r['Date']} (Total: {r['Amount']}, Outstanding: {r['Outstanding']})": r['Loan ID'] for _, r in loans_df.iterrows()}
+                
+                sel_loan_lbl = st.selectbox("Select Loan", list(loan_opts.keys()))
+                sel_loan_id = loan_opts[sel_loan_lbl]
+                
+                # Get current image path
+                curr_img = loans_df.loc[loans_df['Loan ID'] == sel_loan_id, 'Image'].values[0]
+                
+                c_up, c_view = st.columns(2)
+                
+                with c_up:
+                    up_file = st.file_uploader("Upload Scanned Loan Form", type=['png', 'jpg', 'jpeg', 'pdf'])
+                    if up_file:
+                        if st.button("Save Document"):
+                            # The portfolio page reloads once the job is done (clear_keys)
+                            submit_job(save_loan_image, up_file, sel_loan_id, label=f"Loan document #{sel_loan_id}",
+                                       done_text="Document Saved!", clear_keys=['portfolio_group_id'])
+                            st.toast("📎 Saving the document in the background.")
+                            
+                with c_view:
+                    if curr_img and os.path.exists(curr_img):
+                        st.success("✅ Document on File")
+                        st.image(curr_img, caption="Loan Form")
+                    else:
+                        st.warning("⚠️ No Document Uploaded")
+            else:
+                st.info("No active loans or advances found for this group.")
+
+        # --- Tab 4: Group Trends ---
+        with tab4:
+            st.subheader("📈 Group Trends")
+            
+            trends = get_group_trends(gid, get_group_trends_stamp(gid))
+            if not trends.empty:
+                c_t1, c_t2 = st.columns(2)
+                with c_t1:
+                    st.markdown("**Savings Pool vs Loan Book**")
+                    st.line_chart(trends[['Savings Pool', 'Loan Book']])
+                    st.markdown("**Attendance Rate (%)**")
+                    st.line_chart(trends[['Attendance Rate (%)']])
+                with c_t2:
+                    st.markdown("**Interest Income**")
+                    st.bar_chart(trends[['Interest Income']])
+                    
+                with st.expander("View Monthly Figures"):
+                    table = trends.copy()
+                    table.index = table.index.strftime("%b %Y")
+                    st.dataframe(table, use_container_width=True)
+            else:
+                st.info("No finalized sessions yet for this group.")
+
+        # --- Tab 5: Ledger Export ---
+        with tab5:
+            st.subheader("📤 Export Master Ledger")
+            
+            sessions_by_year = get_finalized_sessions_by_year(gid)
+            if sessions_by_year:
+                c_scope, c_fmt = st.columns(2)
+                scope = c_scope.radio("Scope", ["Single Session", "Full Year", "Complete History"], key="exp_scope")
+                fmt = c_fmt.radio("Format", ["XLSX", "CSV"], horizontal=True, key="exp_fmt")
+                
+                exp_session_id, exp_year = None, None
+                if scope != "Complete History":
+                    exp_year = st.selectbox("Year", list(sessions_by_year.keys()), key="exp_year")
+                if scope == "Single Session":
+                    month_map = {m: sid for sid, m in sessions_by_year[exp_year]}
+                    exp_month = st.selectbox("Month", list(month_map.keys()), key="exp_month")
+                    exp_session_id = month_map[exp_month]
+                
+                scope_lbl = {"Single Session": f"{exp_month}_{exp_year}" if exp_session_id else "",
+                             "Full Year": str(exp_year), "Complete History": "all"}[scope]
+                file_name = f"{g_name}_ledger_{scope_lbl}.{fmt.lower()}".replace(" ", "_")
+                mime = "text/csv" if fmt == "CSV" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                # Built when clicked, in a temporary directory that is gone once the bytes are read
+                st.download_button("⬇️ Download Ledger", file_name=file_name, mime=mime, key="exp_download",
+                                   data=lambda: export_ledger(fmt.lower(), gid, session_id=exp_session_id, year=exp_year))
+            else:
+                st.info("No finalized sessions to export yet.")
+
+        # --- Tab 6: Historical Backfill ---
+        with tab6:
+            st.subheader("🗂️ Historical Backfill")
+            st.caption("Upload past months in the Master Ledger export layout (Month, Year, Account No / Member Name, BF / CF columns). "
+                       "Add a 'Bank Balance' column to carry each month's closing bank balance.")
+            
+            bf_file = st.file_uploader("Ledger History CSV", type=['csv'], key="bf_file")
+            if bf_file:
+                raw_df = pd.read_csv(bf_file, dtype=str) # Account numbers stay text even when a cell is blank
+                ledger, parse_errors = parse_backfill_file(raw_df, gid)
+                
+                if not parse_errors.empty:
+                    st.error(f"❌ {len(parse_errors)} row(s) could not be read and will be skipped.")
+                    st.dataframe(parse_errors, hide_index=True, use_container_width=True)
+                
+                if not ledger.empty:
+                    broken = validate_bf_cf_chain(ledger, gid)
+                    file_periods = sorted(ledger['Period'].unique())
+                    existing = get_finalized_periods(gid)
+                    archive_cutoff = get_archive_cutoff()
+                    archived = {p for p in file_periods if archive_cutoff is not None and p < archive_cutoff}
+                    bad_periods = set(ledger.loc[ledger['Period'].map(period_label).isin(broken['Period']), 'Period']) | (set(file_periods) & existing) | archived
+                    valid_periods = [p for p in file_periods if p not in bad_periods]
+                    
+                    summary = pd.DataFrame({
+                        'Period': [period_label(p) for p in file_periods],
+                        'Members': [int((ledger['Period'] == p).sum()) for p in file_periods],
+                        'Status': ["⛔ Already Finalized" if p in existing else "🗄️ Archived" if p in archived else
+                                   ("❌ Broken BF/CF Chain" if p in bad_periods else "✅ Valid")
+                                   for p in file_periods]
+                    })
+                    st.dataframe(summary, hide_index=True, use_container_width=True)
+                    
+                    if not broken.empty:
+                        st.warning(f"⚠️ {len(broken)} broken BF/CF link(s):")
+                        st.dataframe(broken.drop(columns=['Member ID']), hide_index=True, use_container_width=True)
+                    
+                    if valid_periods and st.button(f"💾 Write {len(valid_periods)} Valid Month(s)", type="primary", key="bf_write"):
+                        submit_job(backfill_sessions, gid, ledger.copy(), list(valid_periods), progress=True,
+                                   label=f"Backfill {len(valid_periods)} month(s)", done_text="Backfilled {result} month(s).")
+                        st.toast("💾 Backfill running in the background — progress is in the sidebar.")
+
+        # --- Tab 7: Balance Projection ---
+        with tab7:
+            st.subheader("🔮 Balance Projection")
+            
+            proj_period, balances = get_latest_balances(gid)
+            if proj_period is not None and not balances.empty:
+                st.caption(f"Starting from the closing balances of {period_label(proj_period)}. "
+                           "Interest follows the group's by-laws for each month (rounded to 5); "
+                           "Monthly Cash is what each member brings per meeting.")
+                
+                n_months = st.number_input("Months Ahead", min_value=1, max_value=PROJECTION_MAX_MONTHS, value=6, key="proj_months")
+                scenarios = st.data_editor(default_projection_scenarios(balances), num_rows="dynamic", hide_index=True,
+                                           use_container_width=True, key=f"proj_scenarios_{gid}")
+                scenarios = scenarios.dropna(subset=['Scenario']).drop_duplicates('Scenario')
+                
+                if not scenarios.empty:
+                    month_rules = rules_for_periods(get_group_rules(gid), range(proj_period + 1, proj_period + int(n_months) + 1))
+                    summary, final = project_balances(balances, scenarios, int(n_months), month_rules)
+                    summary['Period'] = [pd.Timestamp(year=(proj_period + m) // 12, month=(proj_period + m) % 12 + 1, day=1)
+                                         for m in summary['Month']]
+                    
+                    c_p1, c_p2 = st.columns(2)
+                    with c_p1:
+                        st.markdown("**Savings Pool**")
+                        st.line_chart(summary.pivot(index='Period', columns='Scenario', values='Savings Pool'))
+                    with c_p2:
+                        st.markdown("**Loan Book (Loans + Advances)**")
+                        st.line_chart(summary.assign(Book=summary['Loan Book'] + summary['Advance Book'])
+                                      .pivot(index='Period', columns='Scenario', values='Book'))
+                    
+                    end = summary[summary['Month'] == summary['Month'].max()].drop(columns=['Month', 'Period'])
+                    end['Interest Income'] = summary.groupby('Scenario', sort=False)['Interest Income'].sum().values
+                    st.markdown(f"**Position after {int(n_months)} month(s)**")
+                    st.dataframe(end, hide_index=True, use_container_width=True)
+                    
+                    with st.expander("Member Balances at End of Projection"):
+                        pick = st.selectbox("Scenario", scenarios['Scenario'].astype(str).tolist(), key="proj_member_scenario")
+                        st.dataframe(final[final['Scenario'] == pick].drop(columns=['Scenario']), hide_index=True, use_container_width=True)
+            else:
+                st.info("No finalized sessions yet for this group.")
+
+        # --- Tab 8: Group By-Laws (interest & fine rules) ---
+        with tab8:
+            st.subheader("📜 Interest & Fine Rules")
+            st.caption("Each row applies from its month until the next row. Months before the first row use the standard rules. "
+                       "Finalized months keep their figures until they are re-finalized.")
+            
+            rules_df = get_group_rules(gid)
+            history = pd.concat([pd.DataFrame([{'effective_period': None, **DEFAULT_RULES}]), rules_df], ignore_index=True)
+            st.dataframe(pd.DataFrame({
+                'Effective From': ["Standard"] + [period_label(p) for p in rules_df['effective_period']],
+                'Loan Interest %': (history['loan_rate'] * 100).round(2),
+                'Advance Interest %': (history['advance_rate'] * 100).round(2),
+                'Late Fine': history['fine_late'], 'Absent Fine': history['fine_absent'], 'Apology Fine': history['fine_apology'],
+            }), hide_index=True, use_container_width=True)
+            
+            current = rules_for_period(rules_df, get_period(datetime.now().strftime("%B"), datetime.now().year))
+            with st.form(f"rules_form_{gid}"):
+                c_m, c_y = st.columns(2)
+                r_month = c_m.selectbox("Effective Month", MONTHS, index=datetime.now().month - 1)
+                r_year = c_y.number_input("Effective Year", 2015, 2035, datetime.now().year)
+                c_r1, c_r2 = st.columns(2)
+                loan_pct = c_r1.number_input("Loan Interest (% per month)", 0.0, 100.0, current['loan_rate'] * 100, step=0.5)
+                adv_pct = c_r2.number_input("Advance Interest (% per month)", 0.0, 100.0, current['advance_rate'] * 100, step=0.5)
+                c_f1, c_f2, c_f3 = st.columns(3)
+                f_late = c_f1.number_input("Late Fine", 0, None, current['fine_late'], step=10)
+                f_absent = c_f2.number_input("Absent Fine", 0, None, current['fine_absent'], step=10)
+                f_apology = c_f3.number_input("Apology Fine", 0, None, current['fine_apology'], step=10)
+                
+                if st.form_submit_button("💾 Save Rules", type="primary"):
+                    save_group_rule(gid, get_period(r_month, r_year), {
+                        'loan_rate': loan_pct / 100, 'advance_rate': adv_pct / 100,
+                        'fine_late': int(f_late), 'fine_absent': int(f_absent), 'fine_apology': int(f_apology)})
+                    st.session_state.pop('audit_rules_key', None)
+                    st.success(f"Rules saved, effective from {r_month} {r_year}.")
+                    st.rerun()
+            
+            if not rules_df.empty:
+                c_d1, c_d2 = st.columns([3, 1])
+                del_period = c_d1.selectbox("Remove Rules From", rules_df['effective_period'].tolist(), format_func=period_label, key="rules_del")
+                if c_d2.button("🗑️ Remove", key="rules_del_btn"):
+                    delete_group_rule(gid, del_period)
+                    st.session_state.pop('audit_rules_key', None)
+                    st.rerun()
+            
+            st.divider()
+            st.subheader("📅 Meeting Schedule")
+            st.caption("Finalizing a month moves a passed meeting date on to the next one in the schedule "
+                       "(monthly keeps the day of the month of the date set here, or the month's last day when it is shorter).")
+            next_date, recurrence = get_meeting_schedule(gid)
+            with st.form(f"meeting_form_{gid}"):
+                c_md, c_mr = st.columns(2)
+                new_date = c_md.date_input("Next Meeting", datetime.strptime(next_date, "%Y-%m-%d").date() if next_date else None)
+                new_rec = c_mr.selectbox("Meets", MEETING_RECURRENCES, index=MEETING_RECURRENCES.index(recurrence),
+                                         format_func=str.capitalize)
+                if st.form_submit_button("💾 Save Schedule", type="primary"):
+                    set_meeting_schedule(gid, new_date, new_rec)
+                    st.session_state.pop('meeting_query', None)
+                    st.success("Meeting schedule saved.")
@@ -0,0 +1,187 @@
+"""Landing page: open an existing group or create a new one."""
+import streamlit as st
+from datetime import datetime, timedelta
+
+from ..config import DEFAULT_RECURRENCE, MEETING_RECURRENCES, MONTHS
+from ..engine import get_period, init_empty_dataframe, merge_carry_forward, period_label
+from ..archive import get_archive_cutoff
+from ..db import create_new_group, get_previous_bank_balance, get_previous_month_data, load_group_data
+from ..state import capture_audit_base, load_meetings_page
+
+# Meeting list windows: label -> (first, last) day counted from today, None = open-ended;
+# a window of None lists the groups that have no meeting date
+MEETING_WINDOWS = {
+    "Overdue + next 30 days": (None, 29), "Next 7 days": (0, 6), "Next 30 days": (0, 29), "Next 90 days": (0, 89),
+    "Overdue": (None, -1), "All scheduled": (None, None), "Not scheduled": None,
+}
+
+def meeting_label(group, today):
+    """Selectbox label: name, next meeting date (flagged once it has passed) and how meetings repeat."""
+    if not group['meeting_date']:
+        return f"{group['name']} (📅 not scheduled)"
+    flag = "⚠️ " if group['meeting_date'] < today else ""
+    return f"{group['name']} ({flag}📅 {group['meeting_date']}, {group['recurrence'] or DEFAULT_RECURRENCE})"
+
+def render_landing():
+    """Landing page: pick a group and start an audit, or create a group."""
+    # --- Top Bar ---
+    t1, t2, t3 = st.columns([6, 1.5, 1.5])
+    t1.title("🤝 Jirani")
+
+    if t2.button("📊 Global Stats"):
+        st.session_state.viewing_global_stats = True
+        st.rerun()
+
+    if t3.button("⚙️ Admin Panel"):
+        st.session_state.viewing_admin = True
+        st.rerun()
+
+    st.divider()
+
+    # --- Main Section (2 Cols) ---
+    col_select, col_create = st.columns([1, 1], gap="large")
+
+    # --- LEFT: Select Existing Group ---
+    with col_select:
+        st.subheader("📂 Select Existing Group")
+
+        # Upcoming meetings drive the list: pick a date window, then page through it soonest first
+        w1, w2 = st.columns([3, 1], vertical_alignment="bottom")
+        window = w1.selectbox("Meetings", list(MEETING_WINDOWS), key="meeting_window")
+        today = datetime.now().date()
+        days = MEETING_WINDOWS[window]
+        if days is None:
+            query = (None, None, True)
+        else:
+            query = tuple(None if d is None else str(today + timedelta(days=d)) for d in days) + (False,)
+        w2.button("🔄 Refresh", key="meetings_refresh", use_container_width=True, on_click=load_meetings_page, args=(query, True))
+        if st.session_state.get('meeting_query') != query:
+            load_meetings_page(query, reset=True)
+        meetings = st.session_state.meeting_rows
+
+        if not meetings:
+            st.info("No group meets in this window." if days is not None else "Every group has a meeting date.")
+        else:
+            options_map = {g['id']: meeting_label(g, str(today)) for g in meetings}
+
+            c1, c2 = st.columns([3, 1], vertical_alignment="bottom")
+
+            # Selectbox in C1
+            with c1:
+                selected_id = st.selectbox("Choose a Group to Audit:", list(options_map), format_func=options_map.get)
+
+            # Button in C2 - "Open Selected Group"
+            with c2:
+                if st.button("📂 Open", type="primary", use_container_width=True):
+                    g_name, members = load_group_data(selected_id)
+                    st.session_state.group_name = g_name
+                    st.session_state.group_id = selected_id
+                    st.session_state.info_msg = f"✅ Loaded: {g_name}"
+
+                    st.session_state.temp_group_id = selected_id
+                    st.rerun()
+
+            if st.session_state.meeting_cursor:
+                st.button(f"⬇️ Load More Groups (showing {len(meetings)})", key="meetings_load_more",
+                          on_click=load_meetings_page, args=(query,))
+
+        # --- NESTED SETUP BLOCK (Inside Left Column) ---
+        if 'temp_group_id' in st.session_state:
+             # Load name
+             g_name, _ = load_group_data(st.session_state.temp_group_id)
+
+             st.divider()
+             st.markdown(f"**🎯 Setup: {g_name}**")
+
+             with st.form("audit_context_form"):
+                c1, c2 = st.columns(2)
+                sel_month = c1.selectbox("Month", MONTHS)
+                sel_year = c2.number_input("Year", 2020, 2030, 2025)
+
+                start_btn = st.form_submit_button("🚀 Start Audit", type="primary", use_container_width=True)
+
+                archive_cutoff = get_archive_cutoff()
+                if start_btn and archive_cutoff is not None and get_period(sel_month, sel_year) < archive_cutoff:
+                    st.error(f"🗄️ {sel_month} {sel_year} is archived and closed for editing "
+                             f"(months before {period_label(archive_cutoff)}).")
+                elif start_btn:
+                    # Finalize Setup
+                    st.session_state.group_name = g_name
+                    st.session_state.group_id = st.session_state.temp_group_id
+                    st.session_state.audit_month = sel_month
+                    st.session_state.audit_year = sel_year
+
+                    # Check for Previous Data (Carry Forward)
+                    prev_data_df = get_previous_month_data(st.session_state.group_id, sel_month, sel_year)
+
+                    # Load Bank Balance BF
+                    st.session_state.bank_balance_bf = get_previous_bank_balance(st.session_state.group_id, sel_month, sel_year)
+
+                    # Load members fresh
+                    _, members_tuples = load_group_data(st.session_state.group_id)
+                    # members_tuples is (id, name)
+
+                    empty_df = init_empty_dataframe(members_tuples)
+
+                    if prev_data_df is not None and not prev_data_df.empty:
+                        st.session_state.audit_df = merge_carry_forward(empty_df, prev_data_df)
+                        st.session_state.info_msg += f" 🔄 Carried forward data from previous month."
+                    else:
+                        st.session_state.audit_df = empty_df
+                        st.session_state.info_msg += " (Fresh start / No previous history)."
+
+                    capture_audit_base()
+
+                    # Default to Attendance Check Mode
+                    st.session_state.audit_stage = "attendance_check"
+
+                    st.session_state.setup_complete = True
+                    del st.session_state.temp_group_id
+                    st.rerun()
+
+    # --- RIGHT: Create New Group ---
+    with col_create:
+        container = st.container(border=True)
+        with container:
+            st.subheader("➕ Create New Group")
+            new_name = st.text_input("New Group Name", placeholder="e.g. Sunrise Chama")
+            m1, m2 = st.columns(2)
+            first_meeting = m1.date_input("First Meeting Date")
+            recurrence = m2.selectbox("Meets", MEETING_RECURRENCES, index=MEETING_RECURRENCES.index(DEFAULT_RECURRENCE),
+                                      format_func=str.capitalize)
+            new_members_txt = st.text_area("Initial Members (comma separated)", placeholder="Alice, Bob, Charlie")
+
+            if st.button("Create New Group", type="secondary", use_container_width=True):
+                if new_name and new_members_txt:
+                    m_list = [x.strip() for x in new_members_txt.split(",") if x.strip()]
+                    gid = create_new_group(new_name, m_list, first_meeting, recurrence)
+                    if gid:
+                        st.success(f"Group '{new_name}' created!")
+
+                        # Auto-Start Audit Workflow
+                        st.session_state.group_id = gid
+                        st.session_state.group_name = new_name
+                        st.session_state.setup_complete = True
+                        st.session_state.started_audit = True
+
+                        # Time Context
+                        st.session_state.audit_month = datetime.now().strftime("%B")
+                        st.session_state.audit_year = datetime.now().year
+
+                        # Initialize Data
+                        _, mems = load_group_data(gid)
+                        st.session_state.audit_df = init_empty_dataframe(mems)
+                        capture_audit_base()
+
+                        # Set Stage to Collection/Attendance
+                        st.session_state.audit_stage = "collection"
+
+                        st.rerun() 
+                    else:
+                        st.error("Group name already exists.")
+                else:
+                    st.error("Please fill Name and Members.")
+
+
+    # Stop rendering the rest until setup is done
+    st.stop()
@@ -0,0 +1,79 @@
+"""Member profile page (opened from the audit screen)."""
+import streamlit as st
+import os
+
+from ..db import get_member_details, store_member_photo, update_member_details
+from ..state import submit_job
+
+def render_member_profile():
+    """Editable profile of the member currently shown in the audit."""
+    idx = st.session_state.current_member_index
+    df = st.session_state.audit_df
+    name = df.at[idx, 'Member Name']
+    mid = int(df.at[idx, 'Member ID'])
+
+    # Load current details from DB
+    details = get_member_details(mid)
+
+    col_back, col_title = st.columns([1, 5])
+    col_back.button("⬅️ Back to Audit", on_click=lambda: st.session_state.update(viewing_profile=False))
+    col_title.title(f"User Profile: {name}")
+
+    st.divider()
+
+    c_left, c_right = st.columns([1, 2], gap="large")
+
+    with c_left:
+        # Photo Logic
+        curr_photo = details.get('photo_path')
+        if curr_photo and os.path.exists(curr_photo):
+            st.image(curr_photo, width=200, caption=name)
+        else:
+            st.image("https://www.w3schools.com/howto/img_avatar.png", width=200, caption="No Photo")
+
+        st.subheader("Update Photo")
+        uploaded = st.file_uploader("Upload new photo", type=['png', 'jpg', 'jpeg'])
+
+    with c_right:
+        st.subheader("Personal Details")
+
+        # Version the form was opened at (kept across reruns until a save or reload)
+        version_key = f"profile_version_{mid}"
+        base_version = st.session_state.setdefault(version_key, details.get('version') or 0)
+
+        with st.form("profile_form"):
+            # Provide current values as defaults
+            d_phone = details.get('phone') or ""
+            d_id = details.get('id_number') or ""
+            d_kin = details.get('next_of_kin') or ""
+            acc_num = details.get('account_number')
+
+            # If account number is missing (legacy data), generate one
+            if not acc_num:
+                 acc_num = "N/A (Legacy)"
+
+            st.metric("Account Number", f"{acc_num}")
+
+            new_phone = st.text_input("Phone Number", value=d_phone)
+            new_id = st.text_input("ID Number", value=d_id)
+            new_kin = st.text_input("Next of Kin", value=d_kin)
+
+            st.write(f"**Member ID (System):** {mid}")
+            st.write(f"**Joined:** {details.get('joined_date')}")
+
+            submitted = st.form_submit_button("Save Changes", type="primary")
+
+            if submitted:
+                if update_member_details(mid, new_phone, new_id, new_kin, expected_version=base_version):
+                    # The photo is written off the script thread and linked once it's on disk
+                    if uploaded:
+                        submit_job(store_member_photo, uploaded, mid, label=f"Photo: {name}", done_text="Photo saved.")
+                    st.session_state.pop(version_key, None)
+                    st.success("Profile Updated Successfully!")
+                    st.rerun()
+                else:
+                    st.error("⚠️ Someone else updated this profile while you were editing. Reload to see their changes.")
+
+        if st.button("🔄 Reload Profile", key="profile_reload"):
+            st.session_state.pop(version_key, None)
+            st.rerun()
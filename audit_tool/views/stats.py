@@ -0,0 +1,60 @@
+"""Global statistics page."""
+import streamlit as st
+import sqlite3
+
+from ..config import DB_FILE, PORTFOLIO_PAGE_SIZE
+from ..archive import read_history
+from ..db import PORTFOLIO_SORTS, get_portfolio_overview
+
+# --- SETUP / LANDING ---
+def view_global_stats():
+    st.markdown("## 📊 Global Ecosystem Statistics")
+    
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    
+    # 1. Total Groups
+    c.execute("SELECT COUNT(*) FROM groups")
+    total_groups = c.fetchone()[0]
+    
+    conn.close()
+    
+    # 2. Financials (live database + every archive year)
+    totals = read_history("SELECT SUM(cash_today) AS cash, SUM(loan_principal) AS loans FROM history_transactions")
+    total_cash = int(totals['cash'].sum())
+    total_loans = int(totals['loans'].sum())
+    
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Total Groups", total_groups)
+    c2.metric("Total Liquidity (Cash In)", f"{total_cash:,}")
+    c3.metric("Total Loans Issued", f"{total_loans:,}")
+    
+    # 3. Portfolio by group (latest finalized session of each group)
+    st.divider()
+    st.subheader("🏦 Portfolio by Group")
+    c_s1, c_s2, c_s3 = st.columns([2, 1, 1])
+    sort_by = c_s1.selectbox("Sort By", list(PORTFOLIO_SORTS), key="portfolio_sort")
+    descending = c_s2.toggle("Descending", value=sort_by != 'Group', key=f"portfolio_desc_{sort_by}")
+    page = st.session_state.get('portfolio_page', 1)
+    df, totals = get_portfolio_overview(sort_by, descending, page - 1)
+    pages = max(1, -(-totals['groups'] // PORTFOLIO_PAGE_SIZE))
+    c_s3.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="portfolio_page")
+    
+    c_t1, c_t2, c_t3 = st.columns(3)
+    c_t1.metric("Savings Pool (All Groups)", f"{totals['savings']:,}")
+    c_t2.metric("Outstanding Loans", f"{totals['outstanding']:,}")
+    c_t3.metric("Cash at Bank", f"{totals['bank']:,}")
+    st.dataframe(df.drop(columns=['Group ID']), hide_index=True, use_container_width=True, column_config={
+        'Members': st.column_config.NumberColumn(format="%d"),
+        'Savings Pool': st.column_config.NumberColumn(format="localized"),
+        'Outstanding Loans': st.column_config.NumberColumn(format="localized"),
+        'Bank Balance': st.column_config.NumberColumn(format="localized"),
+        'Attendance %': st.column_config.ProgressColumn(min_value=0, max_value=100, format="%.0f%%"),
+    })
+    st.caption(f"Figures are each group's latest finalized month. Groups {(page - 1) * PORTFOLIO_PAGE_SIZE + 1}-"
+               f"{(page - 1) * PORTFOLIO_PAGE_SIZE + len(df)} of {totals['groups']}.")
+    
+    st.divider()
+    if st.button("⬅️ Back to Home"):
+        st.session_state.viewing_global_stats = False
+        st.rerun()
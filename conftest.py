@@ -0,0 +1,72 @@
+"""
+Shared pytest fixtures. Tests run in temporary directories - one per module, and a fresh one for each
+test that asks for `group` - since the database, archive and backup paths in audit_tool.config are
+relative: nothing touches the audit_data.db in the repo.
+"""
+import os
+
+import pytest
+
+from audit_tool import db
+from audit_tool.engine import apply_waterfall, init_empty_dataframe, merge_carry_forward
+
+
+@pytest.fixture(autouse=True, scope="module")
+def module_workdir(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("work"))
+    yield
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def group(tmp_path, monkeypatch):
+    """A fresh database with one group of three members. Returns (group_id, [(member_id, name), ...])."""
+    monkeypatch.chdir(tmp_path)
+    db.init_db()
+    gid = db.create_new_group("Test Group", ["Alice", "Bob", "Carol"], "2026-01-15")
+    _, members = db.load_group_data(gid)
+    return gid, members
+
+
+@pytest.fixture
+def audit_month(group):
+    """
+    Builds a month's ledger the way the audit screens do: carry forward, collection (waterfall),
+    then allocation. cash / repay: {row: amount} or one amount for everyone; new_loans: {row: amount}.
+    Returns: (ledger, bank closing).
+    """
+    gid, members = group
+
+    def build(month, year, cash=100, repay=0, new_loans=None):
+        df = init_empty_dataframe(members)
+        prev = db.get_previous_month_data(gid, month, year)
+        if prev is not None and not prev.empty:
+            df = merge_carry_forward(df, prev)
+        for col, values in (('Total Cash Today', cash), ('Loan Principal', repay)):
+            if isinstance(values, dict):
+                for idx, amount in values.items():
+                    df.loc[idx, col] = amount
+            else:
+                df[col] = values
+        df = apply_waterfall(df)
+        for idx, amount in (new_loans or {}).items():
+            df.loc[idx, 'New Loan'] = amount
+        cash_in = int(df['Total Cash Today'].astype(int).sum())
+        money_out = int(df['New Loan'].astype(int).sum())
+        bank = int(max(db.get_previous_bank_balance(gid, month, year) + cash_in - money_out, 0))
+        return df, bank
+
+    return build
+
+
+@pytest.fixture
+def finalize(group, audit_month):
+    """Audits and finalizes a month (see audit_month). Returns save_session's result."""
+    gid, _ = group
+
+    def run(month, year, **kwargs):
+        df, bank = audit_month(month, year, **kwargs)
+        return db.save_session(gid, month, year, df, bank)
+
+    return run
@@ -0,0 +1,74 @@
+"""
+Cold-start measurement for the Streamlit app.
+
+Each run starts a fresh interpreter and reports:
+  * import_ms        - importing audit_tool.state (what main.py imports before the first page)
+  * first_render_ms  - first full run of main.py (AppTest), including the one-time bootstrap
+  * rerun_ms         - a second run in the same process (what every interaction costs)
+  * fpdf_loaded      - whether FPDF was imported by the landing page (it should not be)
+
+Runs against the database in the current directory, like the app itself.
+
+Usage:
+    python startup_profile.py [--runs 5] [--json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = r'''
+import json, sys, time
+t = time.perf_counter()
+import audit_tool.state
+import_ms = (time.perf_counter() - t) * 1000
+
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("main.py", default_timeout=120)
+t = time.perf_counter()
+at.run()
+first_render_ms = (time.perf_counter() - t) * 1000
+t = time.perf_counter()
+at.run()
+rerun_ms = (time.perf_counter() - t) * 1000
+
+print(json.dumps({"import_ms": import_ms, "first_render_ms": first_render_ms, "rerun_ms": rerun_ms,
+                  "fpdf_loaded": "fpdf" in sys.modules, "errors": [str(e) for e in at.exception]}))
+'''
+
+METRICS = ["import_ms", "first_render_ms", "rerun_ms"]
+
+
+def measure_once():
+    """One cold start in a new interpreter. Returns the probe's dict."""
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def profile_startup(runs=5):
+    """Median of each timing over `runs` cold starts."""
+    samples = [measure_once() for _ in range(runs)]
+    result = {m: round(statistics.median(s[m] for s in samples), 1) for m in METRICS}
+    result["fpdf_loaded"] = any(s["fpdf_loaded"] for s in samples)
+    result["errors"] = sorted({e for s in samples for e in s["errors"]})
+    result["runs"] = runs
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import and first-render time of the app.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print one JSON line (for tracking over time)")
+    args = parser.parse_args()
+
+    result = profile_startup(args.runs)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"Cold start (median of {args.runs}):")
+        for m in METRICS:
+            print(f"  {m:<16} {result[m]:>8.1f} ms")
+        print(f"  {'fpdf_loaded':<16} {result['fpdf_loaded']}")
+        for e in result["errors"]:
+            print(f"❌ {e}")
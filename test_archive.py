@@ -0,0 +1,34 @@
+"""Archive tier: sessions moved to per-year files stay visible to history paging and the loans ledger."""
+from audit_tool import archive, db
+
+
+def test_open_loan_still_listed_after_its_session_is_archived(group, finalize):
+    gid, _ = group
+    finalize("January", 2023, new_loans={0: 1000})
+    finalize("February", 2023)
+    finalize("September", 2026)
+
+    assert archive.archive_sessions() == {2023: 2}
+
+    loans, cursor = db.get_active_loans(gid)
+    assert cursor is None
+    assert loans[['Borrower', 'Date', 'Type', 'Outstanding']].to_dict('records') == [
+        {'Borrower': 'Alice', 'Date': 'January 2023', 'Type': 'Loan', 'Outstanding': 1000}]
+
+
+def test_history_pages_through_more_years_than_can_be_attached(group, finalize, monkeypatch):
+    gid, _ = group
+    months = [("December", year) for year in range(2015, 2022)] + [("March", 2026), ("April", 2026)]
+    for month, year in months:
+        finalize(month, year)
+    archive.archive_sessions()
+    monkeypatch.setattr(db, "ARCHIVE_ATTACH_LIMIT", 2)
+    monkeypatch.setattr(archive, "ARCHIVE_ATTACH_LIMIT", 2)
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = db.get_audit_history(gid, before=cursor, limit=3)
+        seen += [(r[1], r[2]) for r in rows]
+        if cursor is None:
+            break
+    assert seen == months[::-1]
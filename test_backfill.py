@@ -0,0 +1,60 @@
+"""Historical backfill: BF/CF links are checked before writing, and months already saved are re-chained after."""
+import sqlite3
+
+import pandas as pd
+
+from audit_tool import db
+from audit_tool.config import DB_FILE
+
+
+def history_file(months, opening=0):
+    """A backfill upload (as read from CSV: all text) where everyone saves `cash` a month on top of `opening`: {month: cash}."""
+    rows, savings = [], {}
+    for month, cash in months.items():
+        for name in ("Alice", "Bob", "Carol"):
+            bf = savings.get(name, opening)
+            savings[name] = bf + cash
+            rows.append({'Month': month, 'Year': '2026', 'Member Name': name, 'Total Cash Today': str(cash),
+                         'Savings BF': str(bf), 'Savings Today': str(cash), 'Savings CF': str(bf + cash)})
+    return pd.DataFrame(rows)
+
+
+def savings(month):
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute("SELECT t.savings_bf, t.savings_cf FROM transactions t JOIN audit_sessions s ON s.id = t.session_id "
+                        "WHERE s.month = ? AND s.year = 2026 ORDER BY t.member_id", (month,)).fetchall()
+    conn.close()
+    return rows
+
+
+def test_chain_check_reports_each_broken_link(group, finalize):
+    gid, _ = group
+    finalize("December", 2025, cash=40)
+    raw = history_file({'January': 100, 'February': 100}, opening=40)
+    raw.loc[4, 'Savings BF'] = '90'  # Bob's February should open at January's 140
+    raw.loc[0, 'Savings BF'] = '5'   # Alice's January should open at December's 40 (from the database)
+
+    ledger, errors = db.parse_backfill_file(raw, gid)
+    broken = db.validate_bf_cf_chain(ledger, gid)
+
+    assert errors.empty
+    assert broken[['Member', 'Period', 'Field', 'Expected (Prev CF)', 'Found']].values.tolist() == [
+        ['Alice', 'January 2026', 'Savings BF', 40, 5],
+        ['Bob', 'February 2026', 'Savings BF', 140, 90],
+    ]
+
+
+def test_backfill_rechains_months_already_saved(group, finalize):
+    gid, _ = group
+    finalize("February", 2026, cash=30)
+    finalize("April", 2026, cash=30)
+    raw = history_file({'January': 100, 'February': 0, 'March': 50})
+    ledger, errors = db.parse_backfill_file(raw, gid)
+    ledger = ledger[ledger['Month'] != 'February']  # February stays as saved in the database
+
+    assert db.backfill_sessions(gid, ledger, sorted(set(ledger['Period']))) == 2
+
+    assert savings("January") == [(0, 100)] * 3
+    assert savings("February") == [(100, 130)] * 3
+    assert savings("March") == [(130, 180)] * 3
+    assert savings("April") == [(180, 210)] * 3
@@ -0,0 +1,33 @@
+"""Backups: a restore brings back the snapshot's data but keeps this device's sync state."""
+import os
+import sqlite3
+
+from audit_tool.backup import backup_database, restore_backup
+from audit_tool.config import DB_FILE
+from audit_tool.sync import export_sync_bundle, get_sync_status
+
+
+def query(sql):
+    conn = sqlite3.connect(DB_FILE)
+    result = conn.execute(sql).fetchall()
+    conn.close()
+    return result
+
+
+def test_restore_keeps_device_id_watermark_and_change_log(finalize):
+    finalize("January", 2026)
+    snapshot = os.path.basename(backup_database(label="manual"))
+    finalize("February", 2026)
+    export_sync_bundle()
+    device, watermark, pending = get_sync_status()
+    log = query("SELECT * FROM change_log ORDER BY seq")
+
+    restore_backup(snapshot)
+
+    assert query("SELECT month FROM audit_sessions") == [("January",)]
+    assert get_sync_status() == (device, watermark, pending)
+    assert query("SELECT * FROM change_log ORDER BY seq") == log
+    # New changes continue the log instead of reusing sequence numbers other devices have seen
+    finalize("February", 2026)
+    new = query("SELECT seq FROM change_log ORDER BY seq")[len(log):]
+    assert new and new[0][0] == log[-1][0] + 1
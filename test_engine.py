@@ -0,0 +1,45 @@
+"""Pure helpers in audit_tool.engine (no database)."""
+import pandas as pd
+import pytest
+
+from audit_tool.engine import apply_waterfall, compact_ledger, init_empty_dataframe, next_meeting_after, set_ledger_value
+
+MEMBERS = [(1, "Alice"), (2, "Bob"), (3, "Carol")]
+
+
+def test_compact_ledger_keeps_values_and_accepts_edits():
+    df = init_empty_dataframe(MEMBERS)
+    df['Total Cash Today'] = [100, 200, 300]
+    df = apply_waterfall(df).astype(object)
+
+    compact = compact_ledger(df)
+    assert compact.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+    assert compact['Savings CF'].dtype == 'int64'
+    assert isinstance(compact['Attendance'].dtype, pd.CategoricalDtype)
+    text = ['Guarantors', 'Loan Image']
+    pd.testing.assert_frame_equal(compact.drop(columns=text).astype(object), df.drop(columns=text), check_dtype=False)
+    pd.testing.assert_frame_equal(compact[text], df[text])
+
+    set_ledger_value(compact, 0, 'Attendance', 'Late')
+    set_ledger_value(compact, 1, 'Attendance', 'Sick')  # not a category: the column widens back
+    set_ledger_value(compact, 2, 'Fines', 12.5)
+    set_ledger_value(compact, 2, 'Total Cash Today', 250)
+    assert compact['Attendance'].tolist() == ['Late', 'Sick', 'Present']
+    assert compact['Fines'].tolist() == [0, 0, 12.5]
+    assert compact['Total Cash Today'].dtype == 'int64'
+    assert compact.at[2, 'Total Cash Today'] == 250
+
+
+@pytest.mark.parametrize("meeting, recurrence, today, day, expected", [
+    ("2026-03-10", "monthly", "2026-02-01", None, "2026-03-10"),  # still ahead
+    ("2026-01-15", "monthly", "2026-01-15", None, "2026-02-15"),  # held today
+    ("2026-01-15", "monthly", "2026-05-20", None, "2026-06-15"),  # missed meetings are skipped
+    ("2026-01-31", "monthly", "2026-02-10", None, "2026-02-28"),  # clamped to a short month...
+    ("2026-02-28", "monthly", "2026-03-01", 31, "2026-03-31"),    # ...and back on the 31st after it
+    ("2026-03-31", "monthly", "2026-04-30", 31, "2026-05-31"),
+    ("2025-12-31", "monthly", "2026-02-28", 31, "2026-03-31"),    # across a year end
+    ("2026-01-05", "weekly", "2026-01-20", None, "2026-01-26"),
+    ("2026-01-05", "fortnightly", "2026-01-20", None, "2026-02-02"),
+])
+def test_next_meeting_after(meeting, recurrence, today, day, expected):
+    assert next_meeting_after(meeting, recurrence, today, day) == expected
@@ -0,0 +1,75 @@
+"""Finalized months: the BF/CF chain from month to month, and the ledger export."""
+import sqlite3
+import tempfile
+
+from audit_tool import db
+from audit_tool.config import DB_FILE
+from audit_tool.engine import get_period
+
+
+def snapshot(month, year):
+    """The month's session row and transaction rows, every column."""
+    conn = sqlite3.connect(DB_FILE)
+    session = conn.execute("SELECT * FROM audit_sessions WHERE month = ? AND year = ?", (month, year)).fetchone()
+    txns = conn.execute("SELECT * FROM transactions WHERE session_id = ? ORDER BY member_id", (session[0],)).fetchall()
+    conn.close()
+    return session, txns
+
+
+def balances(month, year, cols="savings_bf, savings_cf, loan_bf, loan_cf"):
+    """Per member (in member order): the named transaction columns, plus the month's bank closing."""
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute(f"SELECT {cols} FROM transactions t JOIN audit_sessions s ON s.id = t.session_id "
+                        "WHERE s.month = ? AND s.year = ? ORDER BY t.member_id", (month, year)).fetchall()
+    bank = conn.execute("SELECT bank_balance_closing FROM audit_sessions WHERE month = ? AND year = ?",
+                        (month, year)).fetchone()[0]
+    conn.close()
+    return rows, bank
+
+
+def test_refinalize_without_changes_leaves_later_months_identical(finalize):
+    # New loans are entered after the waterfall ran, as on the allocation screen
+    finalize("January", 2026, new_loans={0: 1000})
+    finalize("February", 2026, repay={0: 100}, new_loans={1: 500})
+    finalize("March", 2026, repay={0: 100, 1: 50})
+    later = [snapshot("February", 2026), snapshot("March", 2026)]
+
+    _, moved, _, _ = finalize("January", 2026, new_loans={0: 1000})
+
+    assert moved == []
+    assert [snapshot("February", 2026), snapshot("March", 2026)] == later
+    assert [r[2:] for r in balances("February", 2026)[0]] == [(1000, 900), (0, 500), (0, 0)]
+
+
+def test_refinalize_replays_later_months(finalize):
+    finalize("January", 2026)
+    finalize("February", 2026)
+    finalize("March", 2026)
+    finalize("May", 2026)
+
+    _, moved, _, _ = finalize("January", 2026, cash=150)
+
+    # Carry-forward stops at the gap in April; May's bank closing still follows the new January
+    assert moved == [get_period("February", 2026), get_period("March", 2026), get_period("May", 2026)]
+    feb, feb_bank = balances("February", 2026)
+    mar, mar_bank = balances("March", 2026)
+    assert feb == [(150, 250, 0, 0)] * 3
+    assert mar == [(250, 350, 0, 0)] * 3
+    assert (feb_bank, mar_bank, balances("May", 2026)[1]) == (750, 1050, 1350)
+    assert balances("May", 2026)[0] == [(0, 100, 0, 0)] * 3
+
+
+def test_export_ledger_leaves_no_temporary_files(group, finalize, tmp_path, monkeypatch):
+    gid, _ = group
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(scratch))
+    finalize("January", 2026)
+
+    csv_lines = db.export_ledger("csv", gid).decode("utf-8").splitlines()
+    xlsx = db.export_ledger("xlsx", gid)
+
+    assert csv_lines[0].split(",")[:2] == [label for label, _ in db.LEDGER_EXPORT_COLS][:2]
+    assert len(csv_lines) == 1 + 3
+    assert xlsx[:2] == b"PK"
+    assert list(scratch.iterdir()) == []
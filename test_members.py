@@ -0,0 +1,39 @@
+"""Member registration: duplicate IDs and phones are caught however they are typed."""
+import sqlite3
+
+import pytest
+
+from audit_tool import db
+from audit_tool.config import DB_FILE
+from audit_tool.engine import DuplicateMemberError, identity_keys
+
+PHONES = ['+254 712-345 678', '(0712) 345.678', '254', '2547', '12 34', 'tel 0712345679', '', None]
+ID_NUMBERS = ['ab-12 345', 'a/b.c d-e', 'é12345x', '  1234 ', '1234.5', '', None]
+
+
+def test_identity_keys_match_the_sql_normalization(group):
+    gid, _ = group
+    expected = {}
+    for i, (phone, id_num) in enumerate(zip(PHONES, ID_NUMBERS + [None])):
+        db.add_member(gid, f"Member {i}", phone, id_num, allow_duplicate=True)
+        expected[f"Member {i}"] = identity_keys(phone, id_number=id_num)
+
+    conn = sqlite3.connect(DB_FILE)
+    stored = {}
+    for name, kind, value in conn.execute("SELECT m.name, i.kind, i.value FROM member_identity i "
+                                          "JOIN members m ON m.id = i.member_id WHERE m.name LIKE 'Member %'"):
+        stored.setdefault(name, set()).add((kind, value))
+    conn.close()
+    assert {name: keys for name, keys in expected.items() if keys} == stored
+
+
+def test_add_member_names_who_already_has_the_phone(group):
+    gid, _ = group
+    assert db.add_member(gid, "Dan", "+254 712 345 678", "12345678") is True
+
+    with pytest.raises(DuplicateMemberError) as e:
+        db.add_member(gid, "Daniel", "0712-345678", "87654321")
+    assert str(e.value) == "Phone already registered to Dan (Test Group)"
+    assert e.value.matches['Name'].tolist() == ["Dan"]
+
+    assert db.add_member(gid, "Daniel", "0712-345678", "87654321", allow_duplicate=True) is True
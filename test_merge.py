@@ -0,0 +1,53 @@
+"""Two auditors saving the same month: member-level three-way merge, conflicts refused."""
+import pytest
+
+from audit_tool import db
+from audit_tool.engine import AuditConflictError, compact_merge_base, merge_member_edits
+
+
+def test_merge_takes_their_members_and_reports_overlaps(audit_month):
+    base, _ = audit_month("January", 2026)
+    mine, _ = audit_month("January", 2026, cash={0: 150, 1: 100, 2: 120})
+    theirs, _ = audit_month("January", 2026, cash={0: 100, 1: 200, 2: 130})
+
+    merged, taken, conflicts = merge_member_edits(compact_merge_base(base), mine, theirs)
+
+    _, bob, carol = mine['Member ID']
+    assert (taken, conflicts) == ([bob], [carol])
+    assert merged['Total Cash Today'].tolist() == [150, 200, 120]
+    assert merged.at[1, 'Savings CF'] == theirs.at[1, 'Savings CF']
+
+
+def test_same_edit_on_both_sides_is_not_a_conflict(audit_month):
+    base, _ = audit_month("January", 2026)
+    both, _ = audit_month("January", 2026, cash={0: 100, 1: 100, 2: 175})
+
+    merged, taken, conflicts = merge_member_edits(base, both, both.copy())
+
+    assert (taken, conflicts) == ([], [])
+    assert merged['Total Cash Today'].tolist() == [100, 100, 175]
+
+
+def test_save_session_merges_or_refuses_another_auditors_save(group, audit_month, finalize):
+    gid, _ = group
+    finalize("January", 2026)
+    opened = {'version': db.get_session_version(gid, "January", 2026),
+              'df': compact_merge_base(audit_month("January", 2026)[0])}
+
+    # Someone else saves Bob's cash first; my save of Alice's merges it in and re-derives the bank closing
+    finalize("January", 2026, cash={0: 100, 1: 200, 2: 100})
+    mine, _ = audit_month("January", 2026, cash={0: 150, 1: 100, 2: 100})
+    _, _, merged, bank = db.save_session(gid, "January", 2026, mine, 0, base=opened)
+    assert merged['Total Cash Today'].tolist() == [150, 200, 100]
+    assert bank == 450
+
+    # They change Carol again; my stale edit of Carol is refused and nothing is written
+    version = db.get_session_version(gid, "January", 2026)
+    finalize("January", 2026, cash={0: 150, 1: 200, 2: 300})
+    stale = {'version': version, 'df': compact_merge_base(merged)}
+    mine = merged.copy()
+    mine.loc[2, 'Total Cash Today'] = 50
+    with pytest.raises(AuditConflictError) as e:
+        db.save_session(gid, "January", 2026, mine, 0, base=stale)
+    assert e.value.conflicts == [mine.at[2, 'Member ID']]
+    assert db.get_session_version(gid, "January", 2026) == version + 1
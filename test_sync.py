@@ -0,0 +1,75 @@
+"""Device sync: re-finalized months keep their uids, and bundles import idempotently and in month order."""
+import shutil
+import sqlite3
+
+from audit_tool import db
+from audit_tool.config import DB_FILE
+from audit_tool.sync import export_sync_bundle, import_sync_bundle, reset_device_id
+
+
+def rows(sql, params=(), db_path=DB_FILE):
+    conn = sqlite3.connect(db_path)
+    result = conn.execute(sql, params).fetchall()
+    conn.close()
+    return result
+
+
+def month_txns(month, year, cols="m.name, t.uid"):
+    return rows(f"SELECT {cols} FROM transactions t JOIN audit_sessions s ON s.id = t.session_id "
+                "JOIN members m ON m.id = t.member_id WHERE s.month = ? AND s.year = ? ORDER BY m.name", (month, year))
+
+
+def test_refinalize_changes_only_the_rows_that_moved(finalize):
+    finalize("January", 2026)
+    uids = month_txns("January", 2026)
+    seq = rows("SELECT MAX(seq) FROM change_log")[0][0]
+
+    finalize("January", 2026, cash={0: 100, 1: 250, 2: 100})
+
+    assert month_txns("January", 2026) == uids
+    logged = rows("SELECT tbl, row_uid FROM change_log WHERE seq > ? AND tbl = 'transactions'", (seq,))
+    assert logged == [('transactions', dict(uids)['Bob'])]
+
+
+def test_import_twice_applies_nothing_the_second_time(tmp_path, monkeypatch, finalize):
+    finalize("January", 2026)
+    finalize("February", 2026, new_loans={0: 500})
+    data = export_sync_bundle()
+    fresh = tmp_path / "fresh"
+    fresh.mkdir()
+    monkeypatch.chdir(fresh)
+    db.init_db()
+
+    first, report = import_sync_bundle(data)
+    assert report.empty
+    assert first['inserted'] == 1 + 3 + 2 + 6  # group, members, months, transactions
+    second, report = import_sync_bundle(data)
+    assert report.empty
+    assert (second['inserted'], second['updated'], second['deleted']) == (0, 0, 0)
+    assert db.get_active_loans(1)[0]['Outstanding'].tolist() == [500]
+
+
+def test_import_rechains_a_month_only_this_device_has(tmp_path, monkeypatch, group, finalize):
+    # Laptop starts from the central file and takes it in once, so later imports know what it already had
+    finalize("January", 2026)
+    laptop = tmp_path / "laptop"
+    laptop.mkdir()
+    shutil.copy(DB_FILE, laptop / DB_FILE)
+    reset_device_id(laptop / DB_FILE)
+    import_sync_bundle(export_sync_bundle(), laptop / DB_FILE)
+
+    monkeypatch.chdir(laptop)
+    finalize("February", 2026)
+
+    # Meanwhile the central file corrects January and records March
+    monkeypatch.chdir(tmp_path)
+    finalize("January", 2026, cash={0: 300})
+    finalize("March", 2026)
+    applied, report = import_sync_bundle(export_sync_bundle(), laptop / DB_FILE)
+    assert report.empty and applied['updated'] >= 1
+
+    monkeypatch.chdir(laptop)
+    jan_cf = month_txns("January", 2026, "m.name, t.savings_cf")
+    feb_bf = month_txns("February", 2026, "m.name, t.savings_bf")
+    assert feb_bf == jan_cf
+    assert dict(jan_cf)['Alice'] == 300